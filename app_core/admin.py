@@ -1,6 +1,56 @@
 from django.contrib import admin
-from .models import Agent, Indicator, ChatSession, ChatMessage
+from .models import Agent, Indicator, ChatSession, ChatMessage, ChatJob, SqlExample, SqlFingerprint
+from .services import sql_workload
 admin.site.register(Agent)
 admin.site.register(Indicator)
 admin.site.register(ChatSession)
-admin.site.register(ChatMessage)
\ No newline at end of file
+admin.site.register(ChatMessage)
+
+
+@admin.register(ChatJob)
+class ChatJobAdmin(admin.ModelAdmin):
+    list_display = ("job_id", "session", "source", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "source")
+
+
+@admin.register(SqlExample)
+class SqlExampleAdmin(admin.ModelAdmin):
+    """Curaduría de los ejemplos pregunta → SQL: solo los verificados llegan al prompt."""
+    list_display = ("question", "verified", "source", "hits", "updated_at")
+    list_filter = ("verified", "source")
+    search_fields = ("question", "sql")
+    readonly_fields = ("hits", "created_at", "updated_at")
+    actions = ["mark_verified", "mark_unverified"]
+
+    @admin.action(description="Marcar como verificados")
+    def mark_verified(self, request, queryset):
+        # update() no emite señales: se recorre para invalidar el índice.
+        for example in queryset:
+            example.verified = True
+            example.save(update_fields=["verified", "updated_at"])
+
+    @admin.action(description="Quitar verificación")
+    def mark_unverified(self, request, queryset):
+        for example in queryset:
+            example.verified = False
+            example.save(update_fields=["verified", "updated_at"])
+
+
+@admin.register(SqlFingerprint)
+class SqlFingerprintAdmin(admin.ModelAdmin):
+    """Workload SQL del agente: qué consultas genera, cuánto tardan y cuántas fallan (solo lectura)."""
+    list_display = ("__str__", "source", "calls", "error_rate", "avg_ms", "p95_ms", "avg_rows",
+                    "max_plan_cost", "last_seen")
+    list_filter = ("source",)
+    search_fields = ("normalized_sql", "fingerprint")
+    ordering = ("-total_ms",)
+    readonly_fields = [f.name for f in SqlFingerprint._meta.fields] + ["avg_ms", "p50_ms", "p95_ms", "p99_ms",
+                                                                     "avg_rows", "error_rate"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        sql_workload.flush()  # incluye lo acumulado en este proceso
+        return super().changelist_view(request, extra_context)
+
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'app_core'
\ No newline at end of file
+    name = 'app_core'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registra los receivers)
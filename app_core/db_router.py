@@ -0,0 +1,24 @@
+class PrimaryReplicaRouter:
+    """
+    Escrituras y migraciones siempre en "default"; el alias "replica" (si existe,
+    ver settings) es de solo lectura.
+
+    El ORM lee del primario: ingest, rollups y las señales leen lo que acaban de
+    escribir y la réplica puede ir atrasada. El tráfico analítico pesado (agente,
+    run_raw_select, ruta rápida) no pasa por el ORM sino por el engine de
+    SQLAlchemy sobre ANALYTICS_DB_ALIAS; para una lectura ORM puntual desde la
+    réplica se usa .using("replica").
+    """
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica tienen los mismos datos.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
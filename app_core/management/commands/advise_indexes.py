@@ -0,0 +1,127 @@
+import shutil
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app_core.models import SqlFingerprint
+from app_core.services import index_advisor, sql_workload
+from app_core.services.sources import get_source
+
+
+class Command(BaseCommand):
+    help = "Propone índices a partir del workload SQL registrado (EXPLAIN de las consultas más costosas)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default="default", help="Fuente SQL (SQL_SOURCES)")
+        parser.add_argument("--top", type=int, default=20, help="Fingerprints a analizar, por tiempo total")
+        parser.add_argument("--min-calls", type=int, default=1, help="Ignora fingerprints con menos llamadas")
+        parser.add_argument("--min-rows", type=int, default=10_000,
+                            help="Filas leídas o descartadas desde las que un scan se considera problema")
+        parser.add_argument("--max-include", type=int, default=3, help="Columnas máximas en INCLUDE (cubriente)")
+        parser.add_argument("--benchmark", action="store_true",
+                            help="Crea cada candidato sobre una copia de la base y mide antes/después")
+        parser.add_argument("--copy-url", help="URL de SQLAlchemy de la copia (obligatoria en PostgreSQL)")
+        parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones por medición (mediana)")
+        parser.add_argument("--min-gain", type=float, default=0.2,
+                            help="Mejora mínima (0.2 = 20%%) para aceptar un candidato")
+        parser.add_argument("--emit-migration", action="store_true",
+                            help="Escribe la migración con los candidatos aceptados (requiere --benchmark)")
+        parser.add_argument("--output", help="Directorio de la migración (por defecto app_core/migrations)")
+
+    def handle(self, *args, **opts):
+        if opts["emit_migration"] and not opts["benchmark"]:
+            raise CommandError("--emit-migration requiere --benchmark")
+        try:
+            source = get_source(opts["source"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        sql_workload.flush()
+        fingerprints = list(
+            SqlFingerprint.objects.filter(source=source.name, calls__gte=opts["min_calls"]).order_by("-total_ms")[
+                :opts["top"]]
+        )
+        if not fingerprints:
+            self.stdout.write(f"Sin workload registrado para la fuente {source.name}")
+            return
+
+        engine, copy_dir = source.engine(), None
+        if opts["benchmark"]:
+            # La copia también se analiza: sus planes y tiempos son la línea base del benchmark.
+            if engine.dialect.name == "sqlite":
+                engine, copy_path = index_advisor.sqlite_copy(engine)
+                copy_dir = copy_path.parent
+            elif opts["copy_url"]:
+                engine = index_advisor.copy_engine(opts["copy_url"])
+            else:
+                raise CommandError(
+                    "En PostgreSQL el benchmark necesita --copy-url (por ejemplo una base creada con "
+                    "createdb -T <base> <copia>)"
+                )
+        try:
+            replays = index_advisor.analyze(engine, fingerprints, opts["min_rows"])
+            candidates = index_advisor.propose(engine, replays, opts["max_include"])
+            if opts["benchmark"]:
+                index_advisor.benchmark(engine, candidates, replays, opts["repeat"])
+            dialect = engine.dialect.name
+        finally:
+            if copy_dir is not None:
+                engine.dispose()
+                shutil.rmtree(copy_dir, ignore_errors=True)
+
+        self._report(replays, candidates, dialect)
+        if not opts["benchmark"]:
+            return
+        accepted = [c for c in candidates if c.used and (c.gain or 0) >= opts["min_gain"]]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(accepted)} de {len(candidates)} candidatos mejoran al menos {opts['min_gain']:.0%}"
+        ))
+        if opts["emit_migration"]:
+            self._emit(accepted, source, dialect, opts["output"])
+
+    def _report(self, replays, candidates, dialect):
+        for r in replays:
+            fp = r.fingerprint
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{fp.fingerprint}  calls={fp.calls} total={fp.total_ms:.0f}ms p95={fp.p95_ms}ms"
+            ))
+            self.stdout.write(f"  {fp.normalized_sql[:160]}")
+            if r.skipped:
+                self.stdout.write(self.style.WARNING(f"  omitido: {r.skipped}"))
+                continue
+            buffers = f" buffers={r.buffers}" if r.buffers is not None else ""
+            self.stdout.write(f"  re-ejecución: {r.ms}ms{buffers}")
+            for issue in r.issues:
+                self.stdout.write(self.style.WARNING(f"  [{issue.kind}] {issue.detail}"))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Candidatos: {len(candidates)}"))
+        for c in candidates:
+            self.stdout.write(f"  {c.ddl(dialect)}")
+            self.stdout.write(f"    {len(c.fingerprints)} consultas, {c.calls} llamadas")
+            if c.before_ms is not None:
+                size = f", {c.size_bytes / 1024:.0f} KiB" if c.size_bytes is not None else ""
+                gain = f"{c.gain:+.0%}" if c.gain is not None else "-"
+                self.stdout.write(
+                    f"    antes={c.before_ms}ms después={c.after_ms}ms mejora={gain} "
+                    f"usado={'sí' if c.used else 'no'}{size}"
+                )
+
+    def _emit(self, accepted, source, dialect, output):
+        own = [c for c in accepted if source.is_default and index_advisor.model_for_table(c.table) is not None]
+        for c in accepted:
+            if c not in own:
+                # Tablas que Django no migra (otras fuentes): se informa el DDL.
+                self.stdout.write(f"  Aplicar a mano en {source.name}: {c.ddl(dialect)};")
+        if not own:
+            self.stdout.write("Ningún índice aceptado sobre tablas de app_core: no se genera migración")
+            return
+        body, meta = index_advisor.migration_source(own, connection.vendor)
+        directory = Path(output) if output else Path(__file__).resolve().parents[2] / "migrations"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{index_advisor.migration_name()}.py"
+        path.write_text(body, encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"Migración escrita en {path}"))
+        self.stdout.write("Agregar a Meta.indexes de los modelos:")
+        for line in meta:
+            self.stdout.write(f"  {line}")
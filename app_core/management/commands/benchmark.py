@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from app_core.models import ChatMessage, ChatSession
+from app_core.services import sources, sql_agent
+from app_core.services.fake_llm import ScriptedChatModel
+from app_core.services.rollups import refresh_rollups
+
+
+SESSION_PREFIX = "bench-"
+# Preguntas que resuelve el agente (con el LLM guionado) y preguntas de la ruta rápida.
+AGENT_QUESTIONS = [
+    "¿Cuántos agentes hay por sede?",
+    "Dame el promedio de AHT por campaña",
+    "¿Quiénes son los top 10 agentes en FCR?",
+    "¿Cuántos agentes tenemos en total?",
+]
+FAST_PATH_QUESTIONS = [
+    "¿Cuántos agentes hay por sede?",
+    "¿Cuántos agentes hay por campaña?",
+    "¿Cuántos agentes hay por región?",
+]
+RAW_QUERIES = {
+    "count_agents": "SELECT COUNT(*) AS n FROM app_core_agent",
+    "avg_by_campaign": "SELECT campaign, AVG(value) AS v FROM app_core_indicator WHERE name = 'AHT' GROUP BY campaign",
+    "top_agents": (
+        "SELECT a.code, AVG(i.value) AS v FROM app_core_indicator i JOIN app_core_agent a ON a.id = i.agent_id "
+        "WHERE i.name = 'FCR' GROUP BY a.code ORDER BY v DESC LIMIT 10"
+    ),
+    "rollup_month": (
+        "SELECT period_start, name, SUM(value_sum) / SUM(value_count) AS v FROM app_core_indicatorrollup "
+        "WHERE grain = 'month' GROUP BY period_start, name"
+    ),
+}
+
+
+def _summary(samples_ms, wall_s=None):
+    """Percentiles (ms) de una lista de latencias; throughput si hay tiempo de pared."""
+    data = sorted(samples_ms)
+    if not data:
+        return {"n": 0}
+
+    def pct(p):
+        return round(data[min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))], 2)
+
+    out = {
+        "n": len(data), "mean_ms": round(statistics.fmean(data), 2),
+        "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99), "max_ms": round(data[-1], 2),
+    }
+    if wall_s:
+        out["throughput_rps"] = round(len(data) / wall_s, 2)
+    return out
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks offline (LLM guionado, sin Vertex AI): /api/chat/ bajo concurrencia, run_raw_select, "
+        "listado de sesiones y arranque en frío. Escribe resultados en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="",
+                            help="Indicadores a generar por corrida, p. ej. 10000,100000. "
+                                 "TRUNCA Agent/Indicator; sin esta opción se usan los datos actuales")
+        parser.add_argument("--requests", type=int, default=40, help="Peticiones de chat por nivel de concurrencia")
+        parser.add_argument("--concurrency", default="1,8", help="Niveles de concurrencia, p. ej. 1,8,32")
+        parser.add_argument("--llm-latency", type=float, default=0.05, help="Segundos por llamada al LLM falso")
+        parser.add_argument("--repeat", type=int, default=20, help="Repeticiones de consultas y listados")
+        parser.add_argument("--sessions", type=int, default=500, help="Sesiones sintéticas para el listado")
+        parser.add_argument("--skip", default="", help="Escenarios a omitir: chat,single_shot,fast_path,raw_select,sessions,cold_start")
+        parser.add_argument("--output", help="Ruta del JSON (por defecto var/bench/<fecha>.json)")
+        parser.add_argument("--compare", help="JSON de una corrida anterior para comparar p50/p95")
+
+    def handle(self, *args, **opts):
+        sizes = [int(s) for s in opts["sizes"].split(",") if s.strip()]
+        if sizes and os.environ.get("INSTANCE_CONNECTION_NAME"):
+            raise CommandError("--sizes trunca tablas: no se permite contra Cloud SQL")
+        skip = {s.strip() for s in opts["skip"].split(",") if s.strip()}
+        levels = [int(c) for c in opts["concurrency"].split(",") if c.strip()]
+        results = []
+        if opts["verbosity"] < 2:
+            # Los logs INFO por petición distorsionan las latencias medidas.
+            logging.disable(logging.INFO)
+
+        # El LLM guionado reemplaza a Vertex AI en todo el proceso.
+        sql_agent._init_llm = lambda: ScriptedChatModel(latency=opts["llm_latency"])
+        sources.registry().reset()
+
+        if "cold_start" not in skip:
+            results.extend(self._cold_start())
+
+        for size in sizes or [None]:
+            label = size if size is not None else "current"
+            if size is not None:
+                results.append(self._seed(size))
+            self.stdout.write(f"== datos: {label}")
+            if "raw_select" not in skip:
+                results.extend(self._raw_select(label, opts["repeat"]))
+            if "chat" not in skip:
+                results.extend(self._chat(label, AGENT_QUESTIONS, levels, opts["requests"], fast_path=False))
+            if "single_shot" not in skip:
+                results.extend(self._chat(label, AGENT_QUESTIONS, levels, opts["requests"], fast_path=False,
+                                          mode="single_shot"))
+            if "fast_path" not in skip:
+                results.extend(self._chat(label, FAST_PATH_QUESTIONS, levels, opts["requests"], fast_path=True))
+            if "sessions" not in skip:
+                results.extend(self._sessions(label, opts["sessions"], opts["repeat"]))
+        ChatSession.objects.filter(session_id__startswith=SESSION_PREFIX).delete()
+
+        report = {"meta": self._meta(opts), "results": results}
+        path = Path(opts["output"] or settings.BASE_DIR / "var" / "bench" /
+                    f"{datetime.now(dt_timezone.utc):%Y%m%dT%H%M%SZ}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+        for row in results:
+            self.stdout.write(json.dumps(row, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f"Resultados en {path}"))
+        if opts["compare"]:
+            self._compare(json.loads(Path(opts["compare"]).read_text(encoding="utf-8")), report)
+
+    # ---------- Escenarios ----------
+    def _seed(self, size):
+        started = time.perf_counter()
+        call_command("generate_load_data", agents=max(size // 100, 50), indicators=size, truncate=True,
+                     seed=42, stdout=StringIO())
+        refresh_rollups(full=True)
+        return {"scenario": "seed", "size": size, "seconds": round(time.perf_counter() - started, 2)}
+
+    def _cold_start(self):
+        """Importar Django + URLs (carga LangChain/Vertex) en un proceso nuevo, y construir el agente."""
+        code = (
+            "import time; t = time.perf_counter(); import django; django.setup(); "
+            "import chatbot_project.urls; print(time.perf_counter() - t)"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "chatbot_project.settings"))
+        samples = []
+        for _ in range(3):
+            out = subprocess.run([sys.executable, "-c", code], cwd=settings.BASE_DIR, env=env,
+                                 capture_output=True, text=True, check=True)
+            samples.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+        sources.registry().reset()
+        build = _timed(sql_agent._get_runnable, 1)
+        return [
+            {"scenario": "cold_start_import", **_summary(samples)},
+            {"scenario": "cold_start_agent_build", **_summary(build)},
+        ]
+
+    def _raw_select(self, label, repeat):
+        rows = []
+        for name, sql in RAW_QUERIES.items():
+            samples = _timed(lambda: sql_agent.run_raw_select(sql), repeat)
+            rows.append({"scenario": "raw_select", "size": label, "query": name, **_summary(samples)})
+        return rows
+
+    def _chat(self, label, questions, levels, total, fast_path, mode=None):
+        scenario = "chat_fast_path" if fast_path else f"chat_{mode}" if mode else "chat"
+        rows = []
+        # Sin caché de respuestas: se mide el camino completo en cada petición.
+        with override_settings(ANSWER_CACHE_BACKEND="off", FAST_PATH_ENABLED=fast_path):
+            for level in levels:
+                local = threading.local()
+                errors = []
+
+                def one(i):
+                    if not hasattr(local, "client"):
+                        local.client = Client()
+                    body = {"session_id": f"{SESSION_PREFIX}{scenario}-{i % level}",
+                            "message": questions[i % len(questions)]}
+                    if mode:
+                        body["mode"] = mode
+                    started = time.perf_counter()
+                    resp = local.client.post("/api/chat/", body, content_type="application/json")
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if resp.status_code != 200:
+                        errors.append(resp.status_code)
+                    connections.close_all()
+                    return elapsed
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=level) as pool:
+                    samples = list(pool.map(one, range(total)))
+                wall = time.perf_counter() - started
+                rows.append({"scenario": scenario, "size": label, "concurrency": level,
+                             "errors": len(errors), **_summary(samples, wall)})
+                self.stdout.write(f"  {scenario} c={level}: p50={rows[-1]['p50_ms']}ms")
+        return rows
+
+    def _sessions(self, label, count, repeat):
+        ChatSession.objects.filter(session_id__startswith=f"{SESSION_PREFIX}list-").delete()
+        now = timezone.now()
+        # bulk_create no dispara señales: last_activity/message_count se fijan a mano.
+        sessions = ChatSession.objects.bulk_create([
+            ChatSession(session_id=f"{SESSION_PREFIX}list-{i}", last_activity=now - timedelta(minutes=i),
+                        message_count=20)
+            for i in range(count)
+        ], batch_size=1000)
+        sessions = list(ChatSession.objects.filter(session_id__startswith=f"{SESSION_PREFIX}list-"))
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=s, role="user" if j % 2 == 0 else "assistant", content=f"mensaje {j}")
+            for s in sessions for j in range(20)
+        ], batch_size=2000)
+
+        client = Client()
+        first = client.get("/api/sessions/").json()
+        detail_url = f"/api/sessions/{SESSION_PREFIX}list-0/"
+        etag = client.get(detail_url)["ETag"]
+        cases = {
+            "list_first_page": lambda: client.get("/api/sessions/"),
+            "detail_latest": lambda: client.get(detail_url),
+            "detail_not_modified": lambda: client.get(detail_url, HTTP_IF_NONE_MATCH=etag),
+        }
+        if first.get("next_cursor"):
+            cases["list_next_page"] = lambda: client.get(f"/api/sessions/?cursor={first['next_cursor']}")
+        return [
+            {"scenario": "sessions", "size": label, "case": name, "sessions": count, **_summary(_timed(fn, repeat))}
+            for name, fn in cases.items()
+        ]
+
+    # ---------- Reporte ----------
+    def _meta(self, opts):
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(), "commit": commit,
+            "db_vendor": connection.vendor, "python": platform.python_version(),
+            "llm_latency_s": opts["llm_latency"], "requests": opts["requests"], "repeat": opts["repeat"],
+        }
+
+    def _compare(self, before, after):
+        def key(row):
+            return tuple((k, row[k]) for k in ("scenario", "size", "concurrency", "query", "case") if k in row)
+
+        old = {key(r): r for r in before.get("results", [])}
+        self.stdout.write("== comparación (p50 / p95, nuevo vs anterior)")
+        for row in after["results"]:
+            prev = old.get(key(row))
+            if not prev or "p50_ms" not in row or "p50_ms" not in prev:
+                continue
+            deltas = [
+                f"{m}={row[m]}ms ({(row[m] - prev[m]) / prev[m] * 100:+.0f}%)" if prev[m] else f"{m}={row[m]}ms"
+                for m in ("p50_ms", "p95_ms")
+            ]
+            self.stdout.write(f"  {dict(key(row))}: {', '.join(deltas)}")
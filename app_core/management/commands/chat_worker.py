@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app_core.services.chat_jobs import queued_ids, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = "Procesa los jobs de chat encolados (/api/chat/jobs/) con CHAT_JOBS_EXECUTOR=worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.CHAT_JOBS_THREADS,
+                            help="Jobs simultáneos (hilos)")
+        parser.add_argument("--poll", type=float, default=settings.CHAT_JOBS_POLL_INTERVAL,
+                            help="Segundos entre consultas a la cola cuando está vacía")
+        parser.add_argument("--once", action="store_true", help="Vacía la cola y termina")
+
+    def handle(self, *args, **opts):
+        concurrency = max(1, opts["concurrency"])
+        processed = {"done": 0, "error": 0}
+        self.stdout.write(f"chat_worker: {concurrency} hilos")
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="chat-worker") as pool:
+            try:
+                while True:
+                    requeue_stale()
+                    ids = queued_ids(concurrency)
+                    if not ids:
+                        if opts["once"]:
+                            break
+                        time.sleep(opts["poll"])
+                        continue
+                    # Una tanda a la vez: la cola no se vacía hacia la memoria del worker.
+                    for status in pool.map(run_job, ids):
+                        if status:
+                            processed[status] += 1
+            except KeyboardInterrupt:
+                self.stdout.write("chat_worker: detenido")
+        self.stdout.write(self.style.SUCCESS(
+            f"Jobs procesados: {processed['done']} ok, {processed['error']} con error"
+        ))
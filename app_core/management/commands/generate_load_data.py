@@ -0,0 +1,206 @@
+import csv
+import io
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from app_core.models import Agent, Indicator
+from app_core.services.answer_cache import bump_data_version
+from app_core.services.rollups import mark_dirty, refresh_rollups
+
+
+# Distribuciones aproximadas de una operación BPO peruana.
+SITES = [  # (sede, región, peso)
+    ("Lima", "Lima", 45), ("Arequipa", "Sur", 12), ("Trujillo", "Norte", 10),
+    ("Chiclayo", "Norte", 8), ("Piura", "Norte", 7), ("Cusco", "Sur", 6),
+    ("Huancayo", "Centro", 4), ("Iquitos", "Oriente", 4), ("Tacna", "Sur", 4),
+]
+CAMPAIGNS = [  # (campaña, peso, AHT medio en segundos)
+    ("Tarjetas", 35, 280), ("Préstamos", 25, 360), ("Seguros", 20, 320),
+    ("Cobranzas", 12, 240), ("Retención", 8, 420),
+]
+FIRST_NAMES = ["Ana", "Luis", "Sara", "Carlos", "Marta", "Jorge", "Lucía", "Pedro", "Elena", "Miguel",
+               "Sofía", "Diego", "Laura", "Andrés", "Natalia", "Rosa", "Juan", "Carmen", "José", "Valeria"]
+LAST_NAMES = ["Ramos", "Pérez", "Díaz", "Gómez", "Ruiz", "Fernández", "Morales", "Sánchez", "Torres",
+              "Castro", "Vargas", "Herrera", "Jiménez", "Molina", "Ortiz", "Quispe", "Flores", "Rojas"]
+# (indicador, peso en el volumen de filas)
+INDICATORS = [("AHT", 30), ("FCR", 25), ("Productividad", 25), ("Adherencia", 12), ("CSAT", 8)]
+
+COPY_SQL = "COPY app_core_indicator (name, campaign, date, value, agent_id) FROM STDIN WITH (FORMAT csv)"
+
+
+def _value(rng: random.Random, name: str, aht_mean: float, skill: float) -> float:
+    """Valor realista por indicador; `skill` (~N(0,1)) correlaciona los KPIs de un agente."""
+    if name == "AHT":
+        v = rng.gauss(aht_mean * (1 - 0.08 * skill), 45)
+        return round(max(v, 60.0), 1)
+    if name == "FCR":
+        return round(min(max(rng.gauss(72 + 5 * skill, 8), 0.0), 100.0), 2)
+    if name == "Productividad":
+        return round(min(max(rng.gauss(85 + 4 * skill, 7), 0.0), 120.0), 2)
+    if name == "Adherencia":
+        return round(min(max(rng.gauss(90 + 2 * skill, 4), 0.0), 100.0), 2)
+    return round(min(max(rng.gauss(4.2 + 0.2 * skill, 0.4), 1.0), 5.0), 2)  # CSAT
+
+
+# ---------- Workers (un proceso por chunk) ----------
+_W = {}
+
+
+def _init_worker(agents, start, days):
+    # Cada proceso abre su propia conexión (las heredadas del fork no se comparten).
+    connections.close_all()
+    _W["agents"] = agents
+    calendar = [start + timedelta(days=i) for i in range(days)]
+    weights, acc = [], 0.0
+    for d in calendar:
+        acc += {5: 0.5, 6: 0.2}.get(d.weekday(), 1.0)  # menos actividad el fin de semana
+        weights.append(acc)
+    _W["dates"], _W["date_weights"] = calendar, weights
+
+
+def _generate_chunk(seed: int, index: int, rows: int):
+    # La semilla depende solo del índice del chunk: el resultado no cambia con --workers.
+    rng = random.Random(seed * 1_000_003 + index)
+    agents = _W["agents"]
+    names = [n for n, _ in INDICATORS]
+    picked_agents = rng.choices(agents, k=rows)
+    picked_names = rng.choices(names, weights=[w for _, w in INDICATORS], k=rows)
+    picked_dates = rng.choices(_W["dates"], cum_weights=_W["date_weights"], k=rows)
+    for (agent_id, campaign, aht_mean, skill), name, d in zip(picked_agents, picked_names, picked_dates):
+        yield name, campaign, d, _value(rng, name, aht_mean, skill), agent_id
+
+
+def _load_chunk(method: str, seed: int, index: int, rows: int, batch_size: int) -> int:
+    data = _generate_chunk(seed, index, rows)
+    dates = set()
+    if method == "copy":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for name, campaign, d, value, agent_id in data:
+            writer.writerow((name, campaign, d.isoformat(), value, agent_id))
+            dates.add(d)
+        buf.seek(0)
+        with connection.cursor() as cur:
+            cur.copy_expert(COPY_SQL, buf)
+    else:
+        batch = []
+        for name, campaign, d, value, agent_id in data:
+            batch.append(Indicator(name=name, campaign=campaign, date=d, value=value, agent_id=agent_id))
+            dates.add(d)
+            if len(batch) >= batch_size:
+                Indicator.objects.bulk_create(batch)
+                batch = []
+        Indicator.objects.bulk_create(batch)
+    # Después de confirmar las filas: una marca anterior podría consumirse sin verlas.
+    mark_dirty(dates)
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Genera agentes e indicadores sintéticos a escala (pruebas de carga y benchmarks)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agents", type=int, default=10_000)
+        parser.add_argument("--indicators", type=int, default=1_000_000)
+        parser.add_argument("--days", type=int, default=365, help="Días hacia atrás desde hoy")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--chunk-size", type=int, default=100_000, help="Filas por tarea paralela")
+        parser.add_argument("--batch-size", type=int, default=5_000, help="Filas por INSERT (método bulk)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--method", choices=["auto", "bulk", "copy"], default="auto",
+                            help="auto = COPY en PostgreSQL, bulk_create en otros motores")
+        parser.add_argument("--code-prefix", default="G", help="Prefijo de Agent.code de los agentes generados")
+        parser.add_argument("--truncate", action="store_true",
+                            help="Vacía Agent, Indicator y los agregados antes de cargar")
+
+    def handle(self, *args, **opts):
+        vendor = connection.vendor
+        method = opts["method"]
+        if method == "auto":
+            method = "copy" if vendor == "postgresql" else "bulk"
+        if method == "copy" and vendor != "postgresql":
+            raise CommandError("--method copy requiere PostgreSQL")
+        workers = opts["workers"] if vendor == "postgresql" else 1  # sqlite no admite escritores paralelos
+
+        if opts["truncate"]:
+            self._truncate(vendor)
+
+        started = time.perf_counter()
+        agents = self._create_agents(opts["agents"], opts["seed"], opts["code_prefix"])
+        self.stdout.write(f"{len(agents)} agentes listos en {time.perf_counter() - started:.1f}s")
+
+        total, chunk = opts["indicators"], opts["chunk_size"]
+        tasks = [(i, min(chunk, total - i * chunk)) for i in range((total + chunk - 1) // chunk)]
+        start = date.today() - timedelta(days=opts["days"] - 1)
+        init_args = (agents, start, opts["days"])
+
+        loaded = 0
+        started = time.perf_counter()
+        if workers > 1:
+            connections.close_all()
+            # fork: los hijos heredan Django ya configurado (spawn/forkserver no lo harían).
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_worker, initargs=init_args) as pool:
+                futures = [pool.submit(_load_chunk, method, opts["seed"], i, n, opts["batch_size"]) for i, n in tasks]
+                for fut in as_completed(futures):
+                    loaded += fut.result()
+                    self._progress(loaded, total, started)
+        else:
+            _init_worker(*init_args)
+            for i, n in tasks:
+                loaded += _load_chunk(method, opts["seed"], i, n, opts["batch_size"])
+                self._progress(loaded, total, started)
+
+        bump_data_version()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{loaded} indicadores cargados con {method} en {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} filas/s)"
+        ))
+        if settings.ROLLUPS_AUTO_REFRESH:
+            summary = refresh_rollups()
+            self.stdout.write(self.style.SUCCESS(f"Agregados actualizados: {summary['dates']} fechas, {summary['rows']} filas"))
+        else:
+            self.stdout.write("Ejecuta refresh_rollups para actualizar los agregados.")
+
+    def _progress(self, loaded, total, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {loaded:,}/{total:,} filas ({loaded / max(elapsed, 1e-9):,.0f} filas/s)")
+
+    def _truncate(self, vendor):
+        tables = ["app_core_indicatorrollup", "app_core_rollupdirtydate", "app_core_rollupstate",
+                  "app_core_indicator", "app_core_agent"]
+        with connection.cursor() as cur:
+            if vendor == "postgresql":
+                cur.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+            else:
+                for table in tables:
+                    cur.execute(f"DELETE FROM {table}")
+        self.stdout.write("Tablas analíticas vaciadas")
+
+    def _create_agents(self, count, seed, prefix):
+        """Crea (o reutiliza) los agentes y retorna [(id, campaña, AHT medio, skill)]."""
+        rng = random.Random(seed)
+        site_w = [w for _, _, w in SITES]
+        camp_w = [w for _, w, _ in CAMPAIGNS]
+        specs, objs = {}, []
+        for n in range(1, count + 1):
+            site, region, _ = rng.choices(SITES, weights=site_w)[0]
+            campaign, _, aht_mean = rng.choices(CAMPAIGNS, weights=camp_w)[0]
+            code = f"{prefix}{n:06d}"
+            specs[code] = (campaign, aht_mean, rng.gauss(0, 1))
+            objs.append(Agent(
+                code=code, full_name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                site=site, region=region, campaign=campaign, active=rng.random() < 0.92,
+            ))
+        Agent.objects.bulk_create(objs, batch_size=5_000, ignore_conflicts=True)
+        ids = dict(Agent.objects.filter(code__startswith=prefix).values_list("code", "id"))
+        return [(ids[code], *spec) for code, spec in specs.items() if code in ids]
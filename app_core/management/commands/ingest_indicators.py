@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_core.services.ingest import DEFAULT_CHUNK_SIZE, IngestError, ingest_indicators
+
+
+class Command(BaseCommand):
+    help = "Carga (upsert) indicadores desde un exporte CSV o Parquet por bloques"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archivo .csv o .parquet (agent_code, name, campaign, date, value)")
+        parser.add_argument("--format", choices=["csv", "parquet"], help="Por defecto según la extensión")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Filas por bloque")
+
+    def handle(self, *args, **opts):
+        def progress(summary):
+            rate = summary["read"] / max(summary["elapsed_ms"] / 1000, 1e-9)
+            self.stdout.write(
+                f"  {summary['read']:,} leídas · {summary['inserted']:,} nuevas · "
+                f"{summary['updated']:,} actualizadas ({rate:,.0f} filas/s)"
+            )
+
+        try:
+            summary = ingest_indicators(opts["path"], opts["format"], opts["chunk_size"], progress)
+        except (IngestError, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingesta lista: {summary['inserted']} nuevas, {summary['updated']} actualizadas, "
+            f"{summary['unknown_agent']} con agente desconocido, {summary['invalid']} inválidas."
+            + (f" Agregados recalculados para {summary['rollup_dates']} fechas." if "rollup_dates" in summary else
+               " Ejecuta refresh_rollups para actualizar los agregados.")
+        ))
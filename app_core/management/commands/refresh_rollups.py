@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app_core.services.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Actualiza incrementalmente los agregados de Indicator (IndicatorRollup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Reconstruye todos los agregados")
+
+    def handle(self, *args, **opts):
+        summary = refresh_rollups(full=opts["full"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Agregados actualizados: {summary['dates']} fechas, {summary['rows']} filas"
+        ))
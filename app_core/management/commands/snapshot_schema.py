@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_core.services.schema_snapshot import build_snapshot, read_snapshot, source_hash, write_snapshot
+from app_core.services.sources import get_source, source_names
+
+
+class Command(BaseCommand):
+    help = "Genera el snapshot de esquema (table_info compacto) que usa el agente SQL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=None,
+                            help="Fuente SQL (SQL_SOURCES); por defecto la base analítica propia")
+        parser.add_argument("--all", action="store_true", help="Todas las fuentes (default y SQL_SOURCES)")
+        parser.add_argument("--if-stale", action="store_true",
+                            help="Solo regenera si el snapshot no existe o está desactualizado (arranque del contenedor)")
+        parser.add_argument("--tables", nargs="+", help="Tablas permitidas (por defecto las de la fuente)")
+        parser.add_argument("--sample-rows", type=int, default=None, help="Filas de ejemplo por tabla")
+        parser.add_argument("--check", action="store_true",
+                            help="No escribe; falla si el snapshot actual está desactualizado")
+
+    def handle(self, *args, **opts):
+        names = source_names() if opts["all"] else [opts["source"]]
+        for name in names:
+            try:
+                source = get_source(name)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            self._snapshot(source, opts)
+
+    def _current(self, engine, path, tables, sample_rows):
+        """
+        El snapshot en disco si coincide con el esquema y con la configuración
+        pedida (tablas y filas de ejemplo); None si no existe o está desactualizado.
+        """
+        current = read_snapshot(path)
+        if (current and current.get("source_hash") == source_hash(engine, tables, sample_rows)
+                and current.get("dialect") == engine.dialect.name):
+            return current
+        return None
+
+    def _snapshot(self, source, opts):
+        engine = source.engine()
+        tables = opts["tables"] or source.config.tables
+        sample_rows = opts["sample_rows"]
+        if sample_rows is None:
+            sample_rows = getattr(settings, "AGENT_SAMPLE_ROWS", 2)
+        path = source.config.snapshot_path
+
+        if opts["check"] or opts["if_stale"]:
+            current = self._current(engine, path, tables, sample_rows)
+            if current:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Snapshot de {source.name} vigente (schema_hash={current['schema_hash'][:12]})"
+                ))
+                return
+            if opts["check"]:
+                raise CommandError(f"Snapshot desactualizado o inexistente: {path}")
+
+        snapshot = build_snapshot(engine, tables, sample_rows)
+        path = write_snapshot(snapshot, path)
+        size = sum(len(v) for v in snapshot["table_info"].values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot escrito en {path} ({len(tables)} tablas, {size} caracteres, "
+            f"schema_hash={snapshot['schema_hash'][:12]})"
+        ))
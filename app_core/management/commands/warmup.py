@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_core.services.warmup import HEAVY_MODULES, preloaded_heavy_modules, warm_up
+
+
+class Command(BaseCommand):
+    help = "Precalienta engine, pool, esquema y agente SQL y muestra cuánto tarda cada paso"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pool", type=int, default=None, help="Conexiones a abrir (por defecto WARMUP_POOL_CONNECTIONS)")
+        parser.add_argument("--no-agent", action="store_true",
+                            help="Solo engine y esquema (sin importar LangChain/Vertex ni construir el agente)")
+        parser.add_argument("--check-imports", action="store_true",
+                            help="Falla si algún módulo pesado ya se importó al cargar Django/URLs")
+
+    def handle(self, *args, **opts):
+        preloaded = preloaded_heavy_modules()
+        if preloaded:
+            msg = f"Módulos pesados importados antes del warm-up: {', '.join(preloaded)}"
+            if opts["check_imports"]:
+                raise CommandError(msg)
+            self.stdout.write(self.style.WARNING(msg))
+
+        try:
+            timings = warm_up(pool_connections=opts["pool"], build_agent=not opts["no_agent"])
+        except Exception as e:
+            raise CommandError(f"Warm-up falló: {e}") from e
+
+        for name, ms in timings.items():
+            label = f"import {name}" if name in HEAVY_MODULES else name
+            self.stdout.write(f"{label:<55} {ms:>10.1f} ms")
+        self.stdout.write(self.style.SUCCESS("Warm-up completo"))
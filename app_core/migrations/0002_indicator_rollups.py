@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-17 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupDirtyDate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_indicator_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndicatorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('day', 'day'), ('week', 'week'), ('month', 'month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('name', models.CharField(max_length=100)),
+                ('campaign', models.CharField(blank=True, max_length=100)),
+                ('region', models.CharField(blank=True, max_length=100)),
+                ('site', models.CharField(blank=True, max_length=100)),
+                ('value_count', models.IntegerField()),
+                ('value_sum', models.FloatField()),
+                ('value_min', models.FloatField()),
+                ('value_max', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grain', 'name', 'period_start'], name='app_core_in_grain_4ff1a0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('grain', 'period_start', 'name', 'campaign', 'region', 'site'), name='uniq_indicator_rollup')],
+            },
+        ),
+    ]
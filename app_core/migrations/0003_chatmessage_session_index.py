@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0002_indicator_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'created_at'], name='app_core_ch_session_154a7c_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0003_chatmessage_session_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='history_summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='history_summary_until',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:19
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
+
+
+def backfill_activity(apps, schema_editor):
+    ChatSession = apps.get_model('app_core', 'ChatSession')
+    sessions = ChatSession.objects.annotate(
+        n=Count('messages'), last=Coalesce(Max('messages__created_at'), 'created_at'),
+    )
+    for sess in sessions.iterator(chunk_size=2000):
+        ChatSession.objects.filter(pk=sess.pk).update(last_activity=sess.last, message_count=sess.n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0004_chatsession_history_summary'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='app_core_ch_session_154a7c_idx',
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'id'], name='app_core_ch_session_157ce0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['-last_activity', '-id'], name='app_core_ch_last_ac_dfb043_idx'),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0005_chatsession_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SqlExample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('normalized_question', models.CharField(editable=False, max_length=500, unique=True)),
+                ('sql', models.TextField()),
+                ('verified', models.BooleanField(default=False)),
+                ('source', models.CharField(choices=[('agent', 'agent'), ('admin', 'admin')], default='admin', max_length=10)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
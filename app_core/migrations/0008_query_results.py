@@ -0,0 +1,39 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:44
+
+import django.core.serializers.json
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0007_chatjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('sql', models.TextField()),
+                ('columns', models.JSONField(default=list)),
+                ('data', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('row_count', models.IntegerField()),
+                ('truncated', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatjob',
+            name='results',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='results',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
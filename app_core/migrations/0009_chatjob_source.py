@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0008_query_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatjob',
+            name='source',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
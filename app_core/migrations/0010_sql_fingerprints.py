@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0009_chatjob_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SqlFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(default='default', max_length=64)),
+                ('fingerprint', models.CharField(max_length=16)),
+                ('normalized_sql', models.TextField()),
+                ('sample_sql', models.TextField()),
+                ('calls', models.BigIntegerField(default=0)),
+                ('errors', models.BigIntegerField(default=0)),
+                ('rejected', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('rows_total', models.BigIntegerField(default=0)),
+                ('max_plan_cost', models.FloatField(blank=True, null=True)),
+                ('latency_buckets', models.JSONField(default=list)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'fingerprint'), name='uniq_sql_fingerprint')],
+            },
+        ),
+    ]
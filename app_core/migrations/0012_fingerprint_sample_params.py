@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:19
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0011_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sqlfingerprint',
+            name='sample_params',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:29
+
+from django.db import migrations, models
+
+
+def mark_unrefreshed_dates(apps, schema_editor):
+    # Las filas que la marca de agua aún no cubría pasan a ser marcas de fecha.
+    Indicator = apps.get_model('app_core', 'Indicator')
+    RollupDirtyDate = apps.get_model('app_core', 'RollupDirtyDate')
+    RollupState = apps.get_model('app_core', 'RollupState')
+    state = RollupState.objects.filter(pk=1, refreshed_at__isnull=False).first()
+    if state is None:
+        return  # nunca se refrescó: pending() lo detecta igual
+    dates = Indicator.objects.filter(id__gt=state.last_indicator_id).values_list('date', flat=True).distinct()
+    RollupDirtyDate.objects.bulk_create([RollupDirtyDate(date=d) for d in dates], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0012_fingerprint_sample_params'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rollupdirtydate',
+            name='date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.RunPython(mark_unrefreshed_dates, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='rollupstate',
+            name='last_indicator_id',
+        ),
+    ]
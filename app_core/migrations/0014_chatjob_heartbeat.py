@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeat(apps, schema_editor):
+    # Los jobs que ya corren cuentan como si hubieran latido al empezar.
+    ChatJob = apps.get_model('app_core', 'ChatJob')
+    ChatJob.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0013_rollup_dirty_markers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat, migrations.RunPython.noop),
+    ]
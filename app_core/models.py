@@ -1,4 +1,12 @@
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+
+from .services.normalization import normalize_question
+from .services.sql_workload import percentile
 
 class Agent(models.Model):
     code = models.CharField(max_length=50, unique=True)
@@ -23,14 +31,175 @@ class Indicator(models.Model):
         verbose_name = 'Indicator'
         verbose_name_plural = 'Indicators'
 
+class IndicatorRollup(models.Model):
+    """Agregado de Indicator por periodo × indicador × campaña × región × sede."""
+    GRAIN_CHOICES = (('day','day'), ('week','week'), ('month','month'),)
+    grain = models.CharField(max_length=5, choices=GRAIN_CHOICES)
+    period_start = models.DateField()
+    name = models.CharField(max_length=100)
+    campaign = models.CharField(max_length=100, blank=True)
+    region = models.CharField(max_length=100, blank=True)
+    site = models.CharField(max_length=100, blank=True)
+    value_count = models.IntegerField()
+    value_sum = models.FloatField()
+    value_min = models.FloatField()
+    value_max = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['grain','period_start','name','campaign','region','site'],
+                name='uniq_indicator_rollup',
+            ),
+        ]
+        indexes = [models.Index(fields=['grain','name','period_start'])]
+
+class RollupDirtyDate(models.Model):
+    """Fechas de Indicator modificadas cuyos agregados hay que recalcular (una fila por marca)."""
+    date = models.DateField(db_index=True)
+
+class RollupState(models.Model):
+    """Fila única: cuándo se refrescaron los agregados por última vez."""
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+class DataVersion(models.Model):
+    """Fila única: versión de los datos analíticos; al subirla se invalida la caché de respuestas de todos los procesos."""
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
 class ChatSession(models.Model):
     session_id = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     user_label = models.CharField(max_length=100, blank=True)  # opcional
+    # Denormalizados: los mantiene la señal post_save de ChatMessage
+    last_activity = models.DateTimeField(default=timezone.now)
+    message_count = models.IntegerField(default=0)
+    # Resumen de los turnos ya compactados (ver services/chat_history.py)
+    history_summary = models.TextField(blank=True, default='')
+    history_summary_until = models.BigIntegerField(default=0)  # último ChatMessage.id resumido
+
+    class Meta:
+        # Listado de sesiones paginado por (last_activity, id)
+        indexes = [models.Index(fields=['-last_activity','-id'])]
 
 class ChatMessage(models.Model):
     ROLE_CHOICES = (('user','user'), ('assistant','assistant'),)
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    results = models.JSONField(default=list, blank=True)  # result_id (QueryResult) de las tablas de la respuesta
+
+    class Meta:
+        # Ventana de historial del agente y paginación de mensajes por id.
+        indexes = [models.Index(fields=['session','id'])]
+
+class SqlExample(models.Model):
+    """Par pregunta → SQL que funcionó; los verificados se inyectan como few-shot (services/sql_examples.py)."""
+    SOURCE_CHOICES = (('agent','agent'), ('admin','admin'),)
+    question = models.TextField()
+    normalized_question = models.CharField(max_length=500, unique=True, editable=False)
+    sql = models.TextField()
+    verified = models.BooleanField(default=False)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='admin')
+    hits = models.IntegerField(default=0)  # veces que el agente respondió esta pregunta (con este SQL u otro)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        # normalized_question no es editable: el formulario no valida su unicidad.
+        normalized = normalize_question(self.question)[:500]
+        if SqlExample.objects.filter(normalized_question=normalized).exclude(pk=self.pk).exists():
+            raise ValidationError({"question": "Ya existe un ejemplo para esta pregunta (una vez normalizada)."})
+
+    def save(self, *args, **kwargs):
+        self.normalized_question = normalize_question(self.question)[:500]
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.question
+
+class ChatJob(models.Model):
+    """Pregunta encolada para responder en segundo plano (services/chat_jobs.py)."""
+    STATUS_CHOICES = (('queued','queued'), ('running','running'), ('done','done'), ('error','error'),)
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='jobs')
+    user_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, null=True, related_name='+')
+    question = models.TextField()
+    mode = models.CharField(max_length=20, blank=True)  # vacío = AGENT_MODE
+    source = models.CharField(max_length=64, blank=True)  # fuente SQL (SQL_SOURCES); vacío = "default"
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    reply = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    cached = models.BooleanField(default=False)
+    results = models.JSONField(default=list, blank=True)  # result_id de QueryResult
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # lo renueva el ejecutor mientras corre
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # El worker toma los encolados en orden de llegada.
+        indexes = [models.Index(fields=['status','id'])]
+
+class QueryResult(models.Model):
+    """Filas completas de un SELECT del agente, servidas paginadas por /api/results/ (services/result_store.py)."""
+    result_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    sql = models.TextField()
+    columns = models.JSONField(default=list)  # [{"name": ..., "type": number|text|date|bool}]
+    data = models.JSONField(default=list, encoder=DjangoJSONEncoder)  # columnar: una lista por columna
+    row_count = models.IntegerField()
+    truncated = models.BooleanField(default=False)  # la consulta tenía más de SQL_MAX_ROWS filas
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+class SqlFingerprint(models.Model):
+    """Estadísticas acumuladas de una forma de consulta (SQL sin literales) por fuente (services/sql_workload.py)."""
+    source = models.CharField(max_length=64, default='default')
+    fingerprint = models.CharField(max_length=16)
+    normalized_sql = models.TextField()
+    sample_sql = models.TextField()  # último SQL literal visto
+    sample_params = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)  # parámetros de sample_sql
+    calls = models.BigIntegerField(default=0)
+    errors = models.BigIntegerField(default=0)  # fallas de la base
+    rejected = models.BigIntegerField(default=0)  # cortadas por costo, timeout o forma (QueryRejected)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    rows_total = models.BigIntegerField(default=0)
+    max_plan_cost = models.FloatField(null=True, blank=True)  # costo EXPLAIN (solo PostgreSQL)
+    latency_buckets = models.JSONField(default=list)  # conteos por tramo de sql_workload.LATENCY_BUCKETS_MS
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source','fingerprint'], name='uniq_sql_fingerprint'),
+        ]
+
+    @property
+    def avg_ms(self):
+        return round(self.total_ms / self.calls, 1) if self.calls else None
+
+    @property
+    def avg_rows(self):
+        return round(self.rows_total / self.calls, 1) if self.calls else None
+
+    @property
+    def error_rate(self):
+        return round((self.errors + self.rejected) / self.calls, 4) if self.calls else None
+
+    @property
+    def p50_ms(self):
+        return percentile(self.latency_buckets, 0.50)
+
+    @property
+    def p95_ms(self):
+        return percentile(self.latency_buckets, 0.95)
+
+    @property
+    def p99_ms(self):
+        return percentile(self.latency_buckets, 0.99)
+
+    def __str__(self):
+        return self.normalized_sql[:80]
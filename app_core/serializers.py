@@ -1,21 +1,53 @@
 from rest_framework import serializers
-from .models import ChatSession, ChatMessage
+from .models import ChatJob, ChatSession, ChatMessage, SqlFingerprint
+from .services.sources import authorize, source_names
+from .services.sql_agent import AGENT_MODES
 class ChatRequestSerializer(serializers.Serializer):
     session_id = serializers.CharField(max_length=64)
     message = serializers.CharField()
+    mode = serializers.ChoiceField(choices=AGENT_MODES, required=False)  # por defecto AGENT_MODE
+    source = serializers.ChoiceField(choices=source_names(), required=False)  # fuente SQL; por defecto "default"
+
+    def validate_source(self, value):
+        # Fuentes de SQL_SOURCES: la petición debe traer una de sus claves (cabecera X-Source-Key)
+        request = self.context.get("request")
+        if not authorize(value, request.headers.get("X-Source-Key") if request is not None else None):
+            raise serializers.ValidationError("No autorizado para consultar esta fuente.")
+        return value
 
 class ChatResponseSerializer(serializers.Serializer):
     reply = serializers.CharField()
+    cached = serializers.BooleanField(default=False)
+    # Tablas de la respuesta: {"result_id", "columns", "row_count", "truncated"}; filas en /api/results/<id>/
+    results = serializers.ListField(child=serializers.DictField(), default=list)
 
 class ChatSessionSerializer(serializers.ModelSerializer):
-    # Lo llenamos desde la vista con annotate(Max(...))
-    last_activity = serializers.DateTimeField(read_only=True, allow_null=True)
-
     class Meta:
         model = ChatSession
-        fields = ["session_id", "created_at", "user_label", "last_activity"]
+        fields = ["session_id", "created_at", "user_label", "last_activity", "message_count"]
 
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
-        fields = ["role", "content", "created_at"]
\ No newline at end of file
+        fields = ["id", "role", "content", "results", "created_at"]
+class ChatJobSerializer(serializers.ModelSerializer):
+    session_id = serializers.CharField(source="session.session_id")
+
+    class Meta:
+        model = ChatJob
+        fields = ["job_id", "session_id", "source", "status", "reply", "error", "cached", "results",
+                  "created_at", "started_at", "finished_at"]
+
+class SqlFingerprintSerializer(serializers.ModelSerializer):
+    avg_ms = serializers.FloatField(read_only=True)
+    p50_ms = serializers.FloatField(read_only=True)
+    p95_ms = serializers.FloatField(read_only=True)
+    p99_ms = serializers.FloatField(read_only=True)
+    avg_rows = serializers.FloatField(read_only=True)
+    error_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = SqlFingerprint
+        fields = ["source", "fingerprint", "normalized_sql", "sample_sql", "calls", "errors", "rejected",
+                  "error_rate", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "total_ms", "rows_total",
+                  "avg_rows", "max_plan_cost", "first_seen", "last_seen"]
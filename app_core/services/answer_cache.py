@@ -0,0 +1,306 @@
+"""
+Caché de respuestas delante de ask_sql_agent.
+
+La clave combina la pregunta normalizada, el contexto reciente (solo si la
+pregunta es de seguimiento) y una "versión de datos" que se incrementa cada vez
+que cambian filas de Agent o Indicator. Al subir la versión, las entradas
+anteriores dejan de ser alcanzables y se van por TTL/LRU. La versión vive en un
+almacén compartido (ANSWER_CACHE_VERSION_STORE, por defecto la fila DataVersion)
+para que una carga hecha desde un comando invalide también las entradas locmem
+de cada worker web; los workers la releen cada ANSWER_CACHE_VERSION_POLL segundos. Las preguntas a otra
+fuente SQL (SQL_SOURCES) llevan su nombre en la clave; como sus datos no pasan
+por señales de Django, esas entradas solo expiran por TTL.
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from . import result_store
+from .normalization import normalize_question, is_followup
+from .sources import DEFAULT_SOURCE
+from .tracing import stage
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Backends ----------
+class LocMemAnswerBackend:
+    """LRU + TTL en memoria del proceso (cada worker tiene su propia copia)."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DjangoAnswerBackend:
+    """Usa el framework de caché de Django (compartido entre workers si el backend lo es)."""
+
+    def __init__(self, alias: str, ttl: int):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        self.cache.set(key, value, self.ttl)
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_backend():
+    """Devuelve el backend configurado (None si la caché está desactivada)."""
+    global _BACKEND
+    name = getattr(settings, "ANSWER_CACHE_BACKEND", "locmem")
+    if name == "off":
+        return None
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                ttl = getattr(settings, "ANSWER_CACHE_TTL", 600)
+                if name == "django":
+                    _BACKEND = DjangoAnswerBackend(
+                        getattr(settings, "ANSWER_CACHE_ALIAS", "default"), ttl
+                    )
+                elif name == "locmem":
+                    _BACKEND = LocMemAnswerBackend(
+                        getattr(settings, "ANSWER_CACHE_MAX_ENTRIES", 500), ttl
+                    )
+                else:
+                    raise RuntimeError(f"Backend de caché de respuestas no soportado: {name}")
+    return _BACKEND
+
+
+# ---------- Versión de datos ----------
+_VERSION_KEY = "analia:answer_cache:data_version"
+_LOCAL_VERSION = [1, 0.0]  # [versión, monotonic de la última lectura del almacén]
+_VERSION_LOCK = threading.Lock()
+
+
+def _version_store() -> str:
+    # db: fila DataVersion | cache: CACHES[ANSWER_CACHE_ALIAS] (compartido si ese backend lo es) | local: solo el proceso
+    return getattr(settings, "ANSWER_CACHE_VERSION_STORE", "db")
+
+
+def _read_version() -> int:
+    store = _version_store()
+    if store == "db":
+        from ..models import DataVersion
+
+        return DataVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 1
+    if store == "cache":
+        return caches[getattr(settings, "ANSWER_CACHE_ALIAS", "default")].get_or_set(_VERSION_KEY, 1, None)
+    if store == "local":
+        return _LOCAL_VERSION[0]
+    raise RuntimeError(f"Almacén de versión de datos no soportado: {store}")
+
+
+def data_version() -> int:
+    """Versión de datos vigente; se relee del almacén compartido cada ANSWER_CACHE_VERSION_POLL segundos."""
+    poll = getattr(settings, "ANSWER_CACHE_VERSION_POLL", 2.0)
+    if _version_store() != "local" and time.monotonic() - _LOCAL_VERSION[1] >= poll:
+        version = _read_version()
+        with _VERSION_LOCK:
+            _LOCAL_VERSION[:] = [version, time.monotonic()]
+    return _LOCAL_VERSION[0]
+
+
+def bump_data_version() -> None:
+    """Invalida las respuestas cacheadas de todos los procesos (llamar cuando cambian los datos)."""
+    store = _version_store()
+    if store == "db":
+        from django.db.models import F
+        from django.utils import timezone
+
+        from ..models import DataVersion
+
+        now = timezone.now()
+        if not DataVersion.objects.filter(pk=1).update(version=F("version") + 1, updated_at=now):
+            DataVersion.objects.get_or_create(pk=1, defaults={"version": 2, "updated_at": now})
+        version = _read_version()
+    elif store == "cache":
+        cache = caches[getattr(settings, "ANSWER_CACHE_ALIAS", "default")]
+        try:
+            version = cache.incr(_VERSION_KEY)
+        except ValueError:
+            # La clave no existía (o expiró): cualquier valor distinto invalida.
+            version = int(time.time())
+            cache.set(_VERSION_KEY, version, None)
+    else:
+        version = _LOCAL_VERSION[0] + 1
+    with _VERSION_LOCK:
+        _LOCAL_VERSION[:] = [version, time.monotonic()]
+    logger.info("answer_cache invalidated (data version %s)", version)
+
+
+# ---------- Claves ----------
+def answer_cache_key(
+    question: str, recent_questions: Sequence[str] = (), version: int = 1, source: Optional[str] = None,
+) -> str:
+    """
+    Clave estable para una pregunta. El contexto solo entra en la clave si la
+    pregunta es de seguimiento, para que la misma pregunta autónoma comparta
+    entrada entre sesiones. La fuente entra si no es "default" (las claves de
+    esta no cambian).
+    """
+    normalized = normalize_question(question)
+    parts = [normalized]
+    if source and source != DEFAULT_SOURCE:
+        parts.insert(0, f"source={source}")
+    if is_followup(normalized):
+        turns = getattr(settings, "ANSWER_CACHE_CONTEXT_TURNS", 2)
+        parts.extend(normalize_question(q) for q in list(recent_questions)[:turns])
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return f"analia:answer:v{version}:{digest}"
+
+
+# ---------- API ----------
+def lookup_answer(
+    user_query: str, recent_questions: Sequence[str] = (), source: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """
+    Busca una respuesta cacheada. Retorna (clave, respuesta|None, result_ids);
+    la clave es None si la caché está desactivada.
+    """
+    backend = get_backend()
+    if backend is None:
+        return None, None, []
+    with stage("cache") as info:
+        key = answer_cache_key(user_query, recent_questions, data_version(), source)
+        value = backend.get(key)
+        info["hit"] = value is not None
+    if value is None:
+        return key, None, []
+    if isinstance(value, str):  # entrada anterior a result_ids
+        return key, value, []
+    reply, result_ids = value
+    return key, reply, list(result_ids)
+
+
+def store_answer(key: Optional[str], reply: str, result_ids: Sequence[str] = ()) -> None:
+    """Guarda la respuesta con los result_id de sus tablas (viven más que la entrada, ver RESULTS_TTL)."""
+    backend = get_backend()
+    if backend is not None and key is not None:
+        backend.set(key, (reply, list(result_ids)))
+
+
+def answer_with_cache(
+    session_id: str,
+    user_query: str,
+    recent_questions: Sequence[str] = (),
+    ask: Optional[Callable[[str, str], str]] = None,
+    mode: Optional[str] = None,
+    source: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """
+    Responde usando la caché si es posible; si no, delega en `ask`
+    (por defecto ask_sql_agent, coalescido con single_flight) y guarda el
+    resultado. Retorna (respuesta, hit); hit es solo una lectura de la caché:
+    la respuesta compartida con otra petición idéntica en vuelo se acaba de
+    calcular y no cuenta como cacheada. `mode` se pasa al agente
+    (agent | single_shot); no entra en la clave porque ambos responden lo mismo.
+    `source` es la fuente SQL (sources.py) y sí separa las entradas.
+    Los result_id de la respuesta (cacheada o no) se publican en el
+    result_store.collect_results() del llamador.
+    """
+    from .single_flight import coalesce, flight_key
+    from .sql_agent import ask_sql_agent
+
+    ask = ask or functools.partial(ask_sql_agent, mode=mode, source=source)
+    started = time.perf_counter()
+    key, reply, result_ids = lookup_answer(user_query, recent_questions, source)
+    if reply is not None:
+        logger.info(
+            "answer_cache hit session=%s key=%s elapsed_ms=%.1f",
+            session_id, key[-12:], (time.perf_counter() - started) * 1000,
+        )
+        result_store.publish(result_ids)
+        return reply, True
+
+    if key is not None:
+        logger.info("answer_cache miss session=%s key=%s", session_id, key[-12:])
+
+    def run():
+        with result_store.collect_results() as ids:
+            answer = ask(session_id, user_query)
+        return answer, ids
+
+    # Preguntas equivalentes en vuelo comparten una sola ejecución del agente.
+    (reply, result_ids), shared = coalesce(flight_key(user_query, recent_questions, source), run)
+    if shared:
+        result_store.publish(result_ids)
+    else:
+        store_answer(key, reply, result_ids)
+    return reply, False
+
+
+async def aanswer_with_cache(
+    session_id: str,
+    user_query: str,
+    recent_questions: Sequence[str] = (),
+    ask: Optional[Callable[[str, str], Awaitable[str]]] = None,
+    mode: Optional[str] = None,
+    source: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """Versión async de answer_with_cache (por defecto usa aask_sql_agent)."""
+    from .single_flight import acoalesce, flight_key
+    from .sql_agent import aask_sql_agent
+
+    ask = ask or functools.partial(aask_sql_agent, mode=mode, source=source)
+    started = time.perf_counter()
+    key, reply, result_ids = await sync_to_async(lookup_answer, thread_sensitive=False)(
+        user_query, recent_questions, source
+    )
+    if reply is not None:
+        logger.info(
+            "answer_cache hit session=%s key=%s elapsed_ms=%.1f",
+            session_id, key[-12:], (time.perf_counter() - started) * 1000,
+        )
+        result_store.publish(result_ids)
+        return reply, True
+
+    if key is not None:
+        logger.info("answer_cache miss session=%s key=%s", session_id, key[-12:])
+
+    async def run():
+        with result_store.collect_results() as ids:
+            answer = await ask(session_id, user_query)
+        return answer, ids
+
+    (reply, result_ids), shared = await acoalesce(flight_key(user_query, recent_questions, source), run)
+    if shared:
+        result_store.publish(result_ids)
+    else:
+        await sync_to_async(store_answer, thread_sensitive=False)(key, reply, result_ids)
+    return reply, False
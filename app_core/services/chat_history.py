@@ -0,0 +1,133 @@
+"""
+Historial conversacional del agente sobre ChatMessage (ORM de Django).
+
+Las vistas de chat ya guardan cada pregunta y respuesta en ChatMessage, así
+que esa es la única copia: el agente solo la lee y add_messages no escribe
+nada. No se crea ningún engine ni pool de conexiones por pregunta.
+
+Compactación: los últimos CHAT_HISTORY_TURNS turnos van literales; cuando se
+acumulan CHAT_HISTORY_SUMMARY_BATCH_TURNS turnos más antiguos, se resumen (junto
+con el resumen previo) en ChatSession.history_summary. Lo que llega al prompt
+se recorta además a CHAT_HISTORY_TOKEN_BUDGET, así que su tamaño no crece con
+la duración de la sesión.
+"""
+import logging
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from ..models import ChatMessage, ChatSession
+from .tracing import stage
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_CLASS = {"user": HumanMessage, "assistant": AIMessage}
+SUMMARY_PREFIX = "Resumen de la conversación anterior: "
+
+# (resumen previo, [(rol, contenido), ...]) -> resumen nuevo
+Summarizer = Callable[[str, List[Tuple[str, str]]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token) para aplicar el presupuesto."""
+    return len(text or "") // 4 + 1
+
+
+def _truncate_tokens(text: str, tokens: int) -> str:
+    limit = max(tokens, 0) * 4
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+class DjangoChatMessageHistory(BaseChatMessageHistory):
+    """Ventana de solo lectura (resumen + últimos turnos) de una sesión."""
+
+    def __init__(
+        self,
+        session_id: str,
+        max_turns: Optional[int] = None,
+        summarize: Optional[Summarizer] = None,
+        token_budget: Optional[int] = None,
+    ):
+        self.session_id = session_id
+        self.max_turns = max_turns if max_turns is not None else getattr(settings, "CHAT_HISTORY_TURNS", 10)
+        self.summarize = summarize
+        self.token_budget = (
+            token_budget if token_budget is not None else getattr(settings, "CHAT_HISTORY_TOKEN_BUDGET", 3000)
+        )
+        self.batch_turns = getattr(settings, "CHAT_HISTORY_SUMMARY_BATCH_TURNS", 5)
+        self.summary_max_tokens = getattr(settings, "CHAT_HISTORY_SUMMARY_MAX_TOKENS", 400)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with stage("history") as info:
+            messages = self._load()
+            info["messages"] = len(messages)
+        return messages
+
+    def _load(self) -> List[BaseMessage]:
+        sess = (
+            ChatSession.objects.filter(session_id=self.session_id)
+            .values("id", "history_summary", "history_summary_until")
+            .first()
+        )
+        if sess is None or self.max_turns <= 0:
+            return []
+        keep = 2 * self.max_turns
+        window = keep + 2 * self.batch_turns if self.summarize is not None else keep
+        rows = list(
+            ChatMessage.objects.filter(session_id=sess["id"], id__gt=sess["history_summary_until"])
+            .order_by("-id")
+            .values_list("id", "role", "content")[:window + 1]
+        )
+        # La vista guarda la pregunta en curso antes de invocar al agente: ya va como input.
+        if rows and rows[0][1] == "user":
+            rows = rows[1:]
+        rows = list(reversed(rows[:window]))
+
+        summary = sess["history_summary"]
+        if self.summarize is not None and len(rows) >= window > keep:
+            summary = self._compact(sess, rows[:-keep]) or summary
+            rows = rows[-keep:]
+        return self._within_budget(summary, rows[-keep:])
+
+    def _compact(self, sess, old_rows) -> Optional[str]:
+        """Incorpora `old_rows` al resumen de la sesión; None si el resumidor falla."""
+        try:
+            summary = self.summarize(sess["history_summary"], [(role, content) for _, role, content in old_rows])
+        except Exception:
+            logger.exception("history compaction failed session=%s", self.session_id)
+            return None
+        summary = _truncate_tokens((summary or "").strip(), self.summary_max_tokens)
+        # Condicionado a la marca previa: si otra petición ya compactó, no se pisa.
+        ChatSession.objects.filter(
+            id=sess["id"], history_summary_until=sess["history_summary_until"]
+        ).update(history_summary=summary, history_summary_until=old_rows[-1][0])
+        logger.info("history compacted session=%s turns=%d", self.session_id, len(old_rows) // 2)
+        return summary
+
+    def _within_budget(self, summary: str, rows) -> List[BaseMessage]:
+        """Resumen + turnos recientes, descartando los más antiguos hasta caber en el presupuesto."""
+        head: List[BaseMessage] = []
+        budget = self.token_budget
+        if summary:
+            text = SUMMARY_PREFIX + _truncate_tokens(summary, min(self.summary_max_tokens, budget // 2))
+            head.append(HumanMessage(content=text))
+            budget -= estimate_tokens(text)
+        tail: List[BaseMessage] = []
+        for _, role, content in reversed(rows):
+            cost = estimate_tokens(content)
+            if cost > budget:
+                break
+            budget -= cost
+            tail.append(_MESSAGE_CLASS[role](content=content))
+        return head + list(reversed(tail))
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        # Los turnos los persisten las vistas en ChatMessage; escribir aquí los duplicaría.
+        return None
+
+    def clear(self) -> None:
+        ChatMessage.objects.filter(session__session_id=self.session_id).delete()
+        ChatSession.objects.filter(session_id=self.session_id).update(history_summary="", history_summary_until=0)
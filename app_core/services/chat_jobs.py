@@ -0,0 +1,217 @@
+"""
+Preguntas en segundo plano para consultas que superan el timeout del proxy o de
+Cloud Run.
+
+POST /api/chat/jobs/ guarda el mensaje del usuario y un ChatJob y responde 202
+con el job_id; la respuesta se calcula fuera de la petición (answer_with_cache,
+igual que /api/chat/) y queda en el job y en ChatMessage. El cliente consulta
+GET /api/chat/jobs/<job_id>/ (con ?wait=<s> espera a que termine).
+
+Quién ejecuta los jobs lo define CHAT_JOBS_EXECUTOR:
+  thread -> CHAT_JOBS_THREADS hilos dentro del proceso web (en Cloud Run
+            requiere CPU siempre asignada)
+  worker -> solo se encolan; los procesa `manage.py chat_worker`
+Un job se toma con un UPDATE condicionado a status=queued, así que dos
+ejecutores nunca corren el mismo. Mientras corre, el ejecutor renueva
+heartbeat_at cada CHAT_JOBS_HEARTBEAT_INTERVAL segundos; los jobs en running
+sin latido hace más de CHAT_JOBS_STALE_AFTER segundos (su proceso murió) se
+re-encolan, hasta CHAT_JOBS_MAX_ATTEMPTS intentos. Un job largo pero vivo no se
+re-encola por lento. Con executor thread eso lo hace un hilo de
+barrido en cada proceso web (start_sweeper, al arrancar y cada
+CHAT_JOBS_SWEEP_INTERVAL segundos), que además toma los jobs encolados hace más
+de un intervalo: los que quedaron sin ejecutar porque su proceso terminó tras el 202.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import ChatJob, ChatMessage, ChatSession
+from .answer_cache import answer_with_cache
+from .metrics import JOB_WAIT_SECONDS, JOBS_TOTAL
+from .result_store import collect_results
+from .tracing import request_trace, stage
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_SWEEPER: Optional[threading.Thread] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "CHAT_JOBS_THREADS", 4), thread_name_prefix="chat-job",
+                )
+        start_sweeper()
+    return _EXECUTOR
+
+
+def enqueue(session_id: str, message: str, mode: Optional[str] = None, source: Optional[str] = None) -> ChatJob:
+    """Guarda la pregunta y el job; con executor thread lo agenda al confirmar la transacción."""
+    with transaction.atomic():
+        sess, _ = ChatSession.objects.get_or_create(session_id=session_id)
+        user_msg = ChatMessage.objects.create(session=sess, role='user', content=message, created_at=timezone.now())
+        job = ChatJob.objects.create(session=sess, user_message=user_msg, question=message, mode=mode or "",
+                                     source=source or "")
+        if getattr(settings, "CHAT_JOBS_EXECUTOR", "thread") == "thread":
+            transaction.on_commit(lambda: _executor().submit(run_job, job.pk))
+    JOBS_TOTAL.inc(status="queued")
+    return job
+
+
+def claim(pk: int) -> bool:
+    """Pasa el job a running solo si sigue encolado; False si otro ejecutor ya lo tomó."""
+    now = timezone.now()
+    return bool(ChatJob.objects.filter(pk=pk, status='queued').update(
+        status='running', started_at=now, heartbeat_at=now, attempts=F("attempts") + 1,
+    ))
+
+
+def beat(pk: int) -> bool:
+    """Renueva heartbeat_at de un job en running; False si ya no lo está."""
+    return bool(ChatJob.objects.filter(pk=pk, status='running').update(heartbeat_at=timezone.now()))
+
+
+@contextmanager
+def _heartbeat(pk: int):
+    """Late cada CHAT_JOBS_HEARTBEAT_INTERVAL segundos desde un hilo propio mientras dura el bloque."""
+    stop = threading.Event()
+    interval = max(getattr(settings, "CHAT_JOBS_HEARTBEAT_INTERVAL", 30), 0.01)
+
+    def loop():
+        try:
+            while not stop.wait(interval):
+                try:
+                    if not beat(pk):
+                        return
+                except Exception:
+                    logger.exception("chat job %s heartbeat failed", pk)
+        finally:
+            connection.close()  # conexión propia de este hilo
+
+    thread = threading.Thread(target=loop, name=f"chat-job-heartbeat-{pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _finish(job: ChatJob, status: str, **fields) -> None:
+    ChatJob.objects.filter(pk=job.pk).update(status=status, finished_at=timezone.now(), **fields)
+    JOBS_TOTAL.inc(status=status)
+
+
+def run_job(pk: int) -> Optional[str]:
+    """Ejecuta un job encolado; retorna su estado final (None si no se pudo tomar)."""
+    close_old_connections()
+    try:
+        if not claim(pk):
+            return None
+        job = ChatJob.objects.select_related("session").get(pk=pk)
+        JOB_WAIT_SECONDS.observe((job.started_at - job.created_at).total_seconds())
+        with _heartbeat(pk), request_trace("chat_job", job_id=str(job.job_id)) as trace:
+            # Mismo contexto de caché que /api/chat/: las preguntas previas a la del job.
+            recent_questions = list(
+                ChatMessage.objects.filter(session=job.session, role='user', id__lt=job.user_message_id or 0)
+                .order_by('-id')
+                .values_list('content', flat=True)[:settings.ANSWER_CACHE_CONTEXT_TURNS]
+            )
+            try:
+                with collect_results() as result_ids:
+                    reply, cached = answer_with_cache(
+                        job.session.session_id, job.question, recent_questions,
+                        mode=job.mode or None, source=job.source or None,
+                    )
+            except RuntimeError as e:
+                trace["outcome"] = "error"
+                ChatMessage.objects.create(
+                    session=job.session, role='assistant', content=f"Error: {e}", created_at=timezone.now()
+                )
+                _finish(job, 'error', error=str(e))
+                return 'error'
+            except Exception:
+                trace["outcome"] = "error"
+                logger.exception("chat job %s failed", job.job_id)
+                _finish(job, 'error', error="Error interno del servidor")
+                return 'error'
+
+            with stage("persist", role="assistant"):
+                ChatMessage.objects.create(session=job.session, role='assistant', content=reply,
+                                           results=result_ids, created_at=timezone.now())
+                _finish(job, 'done', reply=reply, cached=cached, results=result_ids)
+        return 'done'
+    finally:
+        close_old_connections()
+
+
+def requeue_stale() -> int:
+    """Re-encola los jobs en running sin latido reciente; los que agotaron intentos quedan en error."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "CHAT_JOBS_STALE_AFTER", 120))
+    stale = ChatJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    max_attempts = getattr(settings, "CHAT_JOBS_MAX_ATTEMPTS", 2)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='error', error="El job se interrumpió y agotó sus intentos", finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='queued')
+    if failed or requeued:
+        logger.warning("chat jobs stale: requeued=%d failed=%d", requeued, failed)
+    return requeued
+
+
+def queued_ids(limit: int, older_than: float = 0) -> List[int]:
+    jobs = ChatJob.objects.filter(status='queued')
+    if older_than:
+        jobs = jobs.filter(created_at__lt=timezone.now() - timedelta(seconds=older_than))
+    return list(jobs.order_by('id').values_list('id', flat=True)[:limit])
+
+
+def sweep() -> int:
+    """Re-encola los abandonados y agenda en este proceso los encolados que nadie tomó; retorna cuántos agendó."""
+    close_old_connections()
+    try:
+        requeue_stale()
+        # Solo los que llevan más de un intervalo: a los recién creados los agenda enqueue().
+        ids = queued_ids(getattr(settings, "CHAT_JOBS_THREADS", 4),
+                         older_than=getattr(settings, "CHAT_JOBS_SWEEP_INTERVAL", 30))
+    finally:
+        close_old_connections()
+    for pk in ids:
+        _executor().submit(run_job, pk)
+    if ids:
+        logger.info("chat jobs sweep: picked up %d queued jobs", len(ids))
+    return len(ids)
+
+
+def _sweep_loop() -> None:
+    while True:
+        try:
+            sweep()
+        except Exception:
+            logger.exception("chat jobs sweep failed")
+        time.sleep(max(getattr(settings, "CHAT_JOBS_SWEEP_INTERVAL", 30), 1))
+
+
+def start_sweeper() -> None:
+    """Con executor thread, inicia (una vez por proceso) el hilo que recupera jobs; lo llaman wsgi/asgi."""
+    global _SWEEPER
+    if getattr(settings, "CHAT_JOBS_EXECUTOR", "thread") != "thread" or _SWEEPER is not None:
+        return
+    with _EXECUTOR_LOCK:
+        if _SWEEPER is None:
+            _SWEEPER = threading.Thread(target=_sweep_loop, name="chat-jobs-sweeper", daemon=True)
+            _SWEEPER.start()
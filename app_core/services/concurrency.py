@@ -0,0 +1,49 @@
+"""
+Limitador de preguntas en vuelo para la ruta async.
+
+Cada event loop (un proceso ASGI normalmente tiene uno) mantiene su propio
+semáforo; si no se obtiene un cupo dentro de CHAT_QUEUE_TIMEOUT segundos se
+lanza Overloaded para que la vista responda 503 en vez de acumular latencia.
+
+Al crear el semáforo también se fija el executor por defecto del loop (el que
+usa sync_to_async(thread_sensitive=False)) en ASGI_EXECUTOR_THREADS hilos: es
+el tope de consultas simultáneas con el que se dimensiona SQL_POOL_SIZE.
+"""
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+
+class Overloaded(Exception):
+    """No hay cupo para otra pregunta en este proceso."""
+
+
+_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _SEMAPHORES.get(loop)
+    if sem is None:
+        sem = asyncio.Semaphore(getattr(settings, "CHAT_MAX_CONCURRENCY", 200))
+        _SEMAPHORES[loop] = sem
+        loop.set_default_executor(ThreadPoolExecutor(
+            max_workers=getattr(settings, "ASGI_EXECUTOR_THREADS", 8), thread_name_prefix="asgi-sync",
+        ))
+    return sem
+
+
+@asynccontextmanager
+async def chat_slot():
+    sem = _semaphore()
+    try:
+        await asyncio.wait_for(sem.acquire(), timeout=getattr(settings, "CHAT_QUEUE_TIMEOUT", 10))
+    except asyncio.TimeoutError:
+        raise Overloaded("Demasiadas consultas en curso, intenta nuevamente en unos segundos.")
+    try:
+        yield
+    finally:
+        sem.release()
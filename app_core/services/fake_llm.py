@@ -0,0 +1,103 @@
+"""
+Modelo de chat guionado y determinista para benchmarks sin Vertex AI.
+
+Imita a un agente openai-tools: en el primer turno de una pregunta pide
+sql_db_query con un SQL elegido por palabras clave; cuando recibe el
+resultado de la herramienta responde con un texto final. Sin herramientas
+(modo single_shot) devuelve el SQL como texto y luego redacta la respuesta.
+Cada llamada espera `latency` segundos para simular la red/LLM.
+"""
+import asyncio
+import re
+import time
+from itertools import count
+from typing import Any, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# (patrón, SQL) — el primero que calce con la pregunta; el último es el comodín.
+DEFAULT_SCRIPT: Tuple[Tuple[str, str], ...] = (
+    (r"agentes?.*(sede|site)", "SELECT site, COUNT(*) AS n FROM app_core_agent GROUP BY site ORDER BY n DESC"),
+    (r"promedio|aht", "SELECT campaign, AVG(value) AS avg_value FROM app_core_indicator "
+                      "WHERE name = 'AHT' GROUP BY campaign"),
+    (r"top|mejores", "SELECT a.code, AVG(i.value) AS avg_value FROM app_core_indicator i "
+                     "JOIN app_core_agent a ON a.id = i.agent_id WHERE i.name = 'FCR' "
+                     "GROUP BY a.code ORDER BY avg_value DESC LIMIT 10"),
+    (r".*", "SELECT COUNT(*) AS n FROM app_core_agent"),
+)
+
+_CALL_IDS = count(1)
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model falso: una llamada a sql_db_query y luego la respuesta final."""
+
+    latency: float = 0.0
+    script: Sequence[Tuple[str, str]] = DEFAULT_SCRIPT
+    input_tokens_per_char: float = 0.25
+    with_tools: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "analia-scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        # Las herramientas solo deciden si el SQL va como tool_call o como texto.
+        return self.model_copy(update={"with_tools": True})
+
+    def _reply(self, messages: List[BaseMessage], tools: bool = False) -> AIMessage:
+        # create_sql_agent (openai-tools) pasa las herramientas con .bind(tools=...), no con bind_tools().
+        with_tools = self.with_tools or tools
+        prompt_chars = sum(len(_text(m)) for m in messages)
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage):
+            content = f"Según la base de datos: {_text(last)[:300]}"
+            message = AIMessage(content=content)
+        elif last is not None and "SQL ejecutado:" in _text(last):
+            # Redacción de single_shot: las filas van después de "Resultado:".
+            content = f"Según la base de datos: {_text(last).split('Resultado:', 1)[-1].strip()[:300]}"
+            message = AIMessage(content=content)
+        elif not with_tools and last is not None and "La consulta falló" in _text(last):
+            content = self.script[-1][1]  # reintento: el SQL comodín
+            message = AIMessage(content=content)
+        else:
+            humans = [m for m in messages if isinstance(m, HumanMessage)]
+            # El input del agente es SYSTEM_PREFIX + "Pregunta: ..."; solo cuenta la pregunta.
+            question = _text(humans[-1]).rsplit("Pregunta:", 1)[-1].lower() if humans else ""
+            sql = next(sql for pattern, sql in self.script if re.search(pattern, question))
+            if with_tools:
+                message = AIMessage(
+                    content="",
+                    tool_calls=[{"name": "sql_db_query", "args": {"query": sql}, "id": f"call_{next(_CALL_IDS)}"}],
+                )
+            else:
+                message = AIMessage(content=sql)
+            content = sql
+        input_tokens = int(prompt_chars * self.input_tokens_per_char)
+        output_tokens = len(content) // 4 + 1
+        message.usage_metadata = {
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return message
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages, bool(kwargs.get("tools"))))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages, bool(kwargs.get("tools"))))])
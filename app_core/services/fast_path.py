@@ -0,0 +1,320 @@
+"""
+Ruta rápida determinística para las preguntas de BI más frecuentes.
+
+Reconoce unas pocas formas de pregunta sobre Agent/Indicator (conteos por
+sede/región/campaña, promedios de un indicador en un rango de fechas, top N de
+agentes), llena una plantilla SQL parametrizada, la ejecuta con run_raw_select
+y formatea la respuesta sin pasar por el LLM. Si la pregunta no se explica con
+suficiente confianza, o la base no responde, se devuelve None y responde el agente.
+
+Los valores que se reconocen (sedes, regiones, campañas, indicadores) salen de
+Agent y de los agregados mensuales (IndicatorRollup) y se releen cada
+FAST_PATH_VOCAB_TTL segundos.
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .normalization import normalize_question, is_followup
+
+logger = logging.getLogger(__name__)
+
+
+# Palabras que no cambian el significado de la pregunta.
+_STOPWORDS = {
+    "hay", "de", "del", "el", "la", "los", "las", "lo", "que", "es", "son", "cual", "cuales",
+    "muestra", "muestrame", "mostrar", "dame", "dime", "ver", "me", "un", "una", "por", "favor",
+    "en", "a", "al", "segun", "con", "su", "sus", "valor", "actual", "actualmente", "cada",
+    "quiero", "saber", "listado", "lista", "indica", "indicador", "indicadores",
+}
+# Palabras que cambian el significado y que ninguna plantilla cubre
+# (semanal/mensual piden agrupar por periodo, no filtrar).
+_BLOCKERS = {
+    "no", "sin", "inactivos", "inactivo", "excepto", "menos", "mayor", "menor", "entre",
+    "comparado", "comparar", "vs", "versus", "tendencia", "diferencia", "evolucion", "bajas",
+    "semanal", "semanales", "mensual", "mensuales", "diario", "diarios",
+}
+
+_DIMENSIONS = {
+    "campana": "campaign", "campanas": "campaign",
+    "sede": "site", "sedes": "site", "site": "site", "sitio": "site", "ciudad": "site",
+    "region": "region", "regiones": "region",
+}
+_DIM_WORDS = "(?:" + "|".join(_DIMENSIONS) + ")"
+_DIM_LABELS = {"campaign": "campaña", "site": "sede", "region": "región"}
+
+_LOWER_IS_BETTER = {"aht"}
+
+_PERIOD_RE = re.compile(
+    r"\b(?:(?:en|de|durante) )?(?:(?:el|la|los|las) )?"
+    r"(?P<p>ultim[oa]s? (?P<n>\d+) dias|ultim[oa] (?:mes|semana)|(?:mes|semana) pasad[oa]|"
+    r"este mes|esta semana|hoy|ayer)\b"
+)
+_TOP_RE = re.compile(r"\b(?P<kind>top|mejores|peores)(?: (?P<n>\d+))?\b")
+_GROUP_RE = re.compile(r"\bpor (?P<dim>" + "|".join(_DIMENSIONS) + r")\b")
+_COUNT_RE = re.compile(r"\b(?:cuantos|cuantas|numero de|cantidad de|total de|conteo de)\b")
+_AVG_RE = re.compile(r"\b(?:promedio|media|average)\b")
+_AGENTS_RE = re.compile(r"\bagentes?\b")
+_ACTIVE_RE = re.compile(r"\bactivos?\b")
+
+
+@dataclass
+class FastPathMatch:
+    intent: str                      # count_agents | avg_indicator | top_agents
+    confidence: float
+    metric: Optional[str] = None     # nombre tal cual en Indicator.name
+    group_by: Optional[str] = None   # campaign | site | region
+    filters: Dict[str, str] = field(default_factory=dict)
+    since: Optional[date] = None     # [since, until): límites de calendario
+    until: Optional[date] = None
+    period_label: str = ""
+    active_only: bool = False
+    limit: int = 10
+    descending: bool = True
+
+
+# ---------- Vocabulario (valores reales de la base) ----------
+_VOCAB = None
+_VOCAB_AT = 0.0
+_VOCAB_LOCK = threading.Lock()
+
+
+def _vocabulary() -> Dict[str, Dict[str, str]]:
+    """
+    Valores conocidos por dimensión ({normalizado: valor real}), sin tope de
+    filas. Indicadores y campañas salen de los agregados mensuales y no de
+    Indicator completo; se releen cada FAST_PATH_VOCAB_TTL segundos.
+    """
+    global _VOCAB, _VOCAB_AT
+    ttl = getattr(settings, "FAST_PATH_VOCAB_TTL", 300)
+    if _VOCAB is None or time.monotonic() - _VOCAB_AT > ttl:
+        with _VOCAB_LOCK:
+            if _VOCAB is None or time.monotonic() - _VOCAB_AT > ttl:
+                from ..models import Agent, IndicatorRollup
+
+                monthly = IndicatorRollup.objects.filter(grain="month")
+                columns = (
+                    ("site", Agent.objects, "site"), ("region", Agent.objects, "region"),
+                    ("campaign", Agent.objects, "campaign"), ("campaign", monthly, "campaign"),
+                    ("metric", monthly, "name"),
+                )
+                vocab = {"site": {}, "region": {}, "campaign": {}, "metric": {}}
+                for dim, qs, column in columns:
+                    for value in qs.values_list(column, flat=True).distinct():
+                        if value:
+                            vocab[dim][normalize_question(value)] = value
+                _VOCAB, _VOCAB_AT = vocab, time.monotonic()
+    return _VOCAB
+
+
+# ---------- Intención ----------
+def _period(m: re.Match, today: date) -> Tuple[date, date, str]:
+    """(desde, hasta exclusivo, etiqueta) con límites de calendario."""
+    p = m.group("p")
+    tomorrow = today + timedelta(days=1)
+    if m.group("n"):
+        n = int(m.group("n"))
+        return today - timedelta(days=n - 1), tomorrow, f"últimos {n} días"
+    if p == "hoy":
+        return today, tomorrow, "hoy"
+    if p == "ayer":
+        return today - timedelta(days=1), today, "ayer"
+    week = today - timedelta(days=today.weekday())
+    month = today.replace(day=1)
+    if p == "esta semana":
+        return week, tomorrow, "esta semana"
+    if p == "este mes":
+        return month, tomorrow, "este mes"
+    if "semana" in p:
+        return week - timedelta(days=7), week, "semana pasada"
+    return (month - timedelta(days=1)).replace(day=1), month, "mes pasado"
+
+
+def match_question(question: str) -> Optional[FastPathMatch]:
+    """Intenta explicar la pregunta con una plantilla; None si no hay coincidencia."""
+    q = normalize_question(question)
+    if not q or is_followup(q) or _BLOCKERS.intersection(q.split()):
+        return None
+    total = len(q.split())
+    rest = f" {q} "
+
+    def take(pattern):
+        nonlocal rest
+        m = pattern.search(rest)
+        if m:
+            rest = rest[:m.start()] + " " + rest[m.end():]
+        return m
+
+    vocab = _vocabulary()
+    match = FastPathMatch(intent="", confidence=0.0)
+
+    period = take(_PERIOD_RE)
+    if period:
+        match.since, match.until, match.period_label = _period(period, timezone.localdate())
+    top = take(_TOP_RE)
+    group = take(_GROUP_RE)
+    if group:
+        match.group_by = _DIMENSIONS[group.group("dim")]
+
+    for norm, name in sorted(vocab["metric"].items(), key=lambda kv: -len(kv[0])):
+        if take(re.compile(rf"\b{re.escape(norm)}\b")):
+            match.metric = name
+            break
+    for dim in ("campaign", "site", "region"):
+        for norm, value in sorted(vocab[dim].items(), key=lambda kv: -len(kv[0])):
+            if dim not in match.filters and take(re.compile(rf"\b(?:(?:en|de|del) )?(?:(?:la|el) )?(?:{_DIM_WORDS} )?{re.escape(norm)}\b")):
+                match.filters[dim] = value
+    # Un mismo nombre puede ser sede y región (p. ej. Lima): basta con un filtro.
+    if match.filters.get("site") and match.filters.get("site") == match.filters.get("region"):
+        del match.filters["region"]
+
+    agents = take(_AGENTS_RE)
+    count = take(_COUNT_RE)
+    avg = take(_AVG_RE)
+    match.active_only = bool(take(_ACTIVE_RE))
+
+    if agents and count and not match.metric and not period and not top:
+        match.intent = "count_agents"
+    elif match.metric and avg and not top and not agents:
+        match.intent = "avg_indicator"
+    elif match.metric and top and agents and not match.group_by:
+        match.intent = "top_agents"
+        match.limit = min(int(top.group("n") or 10), 100)
+        lower_better = normalize_question(match.metric) in _LOWER_IS_BETTER
+        match.descending = (top.group("kind") == "peores") == lower_better
+    else:
+        return None
+
+    leftover = [w for w in rest.split() if w not in _STOPWORDS]
+    match.confidence = 1.0 - len(leftover) / max(total, 1)
+    return match
+
+
+# ---------- Plantillas ----------
+_AGENT_COLUMNS = {"campaign": "a.campaign", "site": "a.site", "region": "a.region"}
+_INDICATOR_COLUMNS = {"campaign": "i.campaign", "site": "a.site", "region": "a.region"}
+
+
+def build_sql(m: FastPathMatch) -> Tuple[str, Dict]:
+    params: Dict = {}
+    where: List[str] = []
+    if m.intent == "count_agents":
+        cols = _AGENT_COLUMNS
+        if m.active_only:
+            where.append("a.active = :active")
+            params["active"] = True
+    else:
+        cols = _INDICATOR_COLUMNS
+        where.append("i.name = :metric")
+        params["metric"] = m.metric
+        if m.since:
+            where.append("i.date >= :since")
+            params["since"] = m.since
+        if m.until:
+            where.append("i.date < :until")
+            params["until"] = m.until
+    for dim, value in m.filters.items():
+        where.append(f"{cols[dim]} = :{dim}")
+        params[dim] = value
+    where_sql = " WHERE " + " AND ".join(where) if where else ""
+
+    if m.intent == "count_agents":
+        if m.group_by:
+            g = cols[m.group_by]
+            return (f"SELECT {g} AS grp, COUNT(*) AS value FROM app_core_agent a{where_sql} "
+                    f"GROUP BY {g} ORDER BY value DESC, grp", params)
+        return f"SELECT COUNT(*) AS value FROM app_core_agent a{where_sql}", params
+
+    if m.intent == "avg_indicator":
+        base = "FROM app_core_indicator i LEFT JOIN app_core_agent a ON a.id = i.agent_id"
+        if m.group_by:
+            g = cols[m.group_by]
+            return (f"SELECT {g} AS grp, AVG(i.value) AS value, COUNT(*) AS n {base}{where_sql} "
+                    f"GROUP BY {g} ORDER BY grp", params)
+        return f"SELECT AVG(i.value) AS value, COUNT(*) AS n {base}{where_sql}", params
+
+    order = "DESC" if m.descending else "ASC"
+    params["limit"] = m.limit
+    return (
+        "SELECT a.code AS code, a.full_name AS full_name, AVG(i.value) AS value "
+        f"FROM app_core_indicator i JOIN app_core_agent a ON a.id = i.agent_id{where_sql} "
+        f"GROUP BY a.code, a.full_name ORDER BY value {order}, a.code LIMIT :limit",
+        params,
+    )
+
+
+# ---------- Formato ----------
+def _num(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return f"{value:,}"
+
+
+def _scope(m: FastPathMatch) -> str:
+    parts = [f"{_DIM_LABELS[d]} {v}" for d, v in m.filters.items()]
+    if m.period_label:
+        parts.append(m.period_label)
+    return f" ({', '.join(parts)})" if parts else ""
+
+
+def format_answer(m: FastPathMatch, rows: List[Dict]) -> str:
+    if not rows or all(r.get("value") is None for r in rows):
+        return "No encuentro datos para esa consulta"
+    scope = _scope(m)
+    if m.intent == "count_agents":
+        subject = "agentes activos" if m.active_only else "agentes"
+        if m.group_by:
+            lines = [f"- {r['grp'] or '(sin dato)'}: {_num(r['value'])}" for r in rows]
+            return f"Cantidad de {subject} por {_DIM_LABELS[m.group_by]}{scope}:\n" + "\n".join(lines)
+        return f"Hay {_num(rows[0]['value'])} {subject}{scope}."
+    if m.intent == "avg_indicator":
+        if m.group_by:
+            lines = [f"- {r['grp'] or '(sin dato)'}: {_num(float(r['value']))}" for r in rows if r["value"] is not None]
+            return f"Promedio de {m.metric} por {_DIM_LABELS[m.group_by]}{scope}:\n" + "\n".join(lines)
+        return f"El promedio de {m.metric}{scope} es {_num(float(rows[0]['value']))} ({_num(rows[0]['n'])} registros)."
+    lines = [f"{i}. {r['code']} - {r['full_name']}: {_num(float(r['value']))}" for i, r in enumerate(rows, 1)]
+    kind = "Top" if m.descending != (normalize_question(m.metric) in _LOWER_IS_BETTER) else "Peores"
+    return f"{kind} {len(rows)} agentes por {m.metric}{scope}:\n" + "\n".join(lines)
+
+
+# ---------- API ----------
+def try_fast_path(user_query: str) -> Optional[str]:
+    """Responde sin LLM si la pregunta calza con una plantilla; si no, None."""
+    if not getattr(settings, "FAST_PATH_ENABLED", True):
+        return None
+    from django.db import DatabaseError
+    from sqlalchemy.exc import DBAPIError
+
+    from .query_exec import QueryRejected
+    from .result_store import save_result
+    from .sql_agent import run_raw_select
+
+    started = time.perf_counter()
+    try:
+        m = match_question(user_query)
+    except DatabaseError as e:
+        logger.warning("fast_path vocabulary unavailable: %s", e)
+        return None  # sin vocabulario: que lo intente el agente
+    threshold = getattr(settings, "FAST_PATH_MIN_CONFIDENCE", 0.9)
+    if m is None or m.confidence < threshold:
+        return None
+
+    sql, params = build_sql(m)
+    try:
+        rows = run_raw_select(sql, params)
+    except (QueryRejected, DBAPIError, RuntimeError):
+        return None  # demasiado costosa, lenta o sin conexión: la decide el agente
+    answer = format_answer(m, rows)
+    save_result(sql, rows, rows.truncated)  # top N y desgloses: la tabla va aparte al cliente
+    logger.info(
+        "fast_path hit intent=%s confidence=%.2f elapsed_ms=%.1f",
+        m.intent, m.confidence, (time.perf_counter() - started) * 1000,
+    )
+    return answer
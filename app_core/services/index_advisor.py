@@ -0,0 +1,523 @@
+"""
+Asesor de índices a partir del workload registrado (SqlFingerprint).
+
+  1. analyze(): re-ejecuta el sample_sql de los fingerprints más costosos, con
+     sus sample_params si usa parámetros (ruta rápida), tal como lo corre
+     execute_select (envuelto en LIMIT) con EXPLAIN (ANALYZE,
+     BUFFERS) en PostgreSQL, o EXPLAIN QUERY PLAN más el tiempo medido en
+     SQLite, y anota scans secuenciales, filtros que descartan muchas filas,
+     joins sin índice y ordenamientos en disco.
+  2. propose(): por cada tabla escaneada arma un índice con las columnas de
+     igualdad, luego las de join y una de rango u orden. Las igualdades con
+     constante sobre columnas booleanas o de muy pocos valores van como índice
+     parcial (WHERE) y las pocas columnas que además lee la consulta como
+     INCLUDE (índice cubriente; en SQLite se agregan a la clave).
+  3. benchmark(): sobre una copia de la base crea cada candidato, re-mide las
+     consultas que lo usarían y lo deshace (ROLLBACK en PostgreSQL, DROP INDEX
+     en SQLite).
+  4. migration_source(): arma la migración con los candidatos que mejoraron
+     (AddIndexConcurrently en PostgreSQL).
+
+El SQL se lee con expresiones regulares: cubre lo que genera el agente (SELECT
+con JOIN, WHERE, GROUP BY, ORDER BY), no SQL arbitrario. Los predicados sobre
+funciones (date(x) = ...) no generan candidatos. Una comparación con un
+parámetro (`i.name = :metric`) cuenta como igualdad, pero nunca como condición
+de índice parcial: su valor cambia entre llamadas.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import StatementError
+from sqlalchemy.pool import NullPool
+
+from .query_exec import QueryRejected, _read_only, _set_timeout, prepare_select
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_PARAM_RE = re.compile(r"%\(\w+\)s|(?<![:\w]):\w+|\$\d+|\?")
+_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "on", "group", "order", "limit",
+    "using", "natural", "outer", "having", "union", "select", "as",
+}
+_TABLE_RE = re.compile(r"\b(?:from|join)\s+(\"?[\w.]+\"?)(?:\s+(?:as\s+)?(\w+))?", re.IGNORECASE)
+_IDENT = r"(?:(\w+)\.)?\"?(\w+)\"?"
+_LITERAL = r"('(?:[^']|'')*'|-?\d+(?:\.\d+)?|true|false|:\w+|%\(\w+\)s|\$\d+|\?)"
+_CMP_RE = re.compile(rf"(?<![\w.(]){_IDENT}\s*(=|<>|!=|<=|>=|<|>)\s*{_LITERAL}", re.IGNORECASE)
+_IN_RE = re.compile(rf"(?<![\w.(]){_IDENT}\s+(?:not\s+)?in\s*\(|(?<![\w.(]){_IDENT}\s*=\s*\(\s*select\b", re.IGNORECASE)
+_BETWEEN_RE = re.compile(rf"(?<![\w.(]){_IDENT}\s+between\b", re.IGNORECASE)
+_JOIN_RE = re.compile(rf"(?<![\w.(]){_IDENT}\s*=\s*{_IDENT}(?![\w(])", re.IGNORECASE)
+_CLAUSE_RE = {
+    "order": re.compile(r"\border\s+by\s+(.*?)(?:\blimit\b|\boffset\b|\)|$)", re.IGNORECASE | re.DOTALL),
+    "group": re.compile(r"\bgroup\s+by\s+(.*?)(?:\bhaving\b|\border\b|\blimit\b|\)|$)", re.IGNORECASE | re.DOTALL),
+    "select": re.compile(r"^\s*select\s+(?:distinct\s+)?(.*?)\bfrom\b", re.IGNORECASE | re.DOTALL),
+}
+_REF_RE = re.compile(_IDENT)
+_SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?", re.IGNORECASE)
+_SQLITE_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)", re.IGNORECASE)
+
+PARTIAL_MAX_DISTINCT = 5  # columnas con a lo sumo estos valores van al WHERE de un índice parcial
+MAX_KEY_COLUMNS = 3
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def _unquote(name: str) -> str:
+    return name.strip('"').split(".")[-1].lower()
+
+
+# ---------- Lectura del SQL ----------
+@dataclass
+class QueryShape:
+    """Columnas que usa una consulta, por tabla."""
+    aliases: Dict[str, str] = field(default_factory=dict)
+    eq: Dict[str, List[str]] = field(default_factory=dict)
+    range: Dict[str, List[str]] = field(default_factory=dict)
+    join: Dict[str, List[str]] = field(default_factory=dict)
+    order: Dict[str, List[str]] = field(default_factory=dict)
+    selected: Dict[str, List[str]] = field(default_factory=dict)
+    literals: Dict[Tuple[str, str], str] = field(default_factory=dict)  # (tabla, columna) -> literal de "="
+    star: bool = False
+
+    @property
+    def tables(self) -> Set[str]:
+        return set(self.aliases.values())
+
+
+def _add(bucket: Dict[str, List[str]], table: str, column: str) -> None:
+    cols = bucket.setdefault(table, [])
+    if column not in cols:
+        cols.append(column)
+
+
+def parse_query(sql: str, columns: Dict[str, Set[str]]) -> QueryShape:
+    """`columns`: columnas de cada tabla conocida (para atribuir referencias sin alias)."""
+    sql = _COMMENT_RE.sub(" ", sql)
+    shape = QueryShape()
+    for name, alias in _TABLE_RE.findall(sql):
+        table = _unquote(name)
+        if table not in columns:
+            continue
+        shape.aliases[table] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            shape.aliases[alias.lower()] = table
+
+    def resolve(qual: str, col: str) -> Optional[Tuple[str, str]]:
+        col = col.lower()
+        if qual:
+            table = shape.aliases.get(qual.lower())
+            return (table, col) if table and col in columns[table] else None
+        owners = [t for t in shape.tables if col in columns[t]]
+        return (owners[0], col) if len(owners) == 1 else None
+
+    for qual, col, op, literal in _CMP_RE.findall(sql):
+        ref = resolve(qual, col)
+        if ref:
+            _add(shape.eq if op == "=" else shape.range, *ref)
+            if op == "=" and not _PARAM_RE.fullmatch(literal):
+                shape.literals[ref] = literal
+    for q1, c1, q2, c2 in _IN_RE.findall(sql):  # IN (...) o = (SELECT ...)
+        ref = resolve(q1 or q2, c1 or c2)
+        if ref:
+            _add(shape.eq, *ref)
+    for qual, col in _BETWEEN_RE.findall(sql):
+        ref = resolve(qual, col)
+        if ref:
+            _add(shape.range, *ref)
+    for q1, c1, q2, c2 in _JOIN_RE.findall(sql):
+        left, right = resolve(q1, c1), resolve(q2, c2)
+        if left and right and left[0] != right[0]:
+            _add(shape.join, *left)
+            _add(shape.join, *right)
+    for kind in ("order", "group"):
+        match = _CLAUSE_RE[kind].search(sql)
+        for qual, col in _REF_RE.findall(match.group(1) if match else ""):
+            ref = resolve(qual, col)
+            if ref:
+                _add(shape.order, *ref)
+    match = _CLAUSE_RE["select"].search(sql)
+    if match:
+        shape.star = "*" in match.group(1)
+        for qual, col in _REF_RE.findall(match.group(1)):
+            ref = resolve(qual, col)
+            if ref:
+                _add(shape.selected, *ref)
+    return shape
+
+
+# ---------- Planes ----------
+@dataclass
+class Issue:
+    table: str
+    kind: str       # seq_scan | filter | join | sort
+    detail: str
+    rows: int = 0   # filas leídas o descartadas (0 si el motor no lo informa)
+
+
+@dataclass
+class Replay:
+    fingerprint: object  # SqlFingerprint
+    shape: QueryShape
+    ms: Optional[float] = None
+    issues: List[Issue] = field(default_factory=list)
+    buffers: Optional[int] = None
+    skipped: str = ""
+    params: Dict = field(default_factory=dict)  # sample_params del fingerprint
+
+
+def _walk(node: Dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _pg_plan(conn, sql: str, params: Dict) -> Dict:
+    return conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()[0]
+
+
+def _pg_issues(plan: Dict, min_rows: int) -> List[Issue]:
+    issues = []
+    for node in _walk(plan["Plan"]):
+        kind = node["Node Type"]
+        loops = node.get("Actual Loops", 1) or 1
+        table = node.get("Relation Name")
+        removed = int(node.get("Rows Removed by Filter", 0) * loops)
+        read = int(node.get("Actual Rows", 0) * loops) + removed
+        if kind == "Seq Scan" and table:
+            if loops > 1:
+                issues.append(Issue(table, "join", f"Seq Scan interno de un join repetido {loops} veces", read))
+            elif read >= min_rows:
+                detail = f"Seq Scan de {read:,} filas"
+                if node.get("Filter"):
+                    detail += f", {removed:,} descartadas por {node['Filter']}"
+                issues.append(Issue(table, "seq_scan", detail, read))
+        elif table and removed >= min_rows:
+            issues.append(Issue(table, "filter", f"{kind} descarta {removed:,} filas por {node.get('Filter')}", removed))
+        elif kind == "Sort" and node.get("Sort Space Type") == "Disk":
+            issues.append(Issue("", "sort", f"Sort en disco por {', '.join(node.get('Sort Key', []))}"))
+    return issues
+
+
+def _sqlite_issues(conn, sql: str, params: Dict, shape: QueryShape, row_counts: Dict[str, int],
+                   min_rows: int) -> List[Issue]:
+    issues = []
+    for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params):
+        detail = row[-1]
+        scan = _SQLITE_SCAN_RE.match(detail)  # también SCAN ... USING INDEX: recorre el índice entero
+        if scan:
+            table = shape.aliases.get((scan.group(2) or scan.group(1)).lower())
+            if table and row_counts.get(table, 0) >= min_rows:
+                issues.append(Issue(table, "seq_scan", f"{detail} ({row_counts[table]:,} filas)", row_counts[table]))
+        elif "AUTOMATIC" in detail:
+            issues.append(Issue("", "join", detail))
+        elif "TEMP B-TREE" in detail:
+            issues.append(Issue("", "sort", detail))
+    return issues
+
+
+def _timed(conn, sql: str, params: Dict, dialect: str, repeat: int) -> float:
+    """Mediana en ms: Execution Time de EXPLAIN ANALYZE en PostgreSQL, reloj de pared en SQLite."""
+    samples = []
+    for _ in range(max(repeat, 1)):
+        if dialect == "postgresql":
+            samples.append(float(_pg_plan(conn, sql, params)["Execution Time"]))
+        else:
+            started = time.perf_counter()
+            conn.execute(text(sql), params).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def _table_columns(engine) -> Dict[str, Set[str]]:
+    insp = inspect(engine)
+    return {t.lower(): {c["name"].lower() for c in insp.get_columns(t)} for t in insp.get_table_names()}
+
+
+def analyze(engine, fingerprints: Sequence, min_rows: int = 10_000) -> List[Replay]:
+    """Re-ejecuta cada fingerprint (sample_sql con sample_params) y anota los problemas de su plan."""
+    dialect = engine.dialect.name
+    columns = _table_columns(engine)
+    row_counts: Dict[str, int] = {}
+    max_rows = _setting("SQL_MAX_ROWS", 1000)
+    replays = []
+    with engine.connect() as conn:
+        for fp in fingerprints:
+            shape = parse_query(fp.sample_sql, columns)
+            replay = Replay(fp, shape, params=dict(fp.sample_params or {}))
+            replays.append(replay)
+            if not replay.params and _PARAM_RE.search(
+                _COMMENT_RE.sub(" ", re.sub(r"'(?:[^']|'')*'", "''", fp.sample_sql))
+            ):
+                replay.skipped = "usa parámetros y no tiene sample_params registrados"
+                continue
+            try:
+                bounded = prepare_select(fp.sample_sql, max_rows)
+            except QueryRejected as e:
+                replay.skipped = str(e)
+                continue
+            try:
+                with conn.begin():
+                    # EXPLAIN ANALYZE ejecuta la consulta: mismas protecciones que execute_select.
+                    _read_only(conn)
+                    clear_timeout = _set_timeout(conn, _setting("SQL_STATEMENT_TIMEOUT_MS", 15_000))
+                    try:
+                        if dialect == "postgresql":
+                            plan = _pg_plan(conn, bounded, replay.params)
+                            replay.issues = _pg_issues(plan, min_rows)
+                            replay.buffers = sum(plan["Plan"].get(k, 0) for k in ("Shared Hit Blocks", "Shared Read Blocks"))
+                            replay.ms = round(float(plan["Execution Time"]), 2)
+                        else:
+                            for table in shape.tables - row_counts.keys():
+                                row_counts[table] = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+                            replay.issues = _sqlite_issues(conn, bounded, replay.params, shape, row_counts, min_rows)
+                            replay.ms = _timed(conn, bounded, replay.params, dialect, 1)
+                    finally:
+                        clear_timeout()
+            except StatementError as e:  # DBAPIError, o un parámetro sin valor
+                replay.skipped = f"falló al re-ejecutar: {str(e.orig or e).splitlines()[0]}"
+    return replays
+
+
+# ---------- Candidatos ----------
+@dataclass
+class Candidate:
+    table: str
+    columns: List[str]
+    include: List[str] = field(default_factory=list)
+    condition: List[Tuple[str, str]] = field(default_factory=list)  # (columna, literal SQL)
+    fingerprints: List[str] = field(default_factory=list)
+    reasons: List[str] = field(default_factory=list)
+    calls: int = 0
+    before_ms: Optional[float] = None
+    after_ms: Optional[float] = None
+    used: Optional[bool] = None
+    size_bytes: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        # Django exige nombres de índice de hasta 30 caracteres que empiecen con letra.
+        base = f"{self.table.removeprefix('app_core_')[:8]}_{'_'.join(c[:5] for c in self.columns)}"
+        digest = hashlib.sha1(json.dumps([self.table, self.columns, self.include, self.condition]).encode()).hexdigest()
+        return f"{base[:20]}_{digest[:6]}_ix"
+
+    @property
+    def gain(self) -> Optional[float]:
+        if not self.before_ms or self.after_ms is None:
+            return None
+        return round((self.before_ms - self.after_ms) / self.before_ms, 3)
+
+    def ddl(self, dialect: str) -> str:
+        cols = self.columns + ([] if dialect == "postgresql" else self.include)
+        sql = f'CREATE INDEX {self.name} ON "{self.table}" ({", ".join(cols)})'
+        if dialect == "postgresql" and self.include:
+            sql += f" INCLUDE ({', '.join(self.include)})"
+        if self.condition:
+            sql += " WHERE " + " AND ".join(f"{c} = {v}" for c, v in self.condition)
+        return sql
+
+
+def _bool_columns(engine) -> Set[Tuple[str, str]]:
+    insp = inspect(engine)
+    found = set()
+    for table in insp.get_table_names():
+        for col in insp.get_columns(table):
+            try:
+                if col["type"].python_type is bool:
+                    found.add((table.lower(), col["name"].lower()))
+            except NotImplementedError:
+                continue
+    return found
+
+
+def _low_cardinality(engine, table: str, column: str, bool_columns: Set[Tuple[str, str]]) -> bool:
+    """Booleanas siempre; en PostgreSQL también las de n_distinct <= PARTIAL_MAX_DISTINCT (pg_stats)."""
+    if (table, column) in bool_columns:
+        return True
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        n = conn.execute(
+            text("SELECT n_distinct FROM pg_stats WHERE tablename = :t AND attname = :c"), {"t": table, "c": column}
+        ).scalar()
+    return n is not None and 0 < n <= PARTIAL_MAX_DISTINCT
+
+
+def _existing_prefixes(engine, table: str) -> List[List[str]]:
+    insp = inspect(engine)
+    indexes = [[c.lower() for c in ix["column_names"] if c] for ix in insp.get_indexes(table)]
+    pk = insp.get_pk_constraint(table).get("constrained_columns") or []
+    return indexes + ([[c.lower() for c in pk]] if pk else [])
+
+
+def propose(engine, replays: Sequence[Replay], max_include: int = 3) -> List[Candidate]:
+    """Un candidato por tabla problemática de cada consulta; se fusionan los iguales."""
+    bool_columns = _bool_columns(engine)
+    merged: Dict[Tuple, Candidate] = {}
+    for replay in replays:
+        shape = replay.shape
+        for table in sorted({i.table for i in replay.issues if i.table}):
+            eq = shape.eq.get(table, [])
+            partial = [(c, shape.literals[(table, c)]) for c in eq
+                       if (table, c) in shape.literals and _low_cardinality(engine, table, c, bool_columns)]
+            partial_cols = {c for c, _ in partial}
+            key = [c for c in eq if c not in partial_cols]
+            key += [c for c in shape.join.get(table, []) if c not in key]
+            tail = shape.range.get(table, []) + shape.order.get(table, [])
+            key += [c for c in tail if c not in key][:1]
+            key = key[:MAX_KEY_COLUMNS]
+            if not key:
+                # Solo había igualdades de baja cardinalidad: van como clave, no como WHERE.
+                key, partial = [c for c, _ in partial][:MAX_KEY_COLUMNS], []
+            if not key or any(ix[:len(key)] == key for ix in _existing_prefixes(engine, table)):
+                continue
+            include = []
+            if not shape.star:
+                include = [c for c in shape.selected.get(table, []) if c not in key and c not in partial_cols]
+                include = include if len(include) <= max_include else []
+            ident = (table, tuple(key), tuple(partial))
+            cand = merged.get(ident)
+            if cand is None:
+                cand = merged[ident] = Candidate(table, key, include, partial)
+            else:
+                cand.include += [c for c in include if c not in cand.include][:max(max_include - len(cand.include), 0)]
+            cand.fingerprints.append(replay.fingerprint.fingerprint)
+            cand.calls += replay.fingerprint.calls
+            cand.reasons += [i.detail for i in replay.issues if i.table == table]
+    return sorted(merged.values(), key=lambda c: c.calls, reverse=True)
+
+
+# ---------- Benchmark sobre una copia ----------
+def sqlite_copy(engine) -> Tuple[object, Path]:
+    """Copia consistente (backup API) de una base SQLite a un directorio temporal."""
+    dst = Path(tempfile.mkdtemp(prefix="analia_idx_")) / "copy.sqlite3"
+    with sqlite3.connect(engine.url.database) as src, sqlite3.connect(dst) as out:
+        src.backup(out)
+    return create_engine(f"sqlite:///{dst.as_posix()}", poolclass=NullPool), dst
+
+
+def copy_engine(url: str):
+    return create_engine(url, poolclass=NullPool)
+
+
+def _plan_uses(conn, sql: str, params: Dict, index: str, dialect: str) -> bool:
+    if dialect == "postgresql":
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()[0]
+        return any(node.get("Index Name") == index for node in _walk(plan["Plan"]))
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)
+    return any(index in _SQLITE_INDEX_RE.findall(row[-1]) for row in rows)
+
+
+def benchmark(engine, candidates: Sequence[Candidate], replays: Sequence[Replay], repeat: int = 3) -> None:
+    """
+    Mide cada candidato sobre `engine` (una copia: crea y deshace índices).
+    Completa before_ms/after_ms (suma de las medianas de sus consultas), used y size_bytes.
+    """
+    dialect = engine.dialect.name
+    max_rows = _setting("SQL_MAX_ROWS", 1000)
+    by_fp = {r.fingerprint.fingerprint: (prepare_select(r.fingerprint.sample_sql, max_rows), r.params)
+             for r in replays if not r.skipped}
+    with engine.connect() as conn:
+        baseline = {fp: _timed(conn, sql, params, dialect, repeat) for fp, (sql, params) in by_fp.items()}
+        conn.rollback()
+        for cand in candidates:
+            queries = [fp for fp in cand.fingerprints if fp in by_fp]
+            if not queries:
+                continue
+            cand.before_ms = round(sum(baseline[fp] for fp in queries), 2)
+            trans = conn.begin()
+            try:
+                started = time.perf_counter()
+                conn.execute(text(cand.ddl(dialect)))
+                conn.execute(text(f'ANALYZE "{cand.table}"'))
+                logger.info("index advisor built %s in %.0f ms", cand.name, (time.perf_counter() - started) * 1000)
+                cand.after_ms = round(sum(_timed(conn, *by_fp[fp], dialect, repeat) for fp in queries), 2)
+                cand.used = any(_plan_uses(conn, *by_fp[fp], cand.name, dialect) for fp in queries)
+                if dialect == "postgresql":
+                    cand.size_bytes = conn.execute(text("SELECT pg_relation_size(:n)"), {"n": cand.name}).scalar()
+            finally:
+                trans.rollback()
+                if dialect != "postgresql":
+                    # pysqlite confirma el DDL fuera de la transacción: se borra a mano.
+                    conn.execute(text(f"DROP INDEX IF EXISTS {cand.name}"))
+                    conn.commit()
+
+
+# ---------- Migración ----------
+def model_for_table(table: str):
+    from django.apps import apps
+
+    for model in apps.get_app_config("app_core").get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def _python_literal(literal: str, field):
+    if field.get_internal_type() == "BooleanField":
+        return literal.lower() in ("true", "1")
+    if literal.lower() in ("true", "false"):
+        return literal.lower() == "true"
+    if literal.startswith("'"):
+        return literal[1:-1].replace("''", "'")
+    return float(literal) if "." in literal else int(literal)
+
+
+def _leaf_migration() -> str:
+    from django.db.migrations.loader import MigrationLoader
+
+    graph = MigrationLoader(None, ignore_no_migrations=True).graph
+    return sorted(name for app, name in graph.leaf_nodes() if app == "app_core")[-1]
+
+
+def migration_name(suffix: str = "advisor_indexes") -> str:
+    return f"{int(_leaf_migration()[:4]) + 1:04d}_{suffix}"
+
+
+def migration_source(candidates: Sequence[Candidate], vendor: str) -> Tuple[str, List[str]]:
+    """
+    Código de la migración para índices sobre tablas de app_core y las líneas de
+    Meta.indexes que hay que agregar a los modelos. Fuera de PostgreSQL no hay
+    INCLUDE: esas columnas van a la clave, igual que en el benchmark.
+    """
+    postgres = vendor == "postgresql"
+    operation = "AddIndexConcurrently" if postgres else "migrations.AddIndex"
+    ops, meta = [], []
+    for cand in candidates:
+        model = model_for_table(cand.table)
+        by_column = {f.column: f for f in model._meta.concrete_fields}
+        fields = {column: f.name for column, f in by_column.items()}
+        key = cand.columns if postgres else cand.columns + cand.include
+        args = [f"fields={[fields.get(c, c) for c in key]!r}", f"name={cand.name!r}"]
+        if cand.include and postgres:
+            args.append(f"include={[fields.get(c, c) for c in cand.include]!r}")
+        if cand.condition:
+            q = ", ".join(f"{fields.get(c, c)}={_python_literal(v, by_column[c])!r}" for c, v in cand.condition)
+            args.append(f"condition=models.Q({q})")
+        index = f"models.Index({', '.join(args)})"
+        ops.append(f"        {operation}(\n            model_name={model._meta.model_name!r},\n"
+                   f"            index={index},\n        ),")
+        meta.append(f"{model.__name__}: {index}")
+    header = "from django.db import migrations, models\n"
+    if postgres:
+        header = "from django.contrib.postgres.operations import AddIndexConcurrently\n" + header
+    body = (
+        f"# Generada por advise_indexes el {time.strftime('%Y-%m-%d %H:%M')}\n\n{header}\n\n"
+        "class Migration(migrations.Migration):\n"
+        + ("    atomic = False  # CREATE INDEX CONCURRENTLY no corre dentro de una transacción\n\n" if postgres else "")
+        + f"    dependencies = [\n        ('app_core', {_leaf_migration()!r}),\n    ]\n\n"
+        "    operations = [\n" + "\n".join(ops) + "\n    ]\n"
+    )
+    return body, meta
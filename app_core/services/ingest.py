@@ -0,0 +1,207 @@
+"""
+Ingesta masiva de Indicator desde exportes CSV o Parquet (ACD/WFM).
+
+El archivo se lee por bloques (memoria constante sin importar su tamaño). Cada
+bloque se carga en una tabla temporal de staging (COPY en PostgreSQL,
+executemany en otros motores) y se aplica con dos sentencias set-based:
+UPDATE de las filas existentes e INSERT de las nuevas. La clave natural es
+(agente, indicador, campaña, fecha); dentro de un bloque gana la última fila.
+
+Columnas esperadas: agent_code, name, campaign, date (YYYY-MM-DD), value.
+"""
+import csv
+import io
+import logging
+import time
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import Agent
+from .answer_cache import bump_data_version
+from .rollups import mark_dirty, refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("agent_code", "name", "campaign", "date", "value")
+DEFAULT_CHUNK_SIZE = 50_000
+STAGING_TABLE = "analia_indicator_staging"
+
+_CREATE_STAGING = (
+    f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+    "(agent_id bigint, name varchar(100), campaign varchar(100), date date, value double precision)"
+)
+_COPY_STAGING = f"COPY {STAGING_TABLE} (agent_id, name, campaign, date, value) FROM STDIN WITH (FORMAT csv)"
+# COALESCE(agent_id, 0) para que los indicadores sin agente también casen (ids reales son > 0).
+_MATCH = (
+    "i.name = s.name AND i.campaign = s.campaign AND i.date = s.date "
+    "AND COALESCE(i.agent_id, 0) = COALESCE(s.agent_id, 0)"
+)
+_UPDATE = f"UPDATE app_core_indicator AS i SET value = s.value FROM {STAGING_TABLE} AS s WHERE {_MATCH}"
+_INSERT = (
+    "INSERT INTO app_core_indicator (name, campaign, date, value, agent_id) "
+    f"SELECT s.name, s.campaign, s.date, s.value, s.agent_id FROM {STAGING_TABLE} AS s "
+    f"WHERE NOT EXISTS (SELECT 1 FROM app_core_indicator AS i WHERE {_MATCH})"
+)
+
+Row = Tuple[Optional[int], str, str, date, float]
+
+
+class IngestError(ValueError):
+    """Archivo de entrada inválido (formato o columnas)."""
+
+
+# ---------- Lectores por bloques ----------
+def _csv_chunks(fileobj, chunk_size: int) -> Iterator[List[Dict]]:
+    reader = csv.DictReader(fileobj)
+    missing = set(COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise IngestError(f"Faltan columnas en el CSV: {', '.join(sorted(missing))}")
+    chunk = []
+    for record in reader:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parquet_chunks(source, chunk_size: int) -> Iterator[List[Dict]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise IngestError("Leer Parquet requiere pyarrow (pip install pyarrow)") from e
+    pf = pq.ParquetFile(source)
+    missing = set(COLUMNS) - set(pf.schema_arrow.names)
+    if missing:
+        raise IngestError(f"Faltan columnas en el Parquet: {', '.join(sorted(missing))}")
+    for batch in pf.iter_batches(batch_size=chunk_size, columns=list(COLUMNS)):
+        yield batch.to_pylist()
+
+
+def detect_format(name: str) -> str:
+    suffix = Path(name).suffix.lower()
+    if suffix in (".parquet", ".pq"):
+        return "parquet"
+    if suffix in (".csv", ".txt"):
+        return "csv"
+    raise IngestError(f"No se reconoce el formato de {name!r} (usa .csv o .parquet)")
+
+
+# ---------- Carga ----------
+def _clean(records: List[Dict], agent_ids: Dict[str, int]) -> Tuple[List[Row], int, int]:
+    """Convierte un bloque a filas de staging. Retorna (filas, sin_agente, inválidas)."""
+    rows: Dict[Tuple, Row] = {}
+    unknown = invalid = 0
+    for rec in records:
+        code = (rec.get("agent_code") or "").strip()
+        agent_id = agent_ids.get(code) if code else None
+        if code and agent_id is None:
+            unknown += 1
+            continue
+        try:
+            d = rec["date"]
+            if not isinstance(d, date):
+                d = date.fromisoformat(str(d).strip())
+            row = (agent_id, str(rec["name"]).strip(), (rec.get("campaign") or "").strip(), d, float(rec["value"]))
+        except (TypeError, ValueError):
+            invalid += 1
+            continue
+        if not row[1]:
+            invalid += 1
+            continue
+        rows[row[:4]] = row  # la última fila de la clave gana
+    return list(rows.values()), unknown, invalid
+
+
+def _stage(cur, rows: List[Row]) -> None:
+    if connection.vendor == "postgresql":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for agent_id, name, campaign, d, value in rows:
+            writer.writerow(("" if agent_id is None else agent_id, name, campaign, d.isoformat(), value))
+        buf.seek(0)
+        cur.copy_expert(_COPY_STAGING, buf)
+    else:
+        cur.executemany(
+            f"INSERT INTO {STAGING_TABLE} (agent_id, name, campaign, date, value) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def _apply(rows: List[Row]) -> Tuple[int, int]:
+    """Aplica un bloque. Retorna (actualizadas, insertadas)."""
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {STAGING_TABLE}")
+        _stage(cur, rows)
+        cur.execute(_UPDATE)
+        updated = max(cur.rowcount, 0)
+        cur.execute(_INSERT)
+        inserted = max(cur.rowcount, 0)
+        if updated or inserted:
+            # En la misma transacción: el refresco no puede ver la marca sin las filas.
+            mark_dirty(row[3] for row in rows)
+    return updated, inserted
+
+
+def ingest_indicators(
+    source,
+    fmt: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """
+    Carga un exporte de indicadores. `source` es una ruta o un archivo abierto
+    (binario para Parquet); `fmt` es "csv" o "parquet" (por defecto según la
+    extensión). `progress` recibe el resumen acumulado tras cada bloque.
+    """
+    if fmt is None:
+        fmt = detect_format(str(getattr(source, "name", source)))
+    if fmt not in ("csv", "parquet"):
+        raise IngestError(f"Formato no soportado: {fmt}")
+
+    agent_ids = dict(Agent.objects.values_list("code", "id"))
+    summary = {"read": 0, "inserted": 0, "updated": 0, "unknown_agent": 0, "invalid": 0}
+    started = time.perf_counter()
+
+    close = None
+    if fmt == "csv" and isinstance(source, (str, Path)):
+        source = close = open(source, newline="", encoding="utf-8-sig")
+    elif fmt == "csv" and not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, newline="", encoding="utf-8-sig")
+    chunks = _csv_chunks(source, chunk_size) if fmt == "csv" else _parquet_chunks(source, chunk_size)
+
+    with connection.cursor() as cur:
+        cur.execute(_CREATE_STAGING)
+    try:
+        for records in chunks:
+            rows, unknown, invalid = _clean(records, agent_ids)
+            summary["read"] += len(records)
+            summary["unknown_agent"] += unknown
+            summary["invalid"] += invalid
+            if rows:
+                updated, inserted = _apply(rows)
+                summary["updated"] += updated
+                summary["inserted"] += inserted
+            if progress is not None:
+                progress(dict(summary, elapsed_ms=int((time.perf_counter() - started) * 1000)))
+    finally:
+        if close is not None:
+            close.close()
+        with connection.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+    if summary["inserted"] or summary["updated"]:
+        bump_data_version()
+        if getattr(settings, "ROLLUPS_AUTO_REFRESH", True):
+            summary["rollup_dates"] = refresh_rollups()["dates"]
+    logger.info(
+        "ingest indicators fmt=%s read=%d inserted=%d updated=%d unknown_agent=%d invalid=%d elapsed_ms=%.0f",
+        fmt, summary["read"], summary["inserted"], summary["updated"],
+        summary["unknown_agent"], summary["invalid"], (time.perf_counter() - started) * 1000,
+    )
+    return summary
@@ -0,0 +1,116 @@
+"""
+Métricas en memoria del proceso, expuestas en formato Prometheus (/api/metrics/).
+
+Contadores e histogramas mínimos, thread-safe y sin dependencias. Cada worker
+de gunicorn tiene su propio registro: Prometheus debe recolectar cada
+instancia/worker por separado (o agregarlos con sum()).
+"""
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Buckets en segundos: de 5 ms a 2 min (las llamadas al LLM pueden tardar decenas de segundos).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 120)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_REGISTRY: List["_Metric"] = []
+_LOCK = threading.Lock()
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict = {}
+        with _LOCK:
+            _REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _key(labels)
+        with _LOCK:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with _LOCK:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_fmt_labels(k)} {v}" for k, v in items]
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = _key(labels)
+        with _LOCK:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts, _, _ = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with _LOCK:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        for key, (counts, total, n) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+def render_prometheus() -> str:
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Métricas de la app ----------
+REQUEST_SECONDS = Histogram("analia_request_duration_seconds", "Duración de peticiones de chat por endpoint")
+REQUESTS_TOTAL = Counter("analia_requests_total", "Peticiones de chat por endpoint y resultado")
+STAGE_SECONDS = Histogram("analia_stage_duration_seconds", "Duración por etapa (parse, history, llm, sql, persist...)")
+LLM_TOKENS_TOTAL = Counter("analia_llm_tokens_total", "Tokens del LLM por dirección (input/output)")
+AGENT_ITERATIONS = Histogram("analia_agent_iterations", "Iteraciones (herramientas) por pregunta al agente",
+                             buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10))
+SQL_ROWS = Histogram("analia_sql_rows", "Filas devueltas por consulta SQL", buckets=COUNT_BUCKETS)
+COALESCED_TOTAL = Counter("analia_coalesced_requests_total",
+                          "Preguntas resueltas con la respuesta de otra idéntica en vuelo (scope=process|cache)")
+JOBS_TOTAL = Counter("analia_chat_jobs_total", "Jobs de chat en segundo plano por estado (queued, done, error)")
+JOB_WAIT_SECONDS = Histogram("analia_chat_job_wait_seconds", "Tiempo en cola de un job de chat hasta que un ejecutor lo toma")
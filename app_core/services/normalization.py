@@ -0,0 +1,30 @@
+import re
+import unicodedata
+
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+# Marcadores típicos de preguntas que dependen del turno anterior
+# ("¿Y en Lima cuántos hay?", "¿y eso por campaña?").
+_FOLLOWUP_START_RE = re.compile(r"^(y|e|pero|entonces|ahora|tambien|solo|y si)\b")
+_FOLLOWUP_WORDS = {"eso", "esos", "esas", "esto", "estos", "ellos", "ellas",
+                   "mismo", "misma", "mismos", "anterior", "anteriores"}
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normaliza una pregunta para compararla: minúsculas, sin tildes,
+    sin signos de puntuación y con espacios colapsados.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCT_RE.sub(" ", text.lower())
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def is_followup(normalized: str) -> bool:
+    """True si la pregunta (ya normalizada) parece depender del contexto previo."""
+    if _FOLLOWUP_START_RE.match(normalized):
+        return True
+    return bool(_FOLLOWUP_WORDS.intersection(normalized.split()))
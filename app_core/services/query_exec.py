@@ -0,0 +1,163 @@
+"""
+Ejecución controlada de SELECT (run_raw_select y la herramienta sql_db_query del agente).
+
+Antes de ejecutar:
+  - una sola sentencia, envuelta en un LIMIT (SQL_MAX_ROWS + 1 para detectar truncado);
+  - en PostgreSQL, EXPLAIN y rechazo si el costo estimado supera SQL_MAX_PLAN_COST.
+  - con SQL_READ_ONLY, la transacción se abre como READ ONLY (PostgreSQL).
+Durante la ejecución:
+  - timeout por sentencia (statement_timeout en PostgreSQL, progress handler en SQLite);
+  - cursor del lado del servidor, leído en lotes de SQL_FETCH_BATCH filas.
+Después, la ejecución (latencia, filas, error o rechazo) se acumula por
+fingerprint en sql_workload.
+"""
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from . import sql_workload
+from .metrics import SQL_ROWS
+from .tracing import stage
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_SEMICOLONS_RE = re.compile(r"[;\s]+$")
+_PG_QUERY_CANCELED = "57014"
+
+
+class QueryRejected(ValueError):
+    """La consulta no se ejecuta (o se corta) por costo, tiempo o forma."""
+
+
+class Rows(list):
+    """Filas de execute_select; `truncated` indica que la consulta tenía más de max_rows."""
+    truncated = False
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def prepare_select(sql: str, max_rows: int) -> str:
+    """Valida que sea un único SELECT y lo envuelve con LIMIT max_rows + 1."""
+    body = _TRAILING_SEMICOLONS_RE.sub("", sql.strip())
+    if not body.lower().startswith("select"):
+        raise QueryRejected("Solo se permiten consultas de lectura (SELECT).")
+    if ";" in body:
+        raise QueryRejected("Solo se permite una sentencia por consulta.")
+    return f"SELECT * FROM ({body}) AS _analia_q LIMIT {int(max_rows) + 1}"
+
+
+def _plan_cost(conn, sql: str, params: Dict) -> Optional[float]:
+    if conn.dialect.name != "postgresql":
+        return None  # SQLite no expone costos en su plan
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def _read_only(conn) -> None:
+    """Va antes de cualquier consulta: también frena SELECT que llaman funciones que escriben."""
+    if conn.dialect.name == "postgresql" and _setting("SQL_READ_ONLY", True):
+        conn.execute(text("SET TRANSACTION READ ONLY"))
+
+
+def _set_timeout(conn, timeout_ms: int):
+    """Aplica el timeout a la transacción en curso; retorna una función que lo retira."""
+    if timeout_ms <= 0:
+        return lambda: None
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+        return lambda: None
+    if conn.dialect.name == "sqlite":
+        raw = conn.connection.driver_connection
+        deadline = time.monotonic() + timeout_ms / 1000
+        # Un valor distinto de cero interrumpe la sentencia (sqlite3.OperationalError: interrupted).
+        raw.set_progress_handler(lambda: int(time.monotonic() > deadline), 10_000)
+        return lambda: raw.set_progress_handler(None, 0)
+    return lambda: None
+
+
+def _is_timeout(e: DBAPIError) -> bool:
+    return getattr(e.orig, "pgcode", None) == _PG_QUERY_CANCELED or "interrupted" in str(e.orig)
+
+
+def execute_select(
+    engine,
+    sql: str,
+    params: Optional[Dict] = None,
+    max_rows: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+    max_cost: Optional[float] = None,
+    source: Optional[str] = None,
+) -> Rows:
+    """
+    Ejecuta un SELECT con los límites configurados y retorna hasta `max_rows`
+    filas como dicts. Lanza QueryRejected si la consulta es inválida, demasiado
+    costosa o excede el timeout. Los límites en None toman SQL_MAX_ROWS,
+    SQL_STATEMENT_TIMEOUT_MS y SQL_MAX_PLAN_COST (cada fuente puede fijar los suyos).
+    Cada ejecución, exitosa o no, se acumula en sql_workload bajo `source`.
+    """
+    params = params or {}
+    max_rows = max_rows if max_rows is not None else _setting("SQL_MAX_ROWS", 1000)
+    timeout_ms = timeout_ms if timeout_ms is not None else _setting("SQL_STATEMENT_TIMEOUT_MS", 15_000)
+    max_cost = max_cost if max_cost is not None else _setting("SQL_MAX_PLAN_COST", 1_000_000)
+    batch = _setting("SQL_FETCH_BATCH", 500)
+
+    started = time.perf_counter()
+    rows: List[Dict] = []
+    cost = None
+    outcome = "error"
+    try:
+        bounded = prepare_select(sql, max_rows)
+        with stage("sql") as info, engine.connect() as conn:
+            with conn.begin():
+                _read_only(conn)
+                if max_cost > 0:
+                    cost = _plan_cost(conn, bounded, params)
+                    if cost is not None and cost > max_cost:
+                        logger.warning("query rejected cost=%.0f max=%.0f sql=%s", cost, max_cost, sql[:200])
+                        raise QueryRejected(
+                            f"La consulta es demasiado costosa (costo estimado {cost:,.0f} > {max_cost:,.0f}). "
+                            "Agrega filtros (fechas, campaña) o usa app_core_indicatorrollup."
+                        )
+                clear_timeout = _set_timeout(conn, timeout_ms)
+                try:
+                    res = conn.execution_options(stream_results=True, max_row_buffer=batch).execute(
+                        text(bounded), params
+                    )
+                    cols = list(res.keys())
+                    for part in res.partitions(batch):
+                        rows.extend(dict(zip(cols, row)) for row in part)
+                        if len(rows) > max_rows:
+                            break
+                    res.close()
+                except DBAPIError as e:
+                    if _is_timeout(e):
+                        raise QueryRejected("La consulta excedió el tiempo máximo permitido.") from e
+                    raise
+                finally:
+                    clear_timeout()
+
+            truncated = len(rows) > max_rows
+            info.update(rows=min(len(rows), max_rows), truncated=truncated)
+        outcome = "ok"
+    except QueryRejected:
+        outcome = "rejected"
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        fp = sql_workload.record(sql, elapsed_ms, min(len(rows), max_rows), outcome=outcome,
+                                 plan_cost=cost, source=source, params=params)
+    SQL_ROWS.observe(min(len(rows), max_rows))
+    logger.info(
+        "query rows=%d truncated=%s elapsed_ms=%.1f fingerprint=%s",
+        min(len(rows), max_rows), truncated, elapsed_ms, fp,
+    )
+    result = Rows(rows[:max_rows])
+    result.truncated = truncated
+    return result
@@ -0,0 +1,226 @@
+"""
+Resultados tabulares del lado del servidor.
+
+Cuando un SELECT (herramienta sql_db_query, single_shot o ruta rápida) devuelve
+una tabla, las filas completas se guardan en QueryResult y el LLM solo recibe
+un "handle": las primeras RESULT_PREVIEW_ROWS filas y estadísticas por columna.
+El cliente recibe los result_id junto con la respuesta y pide la tabla a
+/api/results/<id>/?session_id=... (JSON columnar paginado, CSV o Arrow); solo
+se sirve a una sesión que tenga una respuesta con ese result_id (la respuesta
+cacheada de otra sesión también cuenta, porque se guarda en su historial).
+
+Los result_id de una pregunta se juntan con collect_results() (contextvar):
+save_result() agrega al colector activo y, al cerrarse, un colector anidado
+pasa sus ids al exterior. answer_with_cache abre uno alrededor del agente para
+guardar los ids junto con la respuesta cacheada.
+"""
+import contextvars
+import csv
+import io
+import logging
+import math
+import re
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import ChatMessage, QueryResult
+
+logger = logging.getLogger(__name__)
+
+# Marca que acompaña al preview que ve el LLM; astream_sql_agent la lee de la salida de la herramienta.
+HANDLE_RE = re.compile(r"\[resultado ([0-9a-f-]{36})")
+
+_COLLECTOR: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("analia_results", default=None)
+_LAST_PURGE = 0.0
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def enabled() -> bool:
+    return _setting("RESULTS_ENABLED", True)
+
+
+# ---------- Colector de result_id por pregunta ----------
+def publish(result_ids: Iterable[str]) -> None:
+    collected = _COLLECTOR.get()
+    if collected is not None:
+        collected.extend(rid for rid in result_ids if rid not in collected)
+
+
+@contextmanager
+def collect_results():
+    ids: List[str] = []
+    token = _COLLECTOR.set(ids)
+    try:
+        yield ids
+    finally:
+        _COLLECTOR.reset(token)
+        publish(ids)
+
+
+# ---------- Guardado ----------
+def _column_type(values: Sequence) -> str:
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, bool):
+        return "bool"
+    if isinstance(sample, (int, float, Decimal)):
+        return "number"
+    if isinstance(sample, (date, datetime)):
+        return "date"
+    return "text"
+
+
+def is_table(rows: Sequence[Dict]) -> bool:
+    """Un valor suelto (1 fila × 1 columna) no es tabla: la respuesta ya lo trae."""
+    return bool(rows) and (len(rows) > 1 or len(rows[0]) > 1)
+
+
+def _purge_expired() -> None:
+    global _LAST_PURGE
+    if time.monotonic() - _LAST_PURGE < _setting("RESULTS_PURGE_INTERVAL", 3600):
+        return
+    _LAST_PURGE = time.monotonic()
+    deleted, _ = QueryResult.objects.filter(expires_at__lt=timezone.now()).delete()
+    if deleted:
+        logger.info("results purged=%d", deleted)
+
+
+def save_result(sql: str, rows: Sequence[Dict], truncated: bool = False) -> Optional[QueryResult]:
+    """Guarda las filas en formato columnar y publica su result_id; None si no es una tabla."""
+    if not enabled() or not is_table(rows):
+        return None
+    names = list(rows[0])
+    # Decimal iría como texto en el JSON; los números se guardan como float.
+    data = [[float(v) if isinstance(v, Decimal) else v for v in (row.get(name) for row in rows)] for name in names]
+    result = QueryResult.objects.create(
+        sql=sql,
+        columns=[{"name": name, "type": _column_type(col)} for name, col in zip(names, data)],
+        data=data,
+        row_count=len(rows),
+        truncated=truncated,
+        expires_at=timezone.now() + timedelta(seconds=_setting("RESULTS_TTL", 86_400)),
+    )
+    publish([str(result.result_id)])
+    try:
+        _purge_expired()
+    except Exception:
+        logger.exception("results purge failed")
+    return result
+
+
+# ---------- Lo que ve el LLM ----------
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def column_stats(rows: Sequence[Dict]) -> List[str]:
+    """Una línea por columna: min/máx/promedio si es numérica, valores distintos si no."""
+    lines = []
+    for name in rows[0]:
+        values = [r[name] for r in rows if r[name] is not None]
+        nums = [float(v) for v in values if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)]
+        if nums and len(nums) == len(values):
+            mean = math.fsum(nums) / len(nums)
+            lines.append(f"{name}: min {_fmt(min(nums))}, máx {_fmt(max(nums))}, prom {_fmt(mean)}")
+        else:
+            lines.append(f"{name}: {len(set(map(str, values)))} valores distintos")
+    return lines
+
+
+def llm_preview(sql: str, rows: Sequence[Dict], truncated: bool = False) -> str:
+    """
+    Texto para el LLM: las filas como antes si caben en RESULT_PREVIEW_ROWS; si
+    no, las primeras más estadísticas. Si es tabla, se guarda y lleva su handle.
+    """
+    if not rows:
+        return ""
+    result = save_result(sql, rows, truncated)
+    preview = _setting("RESULT_PREVIEW_ROWS", 20)
+    shown = str([tuple(r.values()) for r in rows[:preview]])
+    if result is None:
+        return shown
+    total = f"{len(rows):,}{'+' if truncated else ''}"
+    head = f"[resultado {result.result_id}: {total} filas; la tabla completa se muestra al usuario aparte]"
+    if len(rows) <= preview:
+        return f"{head}\n{shown}"
+    return "\n".join([
+        head,
+        f"Columnas: {', '.join(rows[0])}",
+        f"Primeras {preview} filas: {shown}",
+        "Estadísticas: " + "; ".join(column_stats(rows)),
+        "Resume con estos datos; no enumeres todas las filas.",
+    ])
+
+
+# ---------- Lo que ve el cliente ----------
+def get_result(result_id, session_id: Optional[str]) -> Optional[QueryResult]:
+    """El resultado si no expiró y algún mensaje de la sesión lo referencia; None si no."""
+    if not session_id:
+        return None
+    owned = ChatMessage.objects.filter(
+        session__session_id=session_id, role='assistant', results__icontains=str(result_id),
+    ).exists()
+    if not owned:
+        return None
+    return QueryResult.objects.filter(result_id=result_id, expires_at__gte=timezone.now()).first()
+
+
+def describe(result_ids: Sequence[str]) -> List[Dict]:
+    """Resumen (sin filas) de los resultados de una respuesta, en el mismo orden."""
+    if not result_ids:
+        return []
+    found = {
+        str(r["result_id"]): r for r in
+        QueryResult.objects.filter(result_id__in=result_ids)
+        .values("result_id", "columns", "row_count", "truncated")
+    }
+    return [found[rid] for rid in result_ids if rid in found]
+
+
+def page(result: QueryResult, offset: int, limit: int) -> Dict:
+    """Porción columnar: data[i] son los valores de columns[i] para las filas pedidas."""
+    end = min(offset + limit, result.row_count)
+    return {
+        "result_id": result.result_id,
+        "columns": result.columns,
+        "row_count": result.row_count,
+        "truncated": result.truncated,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": end if end < result.row_count else None,
+        "data": [col[offset:end] for col in result.data],
+    }
+
+
+def iter_csv(result: QueryResult) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([c["name"] for c in result.columns])
+    for i, row in enumerate(zip(*result.data)):
+        writer.writerow(row)
+        if i % 500 == 499:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def to_arrow(result: QueryResult) -> bytes:
+    """Tabla completa en formato Arrow IPC (stream). Requiere pyarrow."""
+    import pyarrow as pa
+
+    table = pa.table({c["name"]: col for c, col in zip(result.columns, result.data)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
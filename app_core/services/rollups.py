@@ -0,0 +1,190 @@
+"""
+Agregados incrementales de Indicator (día / semana / mes).
+
+Las fechas a recalcular salen de RollupDirtyDate: los cargadores masivos
+(ingest_indicators, generate_load_data) marcan las fechas que escriben en la
+misma transacción o justo después de confirmarla, y las señales marcan las
+altas, ediciones y borrados del ORM y los cambios de sede/región de un agente.
+Solo se recalculan los periodos que contienen esas fechas.
+
+No se usa una marca de agua por Indicator.id: en PostgreSQL los ids se asignan
+al insertar y no al confirmar, así que una carga concurrente puede confirmar
+ids menores que el máximo ya visto y quedarían fuera. Cada marca es una fila
+nueva y el refresco borra solo las que leyó, de modo que una marca confirmada
+durante el refresco sobrevive hasta el siguiente.
+
+ingest_indicators y generate_load_data refrescan al terminar. Para lo demás
+(ediciones en el admin, cargas por otras vías) rollups_ready() detecta
+pendientes: el agente deja de usar la tabla de agregados y, con
+ROLLUPS_AUTO_REFRESH, se lanza el refresco en segundo plano.
+"""
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from ..models import Indicator, IndicatorRollup, RollupDirtyDate, RollupState
+from .answer_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ("day", "week", "month")
+_PERIODS_PER_QUERY = 62
+_BATCH_SIZE = 2000
+
+_READY = [False, 0.0]  # [agregados al día, monotonic de la última comprobación]
+_REFRESH_LOCK = threading.Lock()
+
+
+def period_start(d: date, grain: str) -> date:
+    if grain == "week":
+        return d - timedelta(days=d.weekday())
+    if grain == "month":
+        return d.replace(day=1)
+    return d
+
+
+def mark_dirty(dates: Iterable[date]) -> None:
+    """Registra fechas cuyos agregados quedaron obsoletos."""
+    objs = [RollupDirtyDate(date=d) for d in set(dates) if d is not None]
+    if objs:
+        RollupDirtyDate.objects.bulk_create(objs, batch_size=_BATCH_SIZE)
+
+
+def _aggregate(grain: str, periods: Optional[List[date]] = None) -> Iterable[Dict]:
+    """Agrega Indicator al grano pedido; sin `periods` recorre toda la tabla."""
+    qs = Indicator.objects.all()
+    if grain == "day":
+        qs = qs.annotate(period=F("date"))
+        if periods is not None:
+            qs = qs.filter(date__in=periods)
+    else:
+        qs = qs.annotate(period=(TruncWeek if grain == "week" else TruncMonth)("date"))
+        if periods is not None:
+            end = max(periods) + timedelta(days=7 if grain == "week" else 31)
+            qs = qs.filter(date__gte=min(periods), date__lt=end, period__in=periods)
+    return (
+        qs.annotate(
+            r_region=Coalesce("agent__region", Value("")),
+            r_site=Coalesce("agent__site", Value("")),
+        )
+        .values("period", "name", "campaign", "r_region", "r_site")
+        .annotate(n=Count("id"), s=Sum("value"), lo=Min("value"), hi=Max("value"))
+        .order_by()
+        .iterator(chunk_size=_BATCH_SIZE)
+    )
+
+
+def _write(grain: str, rows: Iterable[Dict]) -> int:
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(IndicatorRollup(
+            grain=grain, period_start=row["period"], name=row["name"], campaign=row["campaign"],
+            region=row["r_region"], site=row["r_site"],
+            value_count=row["n"], value_sum=row["s"], value_min=row["lo"], value_max=row["hi"],
+        ))
+        if len(batch) >= _BATCH_SIZE:
+            IndicatorRollup.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    IndicatorRollup.objects.bulk_create(batch)
+    return written + len(batch)
+
+
+def _rebuild_periods(grain: str, periods: List[date]) -> int:
+    written = 0
+    for i in range(0, len(periods), _PERIODS_PER_QUERY):
+        chunk = periods[i:i + _PERIODS_PER_QUERY]
+        IndicatorRollup.objects.filter(grain=grain, period_start__in=chunk).delete()
+        written += _write(grain, _aggregate(grain, chunk))
+    return written
+
+
+def refresh_rollups(full: bool = False) -> Dict[str, int]:
+    """
+    Recalcula los agregados afectados desde la última ejecución (o todos con
+    full=True). Retorna un resumen con fechas y filas escritas.
+    """
+    with transaction.atomic():
+        state, _ = RollupState.objects.select_for_update().get_or_create(pk=1)
+        dirty_ids: List[int] = []
+        dates: Set[date] = set()
+        for pk, d in RollupDirtyDate.objects.values_list("id", "date"):
+            dirty_ids.append(pk)
+            dates.add(d)
+
+        if full:
+            IndicatorRollup.objects.all().delete()
+            dates = set(Indicator.objects.values_list("date", flat=True).distinct())
+
+        written = 0
+        for grain in GRAINS:
+            if full:
+                written += _write(grain, _aggregate(grain))
+                continue
+            periods = sorted({period_start(d, grain) for d in dates})
+            if periods:
+                written += _rebuild_periods(grain, periods)
+
+        # Solo las marcas leídas: las confirmadas mientras tanto quedan para el próximo refresco.
+        for i in range(0, len(dirty_ids), _BATCH_SIZE):
+            RollupDirtyDate.objects.filter(id__in=dirty_ids[i:i + _BATCH_SIZE]).delete()
+        state.refreshed_at = timezone.now()
+        state.save()
+
+    if dates:
+        bump_data_version()
+    logger.info("rollups refreshed full=%s dates=%d rows=%d", full, len(dates), written)
+    return {"dates": len(dates), "rows": written}
+
+
+def pending() -> bool:
+    """True si hay fechas marcadas que los agregados aún no incorporan (o nunca se refrescaron)."""
+    if RollupDirtyDate.objects.exists():
+        return True
+    refreshed = RollupState.objects.filter(pk=1, refreshed_at__isnull=False).exists()
+    return not refreshed and Indicator.objects.exists()
+
+
+def _refresh_in_background() -> None:
+    if not _REFRESH_LOCK.acquire(blocking=False):
+        return  # ya hay un refresco en curso en este proceso
+
+    def run():
+        close_old_connections()
+        try:
+            refresh_rollups()
+            _READY[1] = 0.0  # fuerza a re-comprobar en la próxima pregunta
+        except Exception:
+            logger.exception("background rollup refresh failed")
+        finally:
+            close_old_connections()
+            _REFRESH_LOCK.release()
+
+    threading.Thread(target=run, name="rollups-refresh", daemon=True).start()
+
+
+def rollups_ready() -> bool:
+    """
+    ¿Puede el agente responder desde IndicatorRollup? Se comprueba a lo sumo cada
+    ROLLUPS_CHECK_INTERVAL segundos; si hay pendientes y ROLLUPS_AUTO_REFRESH está
+    activo, lanza el refresco en segundo plano.
+    """
+    if time.monotonic() - _READY[1] >= getattr(settings, "ROLLUPS_CHECK_INTERVAL", 10):
+        try:
+            ready = not pending()
+        except Exception:
+            logger.exception("rollup freshness check failed")
+            ready = False
+        _READY[:] = [ready, time.monotonic()]
+        if not ready and getattr(settings, "ROLLUPS_AUTO_REFRESH", True):
+            _refresh_in_background()
+    return _READY[0]
@@ -0,0 +1,119 @@
+"""
+Snapshot persistido del esquema que ve el agente SQL.
+
+En lugar de reflejar todas las tablas (auth, admin, sesiones, historial...) y
+consultar filas de ejemplo en el primer request de cada contenedor, se guarda
+en un JSON el `table_info` ya formateado de las tablas permitidas. El snapshot
+solo se regenera cuando cambian las migraciones aplicadas o la configuración.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_tables() -> List[str]:
+    return list(getattr(settings, "AGENT_SQL_TABLES", ["app_core_agent", "app_core_indicator", "app_core_indicatorrollup"]))
+
+
+def snapshot_path() -> Path:
+    return Path(getattr(settings, "SCHEMA_SNAPSHOT_PATH", settings.BASE_DIR / "var" / "schema_snapshot.json"))
+
+
+def _compact(table_info: str) -> str:
+    # CREATE TABLE de SQLAlchemy trae tabulaciones y líneas vacías: son tokens gratis.
+    lines = [re.sub(r"\s+", " ", line).strip() for line in table_info.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def source_hash(engine, tables: List[str], sample_rows: int) -> str:
+    """
+    Huella barata del estado del esquema: las migraciones aplicadas (una sola
+    consulta a django_migrations) más la configuración del snapshot. Si la base
+    no es de Django, se usa la lista de columnas de las tablas permitidas.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({"tables": sorted(tables), "sample_rows": sample_rows, "format": SNAPSHOT_FORMAT}).encode())
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT app, name FROM django_migrations ORDER BY app, name")).fetchall()
+        for app, name in rows:
+            h.update(f"{app}.{name};".encode())
+    except SQLAlchemyError:
+        insp = inspect(engine)
+        for table in sorted(tables):
+            for col in insp.get_columns(table):
+                h.update(f"{table}.{col['name']}:{col['type']};".encode())
+    return h.hexdigest()
+
+
+def build_snapshot(engine, tables: Optional[List[str]] = None, sample_rows: Optional[int] = None) -> Dict:
+    """Introspecciona las tablas permitidas y arma el snapshot (sin escribirlo)."""
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+    tables = tables or snapshot_tables()
+    if sample_rows is None:
+        sample_rows = getattr(settings, "AGENT_SAMPLE_ROWS", 2)
+    db = SQLDatabase(engine=engine, include_tables=tables, sample_rows_in_table_info=sample_rows)
+    table_info = {t: _compact(db.get_table_info([t])) for t in tables}
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "dialect": engine.dialect.name,
+        "tables": tables,
+        "sample_rows": sample_rows,
+        "source_hash": source_hash(engine, tables, sample_rows),
+        "schema_hash": hashlib.sha256(json.dumps(table_info, sort_keys=True).encode()).hexdigest(),
+        "table_info": table_info,
+    }
+
+
+def write_snapshot(snapshot: Dict, path: Optional[Path] = None) -> Path:
+    path = path or snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot, ensure_ascii=False, indent=1), encoding="utf-8")
+    tmp.replace(path)
+    return path
+
+
+def read_snapshot(path: Optional[Path] = None) -> Optional[Dict]:
+    path = path or snapshot_path()
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if data.get("format") == SNAPSHOT_FORMAT else None
+
+
+def load_snapshot(engine, tables: Optional[List[str]] = None, path: Optional[Path] = None) -> Dict:
+    """
+    Devuelve el snapshot vigente; lo regenera (y lo persiste si se puede) solo
+    si no existe o si cambiaron las migraciones/configuración. `tables` y
+    `path` son los de la fuente (por defecto AGENT_SQL_TABLES y SCHEMA_SNAPSHOT_PATH).
+    """
+    tables = tables or snapshot_tables()
+    sample_rows = getattr(settings, "AGENT_SAMPLE_ROWS", 2)
+    current = source_hash(engine, tables, sample_rows)
+    snapshot = read_snapshot(path)
+    if snapshot and snapshot.get("source_hash") == current and snapshot.get("dialect") == engine.dialect.name:
+        return snapshot
+
+    logger.info("schema snapshot missing or stale; rebuilding for tables=%s", tables)
+    snapshot = build_snapshot(engine, tables, sample_rows)
+    try:
+        write_snapshot(snapshot, path)
+    except OSError as e:
+        logger.warning("could not persist schema snapshot: %s", e)
+    return snapshot
@@ -0,0 +1,233 @@
+"""
+Coalescencia (single-flight) de preguntas equivalentes en vuelo.
+
+Si llega una pregunta con la misma clave que otra que ya está corriendo
+(pregunta normalizada + contexto si es de seguimiento, igual que la caché de
+respuestas), la segunda espera el resultado de la primera en vez de lanzar
+otro agente. Dentro del proceso se coordina con hilos (ruta síncrona) o con
+futures del event loop (ruta async).
+
+Con SINGLE_FLIGHT_BACKEND=cache el líder además toma un lock en
+CACHES[SINGLE_FLIGHT_CACHE_ALIAS] y publica ahí su respuesta, de modo que los
+workers que llegan tarde sondean ese resultado. Requiere una caché compartida
+(Redis, Memcached o base de datos); con LocMemCache equivale a "local".
+
+Si el líder falla, sus seguidores del mismo proceso reciben el mismo error; los
+de otros workers (o quien espere más de SINGLE_FLIGHT_WAIT) ejecutan la
+pregunta por su cuenta.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .answer_cache import answer_cache_key
+from .metrics import COALESCED_TOTAL
+from .tracing import stage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def _mode() -> str:
+    mode = _setting("SINGLE_FLIGHT_BACKEND", "local")
+    if mode not in ("off", "local", "cache"):
+        raise RuntimeError(f"Backend de single-flight no soportado: {mode}")
+    return mode
+
+
+def flight_key(question: str, recent_questions: Sequence[str] = (), source: Optional[str] = None) -> str:
+    """Misma equivalencia que la caché de respuestas (incluida la fuente), sin la versión de datos."""
+    digest = answer_cache_key(question, recent_questions, version=0, source=source).rsplit(":", 1)[-1]
+    return f"analia:flight:{digest}"
+
+
+# ---------- Entre workers (lock en la caché de Django) ----------
+def _shared_keys(key: str, token: str) -> Tuple[str, str]:
+    return f"{key}:lock", f"{key}:result:{token}"
+
+
+def _lead_shared(key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+    cache = caches[_setting("SINGLE_FLIGHT_CACHE_ALIAS", "default")]
+    wait = _setting("SINGLE_FLIGHT_WAIT", 60.0)
+    token = uuid.uuid4().hex
+    lock_key, result_key = _shared_keys(key, token)
+    if cache.add(lock_key, token, _setting("SINGLE_FLIGHT_LOCK_TTL", 120)):
+        try:
+            result = fn()
+            cache.set(result_key, result, int(wait) + 1)
+            return result, False
+        finally:
+            cache.delete(lock_key)
+
+    # Otro worker lidera: se sondea el resultado que publicará con su token.
+    leader = cache.get(lock_key)
+    if leader is not None:
+        _, result_key = _shared_keys(key, leader)
+        deadline = time.monotonic() + wait
+        with stage("coalesce", scope="cache") as info:
+            while time.monotonic() < deadline:
+                time.sleep(_setting("SINGLE_FLIGHT_POLL_INTERVAL", 0.25))
+                still_running = cache.get(lock_key) == leader
+                result = cache.get(result_key)
+                if result is not None:
+                    info["shared"] = True
+                    COALESCED_TOTAL.inc(scope="cache")
+                    return result, True
+                if not still_running:
+                    break  # el líder terminó sin resultado (error) o su lock expiró
+            info["shared"] = False
+    return fn(), False
+
+
+async def _alead_shared(key: str, afn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+    cache = caches[_setting("SINGLE_FLIGHT_CACHE_ALIAS", "default")]
+    wait = _setting("SINGLE_FLIGHT_WAIT", 60.0)
+    token = uuid.uuid4().hex
+    lock_key, result_key = _shared_keys(key, token)
+    if await cache.aadd(lock_key, token, _setting("SINGLE_FLIGHT_LOCK_TTL", 120)):
+        try:
+            result = await afn()
+            await cache.aset(result_key, result, int(wait) + 1)
+            return result, False
+        finally:
+            await cache.adelete(lock_key)
+
+    leader = await cache.aget(lock_key)
+    if leader is not None:
+        _, result_key = _shared_keys(key, leader)
+        deadline = time.monotonic() + wait
+        with stage("coalesce", scope="cache") as info:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(_setting("SINGLE_FLIGHT_POLL_INTERVAL", 0.25))
+                still_running = await cache.aget(lock_key) == leader
+                result = await cache.aget(result_key)
+                if result is not None:
+                    info["shared"] = True
+                    COALESCED_TOTAL.inc(scope="cache")
+                    return result, True
+                if not still_running:
+                    break
+            info["shared"] = False
+    return await afn(), False
+
+
+# ---------- En el proceso: ruta síncrona (hilos) ----------
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+_FLIGHTS: Dict[str, _Flight] = {}
+_LOCK = threading.Lock()
+
+
+def coalesce(key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+    """
+    Ejecuta `fn` una sola vez por clave entre las llamadas concurrentes.
+    Retorna (resultado, compartido); compartido=True si se reutilizó el de otra petición.
+    """
+    mode = _mode()
+    if mode == "off":
+        return fn(), False
+
+    with _LOCK:
+        flight = _FLIGHTS.get(key)
+        leader = flight is None
+        if leader:
+            flight = _FLIGHTS[key] = _Flight()
+
+    if not leader:
+        with stage("coalesce", scope="process") as info:
+            info["shared"] = flight.done.wait(_setting("SINGLE_FLIGHT_WAIT", 60.0))
+        if not info["shared"]:
+            logger.warning("single_flight wait expired key=%s", key[-12:])
+            return fn(), False
+        COALESCED_TOTAL.inc(scope="process")
+        logger.info("single_flight shared key=%s", key[-12:])
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    try:
+        flight.result, shared = _lead_shared(key, fn) if mode == "cache" else (fn(), False)
+        return flight.result, shared
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _LOCK:
+            _FLIGHTS.pop(key, None)
+        flight.done.set()
+
+
+# ---------- En el proceso: ruta async (futures por event loop) ----------
+_AFLIGHTS = weakref.WeakKeyDictionary()
+
+
+def _loop_flights() -> Dict[str, asyncio.Future]:
+    loop = asyncio.get_running_loop()
+    flights = _AFLIGHTS.get(loop)
+    if flights is None:
+        flights = _AFLIGHTS[loop] = {}
+    return flights
+
+
+async def acoalesce(key: str, afn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+    """Versión async de coalesce (los seguidores esperan un future del mismo event loop)."""
+    mode = _mode()
+    if mode == "off":
+        return await afn(), False
+
+    flights = _loop_flights()
+    future = flights.get(key)
+    if future is not None:
+        try:
+            with stage("coalesce", scope="process") as info:
+                info["shared"] = False
+                result = await asyncio.wait_for(asyncio.shield(future), _setting("SINGLE_FLIGHT_WAIT", 60.0))
+                info["shared"] = True
+        except asyncio.TimeoutError:
+            logger.warning("single_flight wait expired key=%s", key[-12:])
+            return await afn(), False
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise  # se canceló esta petición, no la del líder
+            return await afn(), False
+        COALESCED_TOTAL.inc(scope="process")
+        logger.info("single_flight shared key=%s", key[-12:])
+        return result, True
+
+    future = flights[key] = asyncio.get_running_loop().create_future()
+    try:
+        result, shared = await (_alead_shared(key, afn) if mode == "cache" else _own(afn))
+        future.set_result(result)
+        return result, shared
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # marcado como leído: sin seguidores no hay aviso en el log
+        raise
+    finally:
+        flights.pop(key, None)
+
+
+async def _own(afn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+    return await afn(), False
@@ -0,0 +1,152 @@
+"""
+Modo "single_shot": alternativa al agente openai-tools para preguntas SQL.
+
+En vez de que el agente liste tablas, pida el esquema, revise la consulta y la
+ejecute (varias idas y vueltas al LLM), se envía en un solo prompt el esquema
+del snapshot, el historial y la pregunta para obtener el SELECT, que se ejecuta
+con los límites de la fuente (Source.execute, como run_raw_select). Solo si la base
+rechaza la consulta se re-pregunta al LLM con el error (SINGLE_SHOT_MAX_RETRIES
+veces). La respuesta se redacta con una segunda llamada o, con
+SINGLE_SHOT_ANSWER=template, con una tabla de texto sin LLM.
+"""
+import json
+import logging
+import re
+from typing import Dict, Iterator, List, Tuple, Union
+
+from django.conf import settings
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy.exc import DBAPIError
+
+from . import sql_agent
+from .query_exec import QueryRejected
+from .result_store import column_stats, save_result
+from .sources import Source, get_source
+from .tracing import AgentTraceHandler, stage
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"```(?:sql)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+_NO_DATA = "No encuentro datos para esa consulta"
+
+_LLM = None
+
+
+def _llm():
+    global _LLM
+    if _LLM is None:
+        _LLM = sql_agent._init_llm()
+    return _LLM
+
+
+def _sql_prompt(user_query: str, source: Source) -> str:
+    db = source.sqldb()
+    return (
+        f"{sql_agent.system_prefix(source)}\n\n"
+        f"Dialecto: {db.dialect}. Tablas disponibles:\n{db.get_table_info()}\n\n"
+        f"{sql_agent._examples(user_query, source)}"
+        f"Pregunta: {user_query}\n\n"
+        "Responde únicamente con una consulta SELECT que la responda, sin explicación ni markdown."
+    )
+
+
+def _extract_sql(message) -> str:
+    text = sql_agent._chunk_text(message).strip()
+    fenced = _FENCE_RE.search(text)
+    return (fenced.group(1) if fenced else text).strip()
+
+
+def _num(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return "(sin dato)" if value is None else str(value)
+
+
+def format_rows(rows: List[Dict], max_rows: int) -> str:
+    """Respuesta sin LLM: el valor si es uno solo, si no una tabla de texto."""
+    if not rows:
+        return _NO_DATA
+    if len(rows) == 1 and len(rows[0]) == 1:
+        return f"Resultado: {_num(next(iter(rows[0].values())))}"
+    cols = list(rows[0])
+    lines = [" | ".join(cols)] + [" | ".join(_num(r[c]) for c in cols) for r in rows[:max_rows]]
+    if len(rows) > max_rows:
+        lines.append(f"... ({len(rows) - max_rows} filas más)")
+    return "\n".join(lines)
+
+
+def _answer_prompt(user_query: str, sql: str, rows: List[Dict], max_rows: int) -> str:
+    shown = "\n".join(json.dumps(r, ensure_ascii=False, default=str) for r in rows[:max_rows])
+    more = ""
+    if len(rows) > max_rows:
+        # La tabla completa va al cliente aparte (QueryResult); al LLM, un resumen.
+        more = f" (se muestran {max_rows}; estadísticas: {'; '.join(column_stats(rows))})"
+    return (
+        "Eres un asistente de BI. Responde en español, breve y solo con estos datos; nunca inventes. "
+        f"Si no hay filas responde '{_NO_DATA}'.\n\n"
+        f"Pregunta: {user_query}\nSQL ejecutado: {sql}\n"
+        f"Resultado: {len(rows)} filas{more}\n{shown}\n\nRespuesta:"
+    )
+
+
+def run_single_shot(session_id: str, user_query: str, source: Union[str, Source, None] = None) -> Iterator[Dict]:
+    """
+    Genera y ejecuta el SQL; emite {"type": "sql", "sql": ...} por intento y
+    {"type": "final", "reply": ..., "results": [result_id]} al terminar. Lanza
+    RuntimeError si no consigue una consulta válida. source puede ser la Source
+    que ya retiene quien llama (sql_agent).
+    """
+    retries = getattr(settings, "SINGLE_SHOT_MAX_RETRIES", 1)
+    max_rows = getattr(settings, "SINGLE_SHOT_ANSWER_ROWS", 50)
+    src = source if isinstance(source, Source) else get_source(source)
+    handler = AgentTraceHandler()
+    config = {"callbacks": [handler]}
+    try:
+        messages = sql_agent._make_history(session_id).messages + [
+            HumanMessage(content=_sql_prompt(user_query, src))
+        ]
+        for attempt in range(retries + 1):
+            reply = _llm().invoke(messages, config=config)
+            sql = _extract_sql(reply)
+            handler.iterations += 1
+            yield {"type": "sql", "sql": sql}
+            try:
+                rows = src.execute(sql)
+                sql_agent._capture(user_query, src, [sql])
+                result = save_result(sql, rows, rows.truncated)
+                break
+            except (QueryRejected, DBAPIError) as e:
+                error = str(getattr(e, "orig", None) or e).splitlines()[0]
+                logger.info("single_shot retry=%d error=%s", attempt, error[:200])
+                if attempt == retries:
+                    raise RuntimeError(f"No se pudo generar una consulta válida: {error}") from e
+                messages += [
+                    AIMessage(content=sql),
+                    HumanMessage(content=f"La consulta falló con este error: {error}\n"
+                                         "Corrígela y responde únicamente con el SELECT corregido."),
+                ]
+
+        if getattr(settings, "SINGLE_SHOT_ANSWER", "llm") == "template":
+            with stage("format"):
+                answer = format_rows(rows, max_rows)
+        else:
+            answer = sql_agent._chunk_text(
+                _llm().invoke(_answer_prompt(user_query, sql, rows, max_rows), config=config)
+            )
+    finally:
+        handler.finish()
+    yield {"type": "final", "reply": sql_agent._final_answer({"output": answer}),
+           "results": [str(result.result_id)] if result else []}
+
+
+def ask_single_shot(session_id: str, user_query: str, source: Union[str, Source, None] = None) -> Tuple[str, List[str]]:
+    """Retorna (respuesta, SQL de cada intento)."""
+    sqls: List[str] = []
+    for ev in run_single_shot(session_id, user_query, source):
+        if ev["type"] == "sql":
+            sqls.append(ev["sql"])
+        else:
+            return ev["reply"], sqls
+    raise RuntimeError("single_shot terminó sin respuesta")
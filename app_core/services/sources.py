@@ -0,0 +1,324 @@
+"""
+Registro de fuentes SQL que puede consultar el agente.
+
+"default" es la base analítica propia (ANALYTICS_DB_ALIAS, AGENT_SQL_TABLES y
+los límites SQL_*). SQL_SOURCES agrega bases operativas (por cliente o
+campaña), cada una con su URL o alias de DATABASES, tablas permitidas, límites,
+pool y snapshot de esquema propios. La petición elige la fuente con `source`;
+las de SQL_SOURCES solo se aceptan si además trae una de sus `keys` en la
+cabecera X-Source-Key (authorize).
+
+Cada fuente construye al primer uso su engine, su SnapshotSQLDatabase y su
+runnable del agente. A lo sumo SQL_SOURCES_MAX_ACTIVE fuentes (además de
+"default") quedan activas: al pasarse se cierra la usada hace más tiempo, y un
+hilo cierra las que llevan SQL_SOURCES_IDLE_TIMEOUT segundos sin uso. Cerrar
+una fuente hace engine.dispose() (libera sus conexiones) y suelta el agente;
+si vuelve a usarse el registro crea otra desde su snapshot en disco.
+
+Las preguntas toman la fuente con use_source()/acquire_source(): mientras una
+la retiene, expulsarla solo la saca del registro y el cierre espera a que la
+suelte la última. Una fuente cerrada no se reconstruye (SourceClosed): quien
+la guardaba debe pedirla de nuevo al registro.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE = "default"
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+@dataclass(frozen=True)
+class SourceConfig:
+    name: str
+    url: Optional[str] = None           # URL de SQLAlchemy; si falta se usa `database`
+    database: Optional[str] = None      # alias de settings.DATABASES
+    tables: List[str] = field(default_factory=list)
+    prompt: Optional[str] = None        # instrucciones del agente; por defecto las genéricas
+    max_rows: Optional[int] = None      # None: SQL_MAX_ROWS, SQL_STATEMENT_TIMEOUT_MS, SQL_MAX_PLAN_COST
+    statement_timeout_ms: Optional[int] = None
+    max_plan_cost: Optional[float] = None
+    pool_size: Optional[int] = None     # None: SQL_POOL_SIZE / SQL_POOL_MAX_OVERFLOW
+    max_overflow: Optional[int] = None
+    snapshot_path: Optional[Path] = None
+
+    def execute_options(self) -> Dict:
+        """Argumentos para execute_select: límites (los None toman el valor global) y la fuente."""
+        return {"max_rows": self.max_rows, "timeout_ms": self.statement_timeout_ms, "max_cost": self.max_plan_cost,
+                "source": self.name}
+
+
+def _default_config() -> SourceConfig:
+    from .schema_snapshot import snapshot_path, snapshot_tables
+
+    return SourceConfig(
+        name=DEFAULT_SOURCE,
+        database=_setting("ANALYTICS_DB_ALIAS", "default"),
+        tables=snapshot_tables(),
+        snapshot_path=snapshot_path(),
+    )
+
+
+def _config(name: str, spec: Dict) -> SourceConfig:
+    if not spec.get("url") and not spec.get("database"):
+        raise RuntimeError(f"La fuente SQL {name!r} necesita 'url' o 'database'")
+    if not spec.get("tables"):
+        raise RuntimeError(f"La fuente SQL {name!r} necesita 'tables'")
+    path = spec.get("snapshot_path")
+    default_path = Path(_setting("SCHEMA_SNAPSHOT_PATH", settings.BASE_DIR / "var" / "schema_snapshot.json"))
+    return SourceConfig(
+        name=name,
+        url=spec.get("url"),
+        database=spec.get("database"),
+        tables=list(spec["tables"]),
+        prompt=spec.get("prompt"),
+        max_rows=spec.get("max_rows"),
+        statement_timeout_ms=spec.get("statement_timeout_ms"),
+        max_plan_cost=spec.get("max_plan_cost"),
+        pool_size=spec.get("pool_size"),
+        max_overflow=spec.get("max_overflow"),
+        snapshot_path=Path(path) if path else default_path.with_name(f"schema_snapshot.{name}.json"),
+    )
+
+
+def source_names() -> List[str]:
+    return [DEFAULT_SOURCE, *(n for n in _setting("SQL_SOURCES", {}) if n != DEFAULT_SOURCE)]
+
+
+def get_config(name: Optional[str] = None) -> SourceConfig:
+    name = name or DEFAULT_SOURCE
+    if name == DEFAULT_SOURCE:
+        return _default_config()
+    spec = _setting("SQL_SOURCES", {}).get(name)
+    if spec is None:
+        raise RuntimeError(f"Fuente SQL no configurada: {name}")
+    return _config(name, spec)
+
+
+def authorize(name: Optional[str], key: Optional[str]) -> bool:
+    """
+    Si una petición con esa X-Source-Key puede consultar la fuente: "default"
+    siempre; las de SQL_SOURCES solo con una de sus `keys` (sin keys, solo comandos).
+    """
+    name = name or DEFAULT_SOURCE
+    if name == DEFAULT_SOURCE:
+        return True
+    keys = _setting("SQL_SOURCES", {}).get(name, {}).get("keys") or []
+    return bool(key) and any(hmac.compare_digest(key, k) for k in keys)
+
+
+class SourceClosed(RuntimeError):
+    """La fuente se cerró (expulsada, inactiva o reset): hay que pedirla de nuevo al registro."""
+
+
+class Source:
+    """Engine, SQLDatabase y runnable de una fuente, construidos al primer uso."""
+
+    def __init__(self, config: SourceConfig):
+        self.config = config
+        self.name = config.name
+        self.last_used = time.monotonic()
+        self.closed = False
+        # Los mantiene SourceRegistry bajo su lock: preguntas que la retienen y si
+        # ya salió del registro (se cierra cuando la suelta la última).
+        self.users = 0
+        self.retired = False
+        self._engine = None
+        self._sqldb = None
+        self._runnable = None
+        # Un lock por objeto: si el warm-up está construyendo el agente, una petición
+        # espera ese build en vez de repetirlo, y la ruta rápida no queda bloqueada.
+        self._engine_lock = threading.Lock()
+        self._sqldb_lock = threading.Lock()
+        self._runnable_lock = threading.Lock()
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_SOURCE
+
+    @property
+    def active(self) -> bool:
+        return self._engine is not None
+
+    def engine(self):
+        if self._engine is None:
+            with self._engine_lock:
+                if self.closed:
+                    raise SourceClosed(f"La fuente SQL {self.name!r} está cerrada")
+                if self._engine is None:
+                    from .sql_agent import _alchemy_url_from_django, _create_analytics_engine
+
+                    url = self.config.url or _alchemy_url_from_django(self.config.database)
+                    self._engine = _create_analytics_engine(
+                        url, pool_size=self.config.pool_size, max_overflow=self.config.max_overflow,
+                    )
+                    logger.info("sql source opened name=%s", self.name)
+        return self._engine
+
+    def sqldb(self):
+        if self._sqldb is None:
+            with self._sqldb_lock:
+                if self._sqldb is None:
+                    from .schema_snapshot import load_snapshot
+                    from .sql_database import SnapshotSQLDatabase
+
+                    engine = self.engine()
+                    snapshot = load_snapshot(engine, self.config.tables, self.config.snapshot_path)
+                    self._sqldb = SnapshotSQLDatabase(engine, snapshot, self.config.execute_options())
+        return self._sqldb
+
+    def runnable(self):
+        if self._runnable is None:
+            with self._runnable_lock:
+                if self._runnable is None:
+                    from .sql_agent import _build_runnable_with_memory
+
+                    self._runnable = _build_runnable_with_memory(self.sqldb())
+        return self._runnable
+
+    def execute(self, sql: str, params: Optional[Dict] = None):
+        """execute_select con los límites de la fuente."""
+        from .query_exec import execute_select
+
+        return execute_select(self.engine(), sql, params, **self.config.execute_options())
+
+    def close(self) -> None:
+        """Libera conexiones y agente; una consulta en curso termina con su conexión."""
+        # Mismo orden que runnable() -> sqldb() -> engine(), para no bloquearse con un build en curso.
+        with self._runnable_lock, self._sqldb_lock, self._engine_lock:
+            engine, self._engine, self._sqldb, self._runnable = self._engine, None, None, None
+            self.closed = True
+        if engine is not None:
+            engine.dispose()
+            logger.info("sql source closed name=%s", self.name)
+
+
+class SourceRegistry:
+    """Fuentes activas en orden LRU; "default" no se expulsa."""
+
+    def __init__(self):
+        self._sources: "OrderedDict[str, Source]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def get(self, name: Optional[str] = None, hold: bool = False) -> Source:
+        """La fuente (creándola si hace falta); con hold=True la retiene hasta release()."""
+        name = name or DEFAULT_SOURCE
+        with self._lock:
+            source = self._sources.get(name)
+            if source is None:
+                source = self._sources[name] = Source(get_config(name))
+            self._sources.move_to_end(name)
+            source.last_used = time.monotonic()
+            if hold:
+                source.users += 1
+            others = [s for s in self._sources.values() if not s.is_default]
+            evicted = self._retire(others[:max(len(others) - _setting("SQL_SOURCES_MAX_ACTIVE", 4), 0)])
+        for old in evicted:
+            old.close()
+        if not source.is_default:
+            self._start_sweeper()
+        return source
+
+    def release(self, source: Source) -> None:
+        with self._lock:
+            source.users -= 1
+            close = source.retired and source.users == 0
+        if close:
+            source.close()
+
+    @contextmanager
+    def use(self, name: Optional[str] = None):
+        source = self.get(name, hold=True)
+        try:
+            yield source
+        finally:
+            self.release(source)
+
+    def _retire(self, sources: List[Source]) -> List[Source]:
+        """Saca las fuentes del registro (con el lock tomado); devuelve las que se pueden cerrar ya."""
+        closable = []
+        for source in sources:
+            if self._sources.get(source.name) is source:
+                del self._sources[source.name]
+            source.retired = True
+            if source.users == 0:
+                closable.append(source)
+        return closable
+
+    def sweep(self) -> List[str]:
+        """Cierra las fuentes (salvo "default") sin uso en SQL_SOURCES_IDLE_TIMEOUT segundos."""
+        cutoff = time.monotonic() - _setting("SQL_SOURCES_IDLE_TIMEOUT", 900)
+        with self._lock:
+            idle = self._retire([s for s in self._sources.values()
+                                 if not s.is_default and not s.users and s.last_used < cutoff])
+        for source in idle:
+            source.close()
+        return [s.name for s in idle]
+
+    def _start_sweeper(self) -> None:
+        if self._sweeper is not None or _setting("SQL_SOURCES_IDLE_TIMEOUT", 900) <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="sql-sources-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(max(_setting("SQL_SOURCES_IDLE_TIMEOUT", 900) / 4, 1))
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("sql sources sweep failed")
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            active = {n for n, s in self._sources.items() if s.active}
+        return [{"name": n, "active": n in active} for n in source_names()]
+
+    def reset(self) -> None:
+        """Cierra todas las fuentes (benchmark, tests); se reconstruyen al próximo uso."""
+        with self._lock:
+            sources = self._retire(list(self._sources.values()))
+        for source in sources:
+            source.close()
+
+
+_REGISTRY = SourceRegistry()
+
+
+def registry() -> SourceRegistry:
+    return _REGISTRY
+
+
+def get_source(name: Optional[str] = None) -> Source:
+    """La fuente sin retenerla (comandos, default); una pregunta usa use_source()."""
+    return _REGISTRY.get(name)
+
+
+def use_source(name: Optional[str] = None):
+    """Context manager: la fuente queda abierta hasta salir del bloque."""
+    return _REGISTRY.use(name)
+
+
+def acquire_source(name: Optional[str] = None) -> Source:
+    """Para las rutas async (vía sync_to_async): retiene la fuente hasta release_source()."""
+    return _REGISTRY.get(name, hold=True)
+
+
+def release_source(source: Source) -> None:
+    _REGISTRY.release(source)
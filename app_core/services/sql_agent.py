@@ -2,25 +2,35 @@ import os
 import re
 import logging
 from pathlib import Path
-from typing import List, Dict
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Optional, Tuple
 from urllib.parse import quote_plus
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import OperationalError
 
-from langchain_community.utilities.sql_database import SQLDatabase
-from langchain_community.agent_toolkits import create_sql_agent  # LC 0.3
+from .fast_path import try_fast_path
+from . import result_store
+from .sources import Source, acquire_source, get_source, release_source, use_source
+from .sql_examples import capture_example, examples_prompt
+from .tracing import AgentTraceHandler, stage
 
-from langchain_community.chat_message_histories import SQLChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
+if TYPE_CHECKING:
+    from .chat_history import DjangoChatMessageHistory
 
+# Vertex AI, los toolkits de langchain_community, RunnableWithMessageHistory y el
+# historial (langchain_core.chat_history) se importan dentro de las funciones que
+# los usan: cargarlos cuesta segundos y las rutas que no llaman al agente (health,
+# sesiones, admin) no los necesitan. services/warmup.py los precarga al arrancar
+# si WARMUP_ON_START está activo.
 
-# ---------- Vertex AI LLM provider ----------
-from langchain_google_vertexai import ChatVertexAI
 
+# ---------- Vertex AI LLM provider ----------
 def _init_llm():
+    from langchain_google_vertexai import ChatVertexAI
+
     return ChatVertexAI(
         model=os.getenv("VERTEX_MODEL_NAME", "gemini-pro"),
         project=os.getenv("VERTEX_PROJECT_ID"),
@@ -30,13 +40,13 @@ def _init_llm():
     )
 
 
-# ---------- DB helpers (usa la MISMA DB que Django) ----------
-def _alchemy_url_from_django() -> str:
+# ---------- DB helpers (usa las DB configuradas en Django) ----------
+def _alchemy_url_from_django(alias: str = "default") -> str:
     """
-    Construye el URL de SQLAlchemy a partir de settings.DATABASES['default'].
+    Construye el URL de SQLAlchemy a partir de settings.DATABASES[alias].
     Soporta sqlite y postgresql.
     """
-    cfg = settings.DATABASES["default"]
+    cfg = settings.DATABASES[alias]
     engine = cfg["ENGINE"]
     if engine.endswith("sqlite3"):
         path = Path(cfg["NAME"]).resolve()
@@ -50,7 +60,7 @@ def _alchemy_url_from_django() -> str:
 
         # Loguear si faltan credenciales (solo booleanos, no valores)
         if not user or not pwd:
-            logging.warning("DB user or password appears empty in settings.DATABASES['default'] (user_present=%s, pwd_present=%s)", bool(user), bool(pwd))
+            logging.warning("DB user or password appears empty in settings.DATABASES[%r] (user_present=%s, pwd_present=%s)", alias, bool(user), bool(pwd))
 
         # URL-encode credentials to safely include special characters
         user_enc = quote_plus(user)
@@ -75,41 +85,54 @@ def _alchemy_url_from_django() -> str:
     else:
         raise RuntimeError(f"Motor no soportado por el agente: {engine}")
 
-_ENGINE = None
-_SQLDB = None
-
-def get_engine():
-    """Crea el engine on-demand (evita fallar en import si la DB no está lista)."""
-    global _ENGINE
-    if _ENGINE is None:
-        _ENGINE = create_engine(_alchemy_url_from_django(), pool_pre_ping=True, future=True)
-    return _ENGINE
-
-def get_sqldb():
-    """Crea SQLDatabase on-demand (evita inspección temprana)."""
-    global _SQLDB
-    if _SQLDB is None:
-        _SQLDB = SQLDatabase(
-            engine=get_engine(),
-            include_tables=None,            # o ['core_agent','core_indicator'] para endurecer
-            sample_rows_in_table_info=2,
-        )
-    return _SQLDB
+def _create_analytics_engine(url: str, pool_size: Optional[int] = None, max_overflow: Optional[int] = None):
+    """
+    Engine del SQL analítico: pool dimensionado por proceso (SQL_POOL_*, o el
+    de la fuente) y, con SQL_READ_ONLY, sesiones de solo lectura
+    (default_transaction_read_only en PostgreSQL, PRAGMA query_only en SQLite).
+    execute_select además abre cada transacción con SET TRANSACTION READ ONLY.
+    """
+    read_only = getattr(settings, "SQL_READ_ONLY", True)
+    options = {
+        "pool_pre_ping": True,
+        "future": True,
+        "pool_size": pool_size if pool_size is not None else settings.SQL_POOL_SIZE,
+        "max_overflow": max_overflow if max_overflow is not None else settings.SQL_POOL_MAX_OVERFLOW,
+        "pool_timeout": settings.SQL_POOL_TIMEOUT,
+        "pool_recycle": settings.SQL_POOL_RECYCLE,
+    }
+    if read_only and url.startswith("postgresql"):
+        options["connect_args"] = {"options": "-c default_transaction_read_only=on"}
+    engine = create_engine(url, **options)
+    if read_only and url.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _query_only(dbapi_conn, _record):
+            dbapi_conn.execute("PRAGMA query_only = ON")
+    return engine
 
+def get_engine(source: Optional[str] = None):
+    """
+    Engine de solo lectura de la fuente, creado on-demand (evita fallar en import
+    si la DB no está lista). Para "default" va sobre ANALYTICS_DB_ALIAS: la
+    réplica si está configurada, si no el primario. Lo usan run_raw_select, el
+    agente y single_shot; las escrituras (sesiones, mensajes) siguen en el ORM
+    de Django sobre "default". Ver sources.py.
+    """
+    return get_source(source).engine()
+
+def get_sqldb(source: Optional[str] = None):
+    """SQLDatabase de la fuente a partir de su snapshot de esquema (ver snapshot_schema)."""
+    return get_source(source).sqldb()
 
-# ---------- Guardrails ----------
-def _select_only_guard(sql: str):
-    if not sql.strip().lower().startswith("select"):
-        raise ValueError("Solo se permiten consultas de lectura (SELECT).")
 
-def run_raw_select(sql: str) -> List[Dict]:
-    """Ejecuta SELECT seguro y retorna lista de dicts."""
-    _select_only_guard(sql)
+# ---------- Guardrails ----------
+def run_raw_select(sql: str, params: Optional[Dict] = None) -> List[Dict]:
+    """
+    Ejecuta SELECT seguro (con parámetros opcionales) y retorna lista de dicts.
+    Pasa por execute_select: EXPLAIN con tope de costo, timeout, LIMIT y cursor de servidor.
+    """
     try:
-        with get_engine().connect() as conn:
-            res = conn.execute(text(sql))
-            cols = res.keys()
-            return [dict(zip(cols, row)) for row in res.fetchall()]
+        return get_source().execute(sql, params)
     except OperationalError as e:
         raise RuntimeError(
             "No se pudo conectar a la base de datos. "
@@ -118,22 +141,38 @@ def run_raw_select(sql: str) -> List[Dict]:
 
 
 # ---------- Memoria persistente ----------
-def _make_history(session_id: str) -> SQLChatMessageHistory:
-    return SQLChatMessageHistory(
-        session_id=session_id,
-        connection=_alchemy_url_from_django(),
-        table_name=os.getenv("CHAT_HISTORY_TABLE", "langchain_chat_history"),
+_SUMMARY_LLM = None
+
+def _summarize_history(summary: str, turns: List[Tuple[str, str]]) -> str:
+    """Funde turnos antiguos en el resumen de la sesión (lo usa la compactación del historial)."""
+    global _SUMMARY_LLM
+    if _SUMMARY_LLM is None:
+        _SUMMARY_LLM = _init_llm()
+    transcript = "\n".join(f"{'Usuario' if role == 'user' else 'Asistente'}: {content}" for role, content in turns)
+    prompt = (
+        "Actualiza el resumen de una conversación de BI. Conserva filtros vigentes "
+        "(campaña, región, sede, indicador, fechas), cifras clave y preguntas pendientes. "
+        f"Máximo {settings.CHAT_HISTORY_SUMMARY_MAX_TOKENS // 2} palabras, en español.\n\n"
+        f"Resumen actual:\n{summary or '(vacío)'}\n\nNuevos turnos:\n{transcript}\n\nResumen actualizado:"
     )
+    return _chunk_text(_SUMMARY_LLM.invoke(prompt))
+
+def _make_history(session_id: str) -> "DjangoChatMessageHistory":
+    # Lee resumen + últimos turnos de ChatMessage; no crea engines por pregunta.
+    from .chat_history import DjangoChatMessageHistory
+
+    return DjangoChatMessageHistory(session_id, summarize=_summarize_history)
 
 
 # ---------- Agente SQL (LangChain 0.3) + memoria ----------
-_RUNNABLE = None
+def _build_runnable_with_memory(sqldb):
+    from langchain_community.agent_toolkits import create_sql_agent  # LC 0.3
+    from langchain_core.runnables.history import RunnableWithMessageHistory
 
-def _build_runnable_with_memory():
     llm = _init_llm()
     agent = create_sql_agent(
         llm=llm,
-        db=get_sqldb(),                     # se evalúa aquí, no en import
+        db=sqldb,                           # el de la fuente (sources.Source.runnable)
         agent_type="openai-tools",          # reemplazo de OPENAI_FUNCTIONS
         verbose=False,
         handle_parsing_errors=True,
@@ -147,60 +186,287 @@ def _build_runnable_with_memory():
         history_messages_key="chat_history",
     )
 
-def _get_runnable():
-    global _RUNNABLE
-    if _RUNNABLE is None:
-        _RUNNABLE = _build_runnable_with_memory()
-    return _RUNNABLE
+def _get_runnable(source: Optional[str] = None):
+    return get_source(source).runnable()
 
 
 # ---------- API principal ----------
-def ask_sql_agent(session_id: str, user_query: str) -> str:
-    """
-    NL -> SQL -> ejecución -> respuesta.
-    Memoria conversacional persistente con SQLChatMessageHistory.
-    """
-    runnable = _get_runnable()
-
-    system_prefix = (
-        "Eres un asistente de BI. Responde SOLO con datos reales de la base. "
-        "Si no hay datos suficientes, responde 'No encuentro datos para esa consulta'. "
-        "Nunca inventes. Prioriza SELECT a tablas Agent e Indicator. "
-        "Si el usuario pregunta por '¿Y en Lima cuántos hay?', recuerda la campaña reciente. "
-        "No ejecutes INSERT/UPDATE/DELETE."
-    )
+GENERIC_PREFIX = (
+    "Eres un asistente de BI. Responde SOLO con datos reales de la base. "
+    "Si no hay datos suficientes, responde 'No encuentro datos para esa consulta'. "
+    "Nunca inventes. No ejecutes INSERT/UPDATE/DELETE."
+)
+_PREFIX_HEAD = (
+    "Eres un asistente de BI. Responde SOLO con datos reales de la base. "
+    "Si no hay datos suficientes, responde 'No encuentro datos para esa consulta'. "
+    "Nunca inventes. Prioriza SELECT a tablas Agent e Indicator. "
+)
+_PREFIX_TAIL = (
+    "Si el usuario pregunta por '¿Y en Lima cuántos hay?', recuerda la campaña reciente. "
+    "No ejecutes INSERT/UPDATE/DELETE."
+)
+SYSTEM_PREFIX = (
+    _PREFIX_HEAD
+    + "Para promedios, totales, mínimos o máximos por periodo, campaña, región o sede usa "
+    "preferentemente app_core_indicatorrollup (grain = 'day'|'week'|'month', period_start; "
+    "promedio = SUM(value_sum) / SUM(value_count)) en lugar de agregar app_core_indicator. "
+    + _PREFIX_TAIL
+)
+# Mientras los agregados tienen cambios sin incorporar (rollups.rollups_ready).
+STALE_ROLLUPS_PREFIX = (
+    _PREFIX_HEAD
+    + "No uses app_core_indicatorrollup: está desactualizada; agrega sobre app_core_indicator. "
+    + _PREFIX_TAIL
+)
 
-    try:
-        result = runnable.invoke(
-            {"input": f"{system_prefix}\n\nPregunta: {user_query}"},
-            config={"configurable": {"session_id": session_id}},
-        )
-    except OperationalError as e:
-        raise RuntimeError(
+def system_prefix(source: Source) -> str:
+    """Instrucciones del agente: las de la fuente, las de ANALIA ("default") o las genéricas."""
+    if source.config.prompt:
+        return source.config.prompt
+    if not source.is_default:
+        return GENERIC_PREFIX
+    from .rollups import rollups_ready
+
+    return SYSTEM_PREFIX if rollups_ready() else STALE_ROLLUPS_PREFIX
+
+def _agent_input(user_query: str, examples: str = "", prefix: str = SYSTEM_PREFIX) -> str:
+    # `examples`: pares pregunta → SQL verificados y parecidos (sql_examples.examples_prompt).
+    return f"{prefix}\n\n{examples}Pregunta: {user_query}"
+
+def _agent_error(e: Exception) -> RuntimeError:
+    """Traduce errores del agente/LLM a mensajes legibles para el usuario."""
+    if isinstance(e, OperationalError):
+        return RuntimeError(
             "No se pudo conectar a la base de datos durante la inicialización del agente. "
             "Revisa servicio, credenciales y que la DB exista."
-        ) from e
+        )
+    logging.error("Error al invocar Vertex AI: %s", e)
+    if "Model not found" in str(e):
+        return RuntimeError(
+            "Error de configuración: El modelo de Vertex AI especificado no existe. "
+            "Verifica el nombre del modelo y que esté disponible en tu región."
+        )
+    elif "Permission denied" in str(e):
+        return RuntimeError(
+            "Error de permisos: La cuenta de servicio no tiene los permisos necesarios "
+            "para acceder a Vertex AI."
+        )
+    else:
+        return RuntimeError(
+            f"Error al procesar la consulta con Vertex AI: {str(e)}"
+        )
+
+AGENT_MODES = ("agent", "single_shot")
+
+def _mode(mode: Optional[str]) -> str:
+    """Modo de ejecución de la pregunta: el de la petición o AGENT_MODE."""
+    mode = mode or getattr(settings, "AGENT_MODE", "agent")
+    if mode not in AGENT_MODES:
+        raise RuntimeError(f"Modo de agente no soportado: {mode}")
+    return mode
+
+def _single_shot(session_id: str, user_query: str, source: Source) -> str:
+    from .single_shot import ask_single_shot
+
+    try:
+        reply, _ = ask_single_shot(session_id, user_query, source)
+    except RuntimeError:
+        raise
     except Exception as e:
-        print(f"Error al invocar Vertex AI: {str(e)}")
-        if "Model not found" in str(e):
-            raise RuntimeError(
-                "Error de configuración: El modelo de Vertex AI especificado no existe. "
-                "Verifica el nombre del modelo y que esté disponible en tu región."
-            ) from e
-        elif "Permission denied" in str(e):
-            raise RuntimeError(
-                "Error de permisos: La cuenta de servicio no tiene los permisos necesarios "
-                "para acceder a Vertex AI."
-            ) from e
-        else:
-            raise RuntimeError(
-                f"Error al procesar la consulta con Vertex AI: {str(e)}"
-            ) from e
-    print(f'RESULTADO DEL MODELO: {result}')
+        raise _agent_error(e) from e
+    return reply
+
+def _agent_config(session_id: str, handler: AgentTraceHandler) -> Dict:
+    return {"configurable": {"session_id": session_id}, "callbacks": [handler]}
+
+# La ruta rápida y los ejemplos verificados están escritos para el esquema de
+# ANALIA: solo aplican a la fuente "default".
+def _fast_path(user_query: str, source: Optional[Source] = None) -> Optional[str]:
+    if source is not None and not source.is_default:
+        return None
+    with stage("fast_path") as info:
+        fast = try_fast_path(user_query)
+        info["hit"] = fast is not None
+    return fast
+
+def _examples(user_query: str, source: Source) -> str:
+    return examples_prompt(user_query) if source.is_default else ""
+
+def _capture(user_query: str, source: Source, sql_queries: List[str]) -> None:
+    if source.is_default:
+        capture_example(user_query, sql_queries)
+
+def _final_answer(result) -> str:
     answer = result["output"] if isinstance(result, dict) and "output" in result else str(result)
-    print(f'RESPUESTA: {answer}')
+    logging.debug("RESPUESTA: %s", answer)
 
     # Guard extra por si el modelo devolviera SQL bruto en el texto
     if re.search(r"\b(insert|update|delete|drop|alter)\b", answer.lower()):
         return "Se bloqueó una operación no permitida. Solo SELECT está permitido."
     return answer
+
+def ask_sql_agent(
+    session_id: str, user_query: str, mode: Optional[str] = None, source: Optional[str] = None,
+) -> str:
+    """
+    NL -> SQL -> ejecución -> respuesta.
+    Memoria conversacional: últimos turnos de la sesión en ChatMessage.
+    mode: "agent" (create_sql_agent) o "single_shot" (un prompt para el SQL, ver
+    single_shot.py); por defecto AGENT_MODE.
+    source: fuente SQL a consultar (sources.py); por defecto "default".
+    """
+    with use_source(source) as src:
+        return _ask(session_id, user_query, mode, src)
+
+def _ask(session_id: str, user_query: str, mode: Optional[str], src: Source) -> str:
+    fast = _fast_path(user_query, src)
+    if fast is not None:
+        return fast
+    if _mode(mode) == "single_shot":
+        return _single_shot(session_id, user_query, src)
+
+    runnable = src.runnable()
+    handler = AgentTraceHandler()
+    examples = _examples(user_query, src)
+
+    try:
+        result = runnable.invoke(
+            {"input": _agent_input(user_query, examples, system_prefix(src))},
+            config=_agent_config(session_id, handler),
+        )
+    except Exception as e:
+        raise _agent_error(e) from e
+    finally:
+        handler.finish()
+    logging.debug("RESULTADO DEL MODELO: %s", result)
+    _capture(user_query, src, handler.sql_queries)
+    return _final_answer(result)
+
+async def aask_sql_agent(
+    session_id: str, user_query: str, mode: Optional[str] = None, source: Optional[str] = None,
+) -> str:
+    """Versión async de ask_sql_agent (ainvoke), para la ruta ASGI."""
+    # Tomar la fuente puede cerrar otra expulsada (engine.dispose): fuera del event loop.
+    src = await sync_to_async(acquire_source, thread_sensitive=False)(source)
+    try:
+        return await _aask(session_id, user_query, mode, src)
+    finally:
+        await sync_to_async(release_source, thread_sensitive=False)(src)
+
+async def _aask(session_id: str, user_query: str, mode: Optional[str], src: Source) -> str:
+    fast = await sync_to_async(_fast_path, thread_sensitive=False)(user_query, src)
+    if fast is not None:
+        return fast
+    if _mode(mode) == "single_shot":
+        # Dos llamadas cortas y un SELECT: corre en un hilo del executor.
+        return await sync_to_async(_single_shot, thread_sensitive=False)(session_id, user_query, src)
+
+    runnable = await sync_to_async(src.runnable, thread_sensitive=False)()
+    handler = AgentTraceHandler()
+    examples = await sync_to_async(_examples, thread_sensitive=False)(user_query, src)
+    prefix = await sync_to_async(system_prefix, thread_sensitive=False)(src)  # consulta la base (rollups)
+
+    try:
+        result = await runnable.ainvoke(
+            {"input": _agent_input(user_query, examples, prefix)},
+            config=_agent_config(session_id, handler),
+        )
+    except Exception as e:
+        raise _agent_error(e) from e
+    finally:
+        handler.finish()
+    await sync_to_async(_capture, thread_sensitive=False)(user_query, src, handler.sql_queries)
+    return _final_answer(result)
+
+
+# ---------- Streaming ----------
+def _chunk_text(chunk) -> str:
+    """Extrae el texto de un AIMessageChunk (Gemini puede devolver lista de partes)."""
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content or []
+    )
+
+def _tool_sql(tool_input) -> str:
+    if isinstance(tool_input, dict):
+        return tool_input.get("query") or tool_input.get("tool_input") or ""
+    return str(tool_input or "")
+
+async def astream_sql_agent(
+    session_id: str, user_query: str, mode: Optional[str] = None, source: Optional[str] = None,
+) -> AsyncIterator[Dict]:
+    """
+    Igual que ask_sql_agent pero emitiendo eventos a medida que el agente avanza:
+      {"type": "tool", "tool": ..., "input": ...}   al invocar una herramienta
+      {"type": "sql", "sql": ...}                   SQL enviado a sql_db_query
+      {"type": "token", "text": ...}                tokens generados por el LLM
+      {"type": "final", "reply": ..., "results": [...]}  respuesta final (con guardrails)
+                                                    y resumen de sus tablas (result_store.describe)
+    Los errores se lanzan como RuntimeError, igual que en ask_sql_agent.
+    En modo single_shot solo hay eventos sql (uno por intento) y final.
+    """
+    src = await sync_to_async(acquire_source, thread_sensitive=False)(source)
+    try:
+        async for ev in _astream(session_id, user_query, mode, src):
+            yield ev
+    finally:
+        await sync_to_async(release_source, thread_sensitive=False)(src)
+
+async def _astream(session_id: str, user_query: str, mode: Optional[str], src: Source) -> AsyncIterator[Dict]:
+    describe = sync_to_async(result_store.describe, thread_sensitive=False)
+    with result_store.collect_results() as result_ids:
+        fast = await sync_to_async(_fast_path, thread_sensitive=False)(user_query, src)
+    if fast is not None:
+        yield {"type": "final", "reply": fast, "results": await describe(result_ids)}
+        return
+    if _mode(mode) == "single_shot":
+        from .single_shot import run_single_shot
+
+        events = run_single_shot(session_id, user_query, src)
+        step = sync_to_async(next, thread_sensitive=False)
+        try:
+            while (ev := await step(events, None)) is not None:
+                if ev["type"] == "final":
+                    ev = {**ev, "results": await describe(ev["results"])}
+                yield ev
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise _agent_error(e) from e
+        return
+
+    runnable = await sync_to_async(src.runnable, thread_sensitive=False)()
+    handler = AgentTraceHandler()
+    examples = await sync_to_async(_examples, thread_sensitive=False)(user_query, src)
+    prefix = await sync_to_async(system_prefix, thread_sensitive=False)(src)  # consulta la base (rollups)
+    result = None
+    try:
+        async for ev in runnable.astream_events(
+            {"input": _agent_input(user_query, examples, prefix)},
+            config=_agent_config(session_id, handler),
+            version="v2",
+        ):
+            kind = ev["event"]
+            if kind == "on_tool_start":
+                tool_input = ev["data"].get("input")
+                yield {"type": "tool", "tool": ev["name"], "input": tool_input}
+                if ev["name"] == "sql_db_query":
+                    yield {"type": "sql", "sql": _tool_sql(tool_input)}
+            elif kind == "on_tool_end" and ev["name"] == "sql_db_query":
+                output = ev["data"].get("output")
+                result_ids += result_store.HANDLE_RE.findall(str(getattr(output, "content", output)))
+            elif kind == "on_chat_model_stream":
+                text = _chunk_text(ev["data"].get("chunk"))
+                if text:
+                    yield {"type": "token", "text": text}
+            elif kind == "on_chain_end" and not ev.get("parent_ids"):
+                result = ev["data"].get("output")
+    except Exception as e:
+        raise _agent_error(e) from e
+    finally:
+        handler.finish()
+    await sync_to_async(_capture, thread_sensitive=False)(user_query, src, handler.sql_queries)
+    yield {"type": "final", "reply": _final_answer(result), "results": await describe(result_ids)}
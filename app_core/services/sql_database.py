@@ -0,0 +1,59 @@
+"""
+SQLDatabase del agente. Vive aparte de sql_agent.py para que langchain_community
+solo se importe al construir el agente (ver get_sqldb).
+"""
+from typing import Dict, List, Optional
+
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from . import result_store
+from .query_exec import QueryRejected, execute_select
+
+
+class SnapshotSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase restringido a las tablas del snapshot de esquema: no refleja
+    metadata ni consulta filas de ejemplo; get_table_info sale del snapshot.
+    """
+
+    def __init__(self, engine, snapshot: Dict, execute_options: Optional[Dict] = None, **kwargs):
+        self.snapshot = snapshot
+        self.execute_options = execute_options or {}  # límites y nombre de la fuente (ver sources.py)
+        super().__init__(
+            engine=engine,
+            include_tables=snapshot["tables"],
+            sample_rows_in_table_info=0,
+            lazy_table_reflection=True,
+            **kwargs,
+        )
+
+    def get_table_info(self, table_names: Optional[List[str]] = None, get_col_comments: bool = False) -> str:
+        names = list(self.get_usable_table_names())
+        if table_names is not None:
+            missing = set(table_names).difference(names)
+            if missing:
+                raise ValueError(f"table_names {missing} not found in database")
+            names = table_names
+        return "\n\n".join(self.snapshot["table_info"][t] for t in sorted(names))
+
+    def _execute(self, command, fetch="all", *, parameters=None, execution_options=None):
+        # La herramienta sql_db_query pasa por los mismos límites que run_raw_select.
+        if fetch == "cursor" or not isinstance(command, str):
+            return super()._execute(command, fetch, parameters=parameters, execution_options=execution_options)
+        rows = execute_select(self._engine, command, parameters, **self.execute_options)
+        return rows[:1] if fetch == "one" else rows
+
+    def run(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        # Al LLM le llega un preview con estadísticas; la tabla completa queda en QueryResult.
+        if fetch != "all" or not isinstance(command, str) or not result_store.enabled():
+            return super().run(command, fetch, include_columns,
+                               parameters=parameters, execution_options=execution_options)
+        rows = execute_select(self._engine, command, parameters, **self.execute_options)
+        return result_store.llm_preview(command, rows, rows.truncated)
+
+    def run_no_throw(self, command, fetch="all", include_columns=False, **kwargs):
+        try:
+            return super().run_no_throw(command, fetch, include_columns, **kwargs)
+        except QueryRejected as e:
+            # Se devuelve al LLM como texto para que reformule la consulta.
+            return f"Error: {e}"
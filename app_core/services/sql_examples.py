@@ -0,0 +1,149 @@
+"""
+Ejemplos verificados pregunta → SQL para few-shot.
+
+  - capture_example(): después de una respuesta exitosa guarda la pregunta y el
+    último SQL que corrió sin error. Entra como no verificado (salvo
+    SQL_EXAMPLES_AUTO_VERIFY); se curan y verifican en el admin.
+  - examples_prompt(): busca los SQL_EXAMPLES_TOP_K verificados más parecidos a
+    la pregunta y arma el bloque que se antepone a "Pregunta:" en el prompt.
+
+El índice es TF-IDF local (unigramas y bigramas de la pregunta normalizada,
+similitud coseno), sin red ni dependencias. Cada proceso lo reconstruye cada
+SQL_EXAMPLES_INDEX_TTL segundos o cuando cambia un ejemplo en ese proceso.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import F
+
+from ..models import SqlExample
+from .normalization import is_followup, normalize_question
+from .tracing import stage
+
+logger = logging.getLogger(__name__)
+
+# Palabras que aparecen en casi cualquier pregunta y no distinguen ejemplos.
+_STOPWORDS = {
+    "a", "al", "con", "cual", "cuales", "de", "del", "dame", "dime", "el", "en", "es", "hay",
+    "la", "las", "lo", "los", "me", "muestra", "muestrame", "para", "por", "que", "se", "son",
+    "su", "sus", "un", "una", "y",
+}
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def _terms(normalized: str) -> List[str]:
+    words = [w for w in normalized.split() if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class TfidfIndex:
+    """Índice en memoria sobre (pregunta, SQL); search() retorna (score, pregunta, SQL)."""
+
+    def __init__(self, examples: Sequence[Tuple[str, str]]):
+        self.examples = list(examples)
+        docs = [Counter(_terms(normalize_question(q))) for q, _ in self.examples]
+        df = Counter(term for doc in docs for term in doc)
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        self.vectors = [self._vector(doc) for doc in docs]
+
+    def _vector(self, tf: Counter) -> Dict[str, float]:
+        vec = {t: (1 + math.log(c)) * self.idf[t] for t, c in tf.items() if t in self.idf}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {t: v / norm for t, v in vec.items()}
+
+    def search(self, question: str, k: int, min_score: float) -> List[Tuple[float, str, str]]:
+        query = self._vector(Counter(_terms(normalize_question(question))))
+        if not query:
+            return []
+        scored = []
+        for (q, sql), vec in zip(self.examples, self.vectors):
+            score = sum(w * vec.get(t, 0.0) for t, w in query.items())
+            if score >= min_score:
+                scored.append((round(score, 3), q, sql))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:k]
+
+
+_INDEX: Optional[TfidfIndex] = None
+_INDEX_BUILT_AT = 0.0
+_INDEX_LOCK = threading.Lock()
+
+
+def invalidate_index() -> None:
+    """Fuerza la reconstrucción en la próxima búsqueda (señales de SqlExample)."""
+    global _INDEX
+    _INDEX = None
+
+
+def _index() -> TfidfIndex:
+    global _INDEX, _INDEX_BUILT_AT
+    ttl = _setting("SQL_EXAMPLES_INDEX_TTL", 60)
+    if _INDEX is None or time.monotonic() - _INDEX_BUILT_AT > ttl:
+        with _INDEX_LOCK:
+            if _INDEX is None or time.monotonic() - _INDEX_BUILT_AT > ttl:
+                rows = (
+                    SqlExample.objects.filter(verified=True)
+                    .order_by("-hits", "-id")
+                    .values_list("question", "sql")[:_setting("SQL_EXAMPLES_MAX_INDEXED", 2000)]
+                )
+                _INDEX = TfidfIndex(list(rows))
+                _INDEX_BUILT_AT = time.monotonic()
+    return _INDEX
+
+
+def similar_examples(question: str) -> List[Tuple[float, str, str]]:
+    if not _setting("SQL_EXAMPLES_ENABLED", True):
+        return []
+    with stage("examples") as info:
+        found = _index().search(
+            question, _setting("SQL_EXAMPLES_TOP_K", 3), _setting("SQL_EXAMPLES_MIN_SCORE", 0.3)
+        )
+        info["found"] = len(found)
+    return found
+
+
+def examples_prompt(question: str) -> str:
+    """Bloque de ejemplos para el prompt ("" si no hay parecidos)."""
+    try:
+        found = similar_examples(question)
+    except Exception:
+        logger.exception("sql_examples lookup failed")
+        return ""
+    if not found:
+        return ""
+    lines = ["Ejemplos verificados (preguntas parecidas y el SQL que las respondió correctamente):"]
+    for _, q, sql in found:
+        lines += [f"P: {q}", f"SQL: {sql}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def capture_example(question: str, sql_queries: Sequence[str]) -> None:
+    """Registra el último SQL exitoso de una pregunta autónoma (las de seguimiento dependen del contexto)."""
+    if not _setting("SQL_EXAMPLES_CAPTURE", True) or not sql_queries:
+        return
+    normalized = normalize_question(question)
+    if not normalized or is_followup(normalized):
+        return
+    sql = sql_queries[-1].strip()
+    try:
+        example, created = SqlExample.objects.get_or_create(
+            normalized_question=normalized[:500],
+            defaults={"question": question, "sql": sql, "source": "agent", "hits": 1,
+                      "verified": _setting("SQL_EXAMPLES_AUTO_VERIFY", False)},
+        )
+        if not created:
+            update = {"hits": F("hits") + 1}
+            if not example.verified:
+                update["sql"] = sql  # sin curar: se queda con el SQL más reciente
+            SqlExample.objects.filter(pk=example.pk).update(**update)
+    except Exception:
+        logger.exception("sql_examples capture failed")
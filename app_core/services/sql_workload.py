@@ -0,0 +1,242 @@
+"""
+Estadísticas de las consultas que ejecuta el agente (workload SQL).
+
+Cada SELECT que pasa por execute_select (run_raw_select, ruta rápida,
+sql_db_query del agente y single_shot) se reduce a un fingerprint: el SQL sin
+comentarios, en minúsculas, con literales y parámetros reemplazados por ? y las
+listas IN colapsadas. Por (fuente, fingerprint) se acumulan llamadas, errores
+de la base, rechazos de los guardrails (costo, timeout, forma), filas, costo
+EXPLAIN máximo y un histograma de latencia del que salen p50/p95/p99, junto
+con el último SQL literal y sus parámetros (los re-ejecuta index_advisor).
+
+Los contadores se agregan en memoria y un hilo de fondo los vuelca a
+SqlFingerprint cada SQL_WORKLOAD_FLUSH_INTERVAL segundos (y al terminar el
+proceso): una consulta no agrega escrituras al primario. Si el volcado falla,
+lo no escrito vuelve a acumularse para el siguiente. Se consultan en el admin
+y en /api/sql-workload/ (solo staff).
+"""
+import atexit
+import hashlib
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Tramos del histograma de latencia en ms; el último conteo es "más de 30 s".
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%\(\w+\)s|(?<![:\w]):\w+|\$\d+")
+_NUMBER_RE = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_RE = re.compile(r"[;\s]+$")
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL sin literales: `WHERE campaign = 'Ventas' AND n IN (1, 2)` -> `where campaign = ? and n in (?, ...)`."""
+    text = _COMMENT_RE.sub(" ", sql)
+    text = _STRING_RE.sub("?", text)
+    text = _PARAM_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _SPACE_RE.sub(" ", text).strip().lower()
+    text = _IN_LIST_RE.sub("(?, ...)", text)
+    return _TRAILING_RE.sub("", text)
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def percentile(buckets: Sequence[int], q: float) -> Optional[float]:
+    """Percentil aproximado (ms) desde los conteos por tramo, interpolando dentro del tramo."""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            low = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            if i >= len(LATENCY_BUCKETS_MS):
+                return float(low)  # tramo abierto: solo se sabe que supera el último límite
+            high = LATENCY_BUCKETS_MS[i]
+            return round(low + (high - low) * (rank - seen) / count, 1)
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+# ---------- Agregación en memoria ----------
+@dataclass
+class _Pending:
+    normalized: str
+    sample: str = ""
+    params: Optional[Dict] = None  # los de `sample`
+    calls: int = 0
+    errors: int = 0
+    rejected: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    max_cost: Optional[float] = None
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    def merge(self, other: "_Pending") -> None:
+        """Suma `other` (más antiguo) a este agregado; conserva la muestra más reciente."""
+        self.calls += other.calls
+        self.errors += other.errors
+        self.rejected += other.rejected
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        self.rows += other.rows
+        if other.max_cost is not None:
+            self.max_cost = max(self.max_cost or 0.0, other.max_cost)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+
+_PENDING: Dict[Tuple[str, str], _Pending] = {}
+_LOCK = threading.Lock()
+_FLUSHER: Optional[threading.Thread] = None
+
+
+def record(
+    sql: str,
+    ms: float,
+    rows: int = 0,
+    *,
+    outcome: str = "ok",
+    plan_cost: Optional[float] = None,
+    source: Optional[str] = None,
+    params: Optional[Dict] = None,
+) -> str:
+    """
+    Acumula una ejecución y retorna su fingerprint. `outcome`: ok | error (falla
+    de la base) | rejected (QueryRejected: costo, timeout o forma). `params` son
+    los parámetros con los que se ejecutó `sql`.
+    """
+    normalized = normalize_sql(sql)
+    fp = fingerprint(normalized)
+    if not _setting("SQL_WORKLOAD_ENABLED", True):
+        return fp
+    with _LOCK:
+        agg = _PENDING.get((source or "default", fp))
+        if agg is None:
+            agg = _PENDING[(source or "default", fp)] = _Pending(normalized)
+        agg.sample, agg.params = sql, dict(params) if params else None
+        agg.calls += 1
+        agg.errors += outcome == "error"
+        agg.rejected += outcome == "rejected"
+        agg.total_ms += ms
+        agg.max_ms = max(agg.max_ms, ms)
+        agg.rows += rows
+        if plan_cost is not None:
+            agg.max_cost = max(agg.max_cost or 0.0, plan_cost)
+        agg.buckets[_bucket(ms)] += 1
+    _start_flusher()
+    return fp
+
+
+def flush() -> int:
+    """Vuelca lo acumulado a SqlFingerprint; retorna cuántos fingerprints se actualizaron."""
+    global _PENDING
+    with _LOCK:
+        items, _PENDING = list(_PENDING.items()), {}
+    now = timezone.now()
+    written = 0
+    try:
+        for key, agg in items:
+            _write(key, agg, now)
+            written += 1
+    except Exception:
+        # Base caída o similar: lo no escrito se devuelve a la acumulación (el fingerprint que
+        # falló no llegó a sumarse: cada uno va en su propia transacción).
+        with _LOCK:
+            for key, agg in items[written:]:
+                newer = _PENDING.get(key)
+                if newer is None:
+                    _PENDING[key] = agg
+                else:
+                    newer.merge(agg)
+        raise
+    if items:
+        logger.info("sql workload flushed fingerprints=%d", len(items))
+    return len(items)
+
+
+def _write(key: Tuple[str, str], agg: _Pending, now) -> None:
+    from ..models import SqlFingerprint
+
+    source, fp = key
+    obj, _ = SqlFingerprint.objects.get_or_create(
+        source=source, fingerprint=fp,
+        defaults={"normalized_sql": agg.normalized, "sample_sql": agg.sample, "sample_params": agg.params,
+                  "last_seen": now, "latency_buckets": [0] * len(agg.buckets)},
+    )
+    with transaction.atomic():
+        # Otro worker puede volcar el mismo fingerprint a la vez: se suma sobre la fila bloqueada.
+        obj = SqlFingerprint.objects.select_for_update().get(pk=obj.pk)
+        obj.sample_sql = agg.sample
+        obj.sample_params = agg.params
+        obj.calls += agg.calls
+        obj.errors += agg.errors
+        obj.rejected += agg.rejected
+        obj.total_ms += agg.total_ms
+        obj.max_ms = max(obj.max_ms, agg.max_ms)
+        obj.rows_total += agg.rows
+        if agg.max_cost is not None:
+            obj.max_plan_cost = max(obj.max_plan_cost or 0.0, agg.max_cost)
+        stored = list(obj.latency_buckets) + [0] * (len(agg.buckets) - len(obj.latency_buckets))
+        obj.latency_buckets = [a + b for a, b in zip(stored, agg.buckets)]
+        obj.last_seen = now
+        obj.save()
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(max(_setting("SQL_WORKLOAD_FLUSH_INTERVAL", 30), 1))
+        try:
+            flush()
+        except Exception:
+            logger.exception("sql workload flush failed")
+        finally:
+            close_old_connections()
+
+
+def _start_flusher() -> None:
+    global _FLUSHER
+    if _FLUSHER is not None:
+        return
+    with _LOCK:
+        if _FLUSHER is None:
+            _FLUSHER = threading.Thread(target=_flush_loop, name="sql-workload-flusher", daemon=True)
+            _FLUSHER.start()
+
+
+def _flush_at_exit() -> None:
+    try:
+        flush()
+    except Exception:
+        logger.exception("sql workload flush at exit failed")
+
+
+atexit.register(_flush_at_exit)
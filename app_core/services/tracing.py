@@ -0,0 +1,136 @@
+"""
+Trazas por petición: cada etapa (parse, history, llm, sql, persist...) se mide
+con `stage()`, alimenta los histogramas de metrics.py y, si hay una traza
+activa (`request_trace()`), queda registrada en ella. Al cerrar la petición la
+traza se emite como una línea JSON en el logger app_core.trace.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .metrics import AGENT_ITERATIONS, LLM_TOKENS_TOTAL, REQUEST_SECONDS, REQUESTS_TOTAL, STAGE_SECONDS
+
+logger = logging.getLogger("app_core.trace")
+
+_TRACE: ContextVar[Optional[Dict]] = ContextVar("analia_trace", default=None)
+
+
+def current_trace() -> Optional[Dict]:
+    return _TRACE.get()
+
+
+def _record(name: str, seconds: float, fields: Dict) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = _TRACE.get()
+    if trace is not None:
+        trace["stages"].append({"stage": name, "ms": round(seconds * 1000, 1), **fields})
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """Mide un bloque; el dict devuelto admite campos extra (p. ej. rows)."""
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        _record(name, time.perf_counter() - started, fields)
+
+
+@contextmanager
+def request_trace(endpoint: str, **fields):
+    """Abre la traza de una petición; `outcome` puede fijarse en el dict devuelto."""
+    trace = {"endpoint": endpoint, "outcome": "ok", "stages": [], **fields}
+    token = _TRACE.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except BaseException:
+        trace["outcome"] = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        trace["ms"] = round(seconds * 1000, 1)
+        REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+        REQUESTS_TOTAL.inc(endpoint=endpoint, outcome=trace["outcome"])
+        logger.info(json.dumps(trace, ensure_ascii=False, default=str))
+        _TRACE.reset(token)
+
+
+def _usage(response) -> Dict[str, int]:
+    """Tokens de entrada/salida de un LLMResult (usage_metadata de LangChain)."""
+    for generations in response.generations or []:
+        for gen in generations:
+            usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if usage:
+                return {"input": usage.get("input_tokens", 0), "output": usage.get("output_tokens", 0)}
+    return {"input": 0, "output": 0}
+
+
+class AgentTraceHandler(BaseCallbackHandler):
+    """
+    Callbacks de LangChain: etapas `llm` y `tool` por llamada y conteo de iteraciones del agente.
+    `sql_queries` guarda, en orden, los SQL de sql_db_query que no devolvieron error.
+    """
+
+    def __init__(self):
+        self._llm_started: Dict = {}
+        self._tool_started: Dict = {}
+        self.iterations = 0
+        self.tokens = {"input": 0, "output": 0}
+        self.sql_queries: List[str] = []
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._llm_started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._llm_started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        usage = _usage(response)
+        for direction, count in usage.items():
+            self.tokens[direction] += count
+            if count:
+                LLM_TOKENS_TOTAL.inc(count, direction=direction)
+        if started is not None:
+            _record("llm", time.perf_counter() - started,
+                    {"input_tokens": usage["input"], "output_tokens": usage["output"]})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            _record("llm", time.perf_counter() - started, {"error": type(error).__name__})
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        inputs = kwargs.get("inputs") or {}
+        query = inputs.get("query", input_str) if isinstance(inputs, dict) else input_str
+        self._tool_started[run_id] = (time.perf_counter(), (serialized or {}).get("name", "tool"), query)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        started = self._tool_started.pop(run_id, None)
+        if started is not None:
+            _record("tool", time.perf_counter() - started[0], {"tool": started[1]})
+            text = str(getattr(output, "content", output))
+            if started[1] == "sql_db_query" and not text.startswith("Error"):
+                self.sql_queries.append(started[2])
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        started = self._tool_started.pop(run_id, None)
+        if started is not None:
+            _record("tool", time.perf_counter() - started[0], {"tool": started[1], "error": type(error).__name__})
+
+    def on_agent_action(self, action, **kwargs):
+        self.iterations += 1
+
+    def finish(self) -> None:
+        """Cierra la cuenta de la pregunta (llamar una vez terminado el agente)."""
+        AGENT_ITERATIONS.observe(self.iterations)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace["agent_iterations"] = self.iterations
+            trace["llm_tokens"] = dict(self.tokens)
@@ -0,0 +1,113 @@
+"""
+Precalentamiento para arranques en frío (Cloud Run).
+
+warm_up() importa los módulos pesados del agente (Vertex AI, toolkits de
+LangChain), crea el engine y abre WARMUP_POOL_CONNECTIONS conexiones del pool,
+carga el SQLDatabase desde el snapshot de esquema y construye el runnable. Cada
+paso se mide con stage("warmup_*") y el total queda en el log.
+
+wsgi.py/asgi.py lo llaman al arrancar según WARMUP_ON_START:
+  off        -> nada (por defecto; el agente se construye en la primera pregunta)
+  background -> en un hilo: /api/health responde de inmediato y una pregunta que
+                llegue antes espera el build en curso (locks de sql_agent)
+  blocking   -> antes de aceptar peticiones
+También está `manage.py warmup` para medirlo a mano.
+"""
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from sqlalchemy import text
+
+from . import sql_agent
+from .tracing import stage
+
+logger = logging.getLogger(__name__)
+
+# Solo se cargan al construir el agente; importarlos antes es una regresión de arranque.
+HEAVY_MODULES = (
+    "langchain_google_vertexai",
+    "langchain_community.agent_toolkits",
+    "langchain_community.utilities.sql_database",
+    "langchain_core.runnables.history",
+    "app_core.services.chat_history",
+)
+
+_STARTED = False
+_START_LOCK = threading.Lock()
+
+
+def preloaded_heavy_modules() -> List[str]:
+    """Módulos pesados que ya están importados (deberían ser ninguno antes del warm-up)."""
+    return [m for m in HEAVY_MODULES if m in sys.modules]
+
+
+def _open_pool(engine, connections: int) -> int:
+    """Abre `connections` conexiones a la vez y las devuelve al pool, que las mantiene abiertas."""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            opened.append(conn)
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+def warm_up(pool_connections: Optional[int] = None, build_agent: Optional[bool] = None) -> Dict[str, float]:
+    """Ejecuta el precalentamiento y retorna los milisegundos de cada paso."""
+    if pool_connections is None:
+        pool_connections = getattr(settings, "WARMUP_POOL_CONNECTIONS", 2)
+    if build_agent is None:
+        build_agent = getattr(settings, "WARMUP_BUILD_AGENT", True)
+    timings: Dict[str, float] = {}
+
+    def step(name, fn, **fields):
+        started = time.perf_counter()
+        with stage(f"warmup_{name}", **fields):
+            fn()
+        timings[fields.get("module", name)] = round((time.perf_counter() - started) * 1000, 1)
+
+    total = time.perf_counter()
+    if build_agent:
+        for module in HEAVY_MODULES:
+            step("import", lambda: importlib.import_module(module), module=module)
+    step("engine", lambda: _open_pool(sql_agent.get_engine(), pool_connections))
+    step("schema", sql_agent.get_sqldb)
+    if build_agent:
+        step("agent", sql_agent._get_runnable)
+    timings["total"] = round((time.perf_counter() - total) * 1000, 1)
+    logger.info("warmup done %s", " ".join(f"{k}={v}ms" for k, v in timings.items()))
+    return timings
+
+
+def _safe_warm_up() -> None:
+    try:
+        warm_up()
+    except Exception:
+        # Sin warm-up la app sigue funcionando: el agente se construye en la primera pregunta.
+        logger.exception("warmup failed")
+
+
+def warm_up_on_start() -> None:
+    """Hook de arranque (wsgi/asgi): aplica WARMUP_ON_START una sola vez por proceso."""
+    global _STARTED
+    mode = getattr(settings, "WARMUP_ON_START", "off")
+    if mode == "off":
+        return
+    with _START_LOCK:
+        if _STARTED:
+            return
+        _STARTED = True
+    if mode == "blocking":
+        _safe_warm_up()
+    elif mode == "background":
+        threading.Thread(target=_safe_warm_up, name="analia-warmup", daemon=True).start()
+    else:
+        raise RuntimeError(f"WARMUP_ON_START no soportado: {mode}")
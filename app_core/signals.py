@@ -0,0 +1,75 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from .models import Agent, ChatMessage, ChatSession, Indicator, SqlExample
+from .services.answer_cache import bump_data_version
+from .services.rollups import mark_dirty
+from .services.sql_examples import invalidate_index
+
+
+def _invalidate_answers(sender, **kwargs):
+    # Cualquier cambio en los datos analíticos deja obsoletas las respuestas cacheadas.
+    bump_data_version()
+
+
+for _model in (Agent, Indicator):
+    post_save.connect(_invalidate_answers, sender=_model, dispatch_uid=f"answer_cache_{_model.__name__}_save")
+    post_delete.connect(_invalidate_answers, sender=_model, dispatch_uid=f"answer_cache_{_model.__name__}_delete")
+
+
+# ---------- Agregados (IndicatorRollup) ----------
+# Altas, ediciones y borrados por el ORM; las cargas masivas marcan sus fechas
+# por su cuenta (bulk_create/COPY no disparan señales).
+def _indicator_pre_save(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        old = Indicator.objects.filter(pk=instance.pk).values_list("date", flat=True).first()
+    mark_dirty([old, instance.date])
+
+
+def _indicator_deleted(sender, instance, **kwargs):
+    mark_dirty([instance.date])
+
+
+def _agent_dates(agent):
+    return Indicator.objects.filter(agent=agent).values_list("date", flat=True).distinct()
+
+
+def _agent_pre_save(sender, instance, **kwargs):
+    if not instance.pk:
+        return
+    old = Agent.objects.filter(pk=instance.pk).values("site", "region").first()
+    if old and (old["site"], old["region"]) != (instance.site, instance.region):
+        mark_dirty(_agent_dates(instance))
+
+
+def _agent_pre_delete(sender, instance, **kwargs):
+    # on_delete=SET_NULL actualiza los indicadores sin señales: marcar antes.
+    mark_dirty(_agent_dates(instance))
+
+
+pre_save.connect(_indicator_pre_save, sender=Indicator, dispatch_uid="rollups_indicator_save")
+post_delete.connect(_indicator_deleted, sender=Indicator, dispatch_uid="rollups_indicator_delete")
+pre_save.connect(_agent_pre_save, sender=Agent, dispatch_uid="rollups_agent_save")
+pre_delete.connect(_agent_pre_delete, sender=Agent, dispatch_uid="rollups_agent_delete")
+
+
+# ---------- Actividad de sesiones (ChatSession.last_activity / message_count) ----------
+# Los mensajes solo se agregan (se borran junto con su sesión), así que basta post_save.
+def _chat_message_created(sender, instance, created, **kwargs):
+    if created:
+        ChatSession.objects.filter(pk=instance.session_id).update(
+            last_activity=instance.created_at, message_count=F("message_count") + 1,
+        )
+
+
+post_save.connect(_chat_message_created, sender=ChatMessage, dispatch_uid="chat_session_activity")
+
+
+# ---------- Ejemplos few-shot (SqlExample) ----------
+def _sql_examples_changed(sender, **kwargs):
+    invalidate_index()
+
+
+post_save.connect(_sql_examples_changed, sender=SqlExample, dispatch_uid="sql_examples_save")
+post_delete.connect(_sql_examples_changed, sender=SqlExample, dispatch_uid="sql_examples_delete")
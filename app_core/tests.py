@@ -1,3 +1,674 @@
-from django.test import TestCase
+import asyncio
+import io
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .management.commands.snapshot_schema import Command as SnapshotSchemaCommand
+from .models import Agent, ChatJob, ChatMessage, ChatSession, Indicator, IndicatorRollup, QueryResult, RollupDirtyDate
+from .services import chat_jobs, fast_path, result_store, rollups
+from .services.answer_cache import answer_cache_key, answer_with_cache
+from .services.chat_history import SUMMARY_PREFIX, DjangoChatMessageHistory
+from .services.fast_path import build_sql, match_question, try_fast_path
+from .services.index_advisor import parse_query
+from .services.ingest import IngestError, ingest_indicators
+from .services.sources import SourceRegistry, authorize, get_config
+from .services.sql_examples import TfidfIndex
+from .services.sql_workload import LATENCY_BUCKETS_MS, normalize_sql, percentile
+from .services.single_flight import acoalesce, coalesce, flight_key
+from .services.schema_snapshot import build_snapshot, write_snapshot
+from .services.query_exec import QueryRejected, prepare_select
+
+
+# ---------- Ruta rápida (user-005) ----------
+_VOCAB = {
+    "site": {"lima": "Lima", "bogota": "Bogotá"},
+    "region": {"norte": "Norte"},
+    "campaign": {"ventas": "Ventas"},
+    "metric": {"aht": "AHT", "csat": "CSAT"},
+}
+
+
+@mock.patch("app_core.services.fast_path._vocabulary", return_value=_VOCAB)
+class FastPathMatchTests(SimpleTestCase):
+    def _match(self, question, today=date(2024, 3, 14)):  # jueves
+        with mock.patch("app_core.services.fast_path.timezone.localdate", return_value=today):
+            return match_question(question)
+
+    def test_count_agents_by_dimension(self, _vocab):
+        m = self._match("¿Cuántos agentes activos hay por sede?")
+        self.assertEqual((m.intent, m.group_by, m.active_only, m.confidence), ("count_agents", "site", True, 1.0))
+        sql, params = build_sql(m)
+        self.assertIn("GROUP BY a.site", sql)
+        self.assertEqual(params, {"active": True})
+
+    def test_avg_indicator_with_filter_and_period(self, _vocab):
+        m = self._match("promedio de AHT en Bogotá los últimos 7 días")
+        self.assertEqual((m.intent, m.metric, m.filters), ("avg_indicator", "AHT", {"site": "Bogotá"}))
+        sql, params = build_sql(m)
+        self.assertIn("i.date >= :since AND i.date < :until", sql)
+        self.assertEqual(params, {"metric": "AHT", "since": date(2024, 3, 8), "until": date(2024, 3, 15),
+                                  "site": "Bogotá"})
+
+    def test_calendar_periods(self, _vocab):
+        cases = {
+            "hoy": (date(2024, 3, 14), date(2024, 3, 15)),
+            "ayer": (date(2024, 3, 13), date(2024, 3, 14)),
+            "esta semana": (date(2024, 3, 11), date(2024, 3, 15)),
+            "este mes": (date(2024, 3, 1), date(2024, 3, 15)),
+            "la semana pasada": (date(2024, 3, 4), date(2024, 3, 11)),
+            "el mes pasado": (date(2024, 2, 1), date(2024, 3, 1)),
+        }
+        for period, bounds in cases.items():
+            with self.subTest(period=period):
+                m = self._match(f"promedio de CSAT {period}")
+                self.assertEqual((m.since, m.until), bounds)
+
+    def test_top_agents_lower_is_better(self, _vocab):
+        m = self._match("top 5 agentes de AHT")
+        self.assertEqual((m.intent, m.limit, m.descending), ("top_agents", 5, False))
+        sql, params = build_sql(m)
+        self.assertIn("ORDER BY value ASC", sql)
+        self.assertEqual(params["limit"], 5)
+
+    def test_unmatched_questions(self, _vocab):
+        for question in ("¿Y eso por campaña?", "agentes sin CSAT", "AHT mensual", "promedio de AHT semanal",
+                         "¿qué tal el clima?"):
+            with self.subTest(question=question):
+                self.assertIsNone(self._match(question))
+
+
+@override_settings(FAST_PATH_VOCAB_TTL=300)
+class FastPathVocabularyTests(TestCase):
+    def setUp(self):
+        fast_path._VOCAB = None
+
+    def tearDown(self):
+        fast_path._VOCAB = None
+
+    def test_reads_agents_and_monthly_rollups_without_row_cap(self):
+        Agent.objects.create(code="A1", full_name="Ana", site="Bogotá", region="Norte", campaign="Ventas")
+        for i in range(5):
+            IndicatorRollup.objects.create(grain="month", period_start=date(2024, 1, 1), name=f"KPI {i}",
+                                           campaign="Soporte", region="", site="", value_count=1,
+                                           value_sum=1, value_min=1, value_max=1)
+        with override_settings(SQL_MAX_ROWS=2):
+            vocab = fast_path._vocabulary()
+        self.assertEqual(vocab["site"], {"bogota": "Bogotá"})
+        self.assertEqual(vocab["campaign"], {"ventas": "Ventas", "soporte": "Soporte"})
+        self.assertEqual(len(vocab["metric"]), 5)
+
+    def test_cached_until_ttl(self):
+        first = fast_path._vocabulary()
+        Agent.objects.create(code="A2", full_name="Beto", site="Lima")
+        self.assertIs(fast_path._vocabulary(), first)
+        with override_settings(FAST_PATH_VOCAB_TTL=-1):
+            self.assertIn("lima", fast_path._vocabulary()["site"])
+
+
+class TryFastPathFallbackTests(SimpleTestCase):
+    @mock.patch("app_core.services.fast_path._vocabulary", side_effect=OperationalError("db down"))
+    def test_vocabulary_failure_falls_back_to_agent(self, _vocab):
+        self.assertIsNone(try_fast_path("¿Cuántos agentes hay?"))
+
+    @mock.patch("app_core.services.fast_path._vocabulary", return_value=_VOCAB)
+    @mock.patch("app_core.services.sql_agent.run_raw_select", side_effect=QueryRejected("costosa"))
+    def test_rejected_template_falls_back_to_agent(self, _run, _vocab):
+        self.assertIsNone(try_fast_path("¿Cuántos agentes hay?"))
+
+
+# ---------- Agregados incrementales (user-006) ----------
+@override_settings(ROLLUPS_AUTO_REFRESH=False)
+class RollupRefreshTests(TestCase):
+    def setUp(self):
+        self.agent = Agent.objects.create(code="R1", full_name="Rita", site="Lima", region="Lima")
+
+    def _rollup(self, grain, period):
+        return IndicatorRollup.objects.get(grain=grain, period_start=period, name="AHT")
+
+    def test_bulk_rows_are_picked_up_through_their_markers(self):
+        Indicator.objects.bulk_create([
+            Indicator(name="AHT", campaign="Ventas", date=date(2024, 3, 4), value=300, agent=self.agent),
+            Indicator(name="AHT", campaign="Ventas", date=date(2024, 3, 5), value=200, agent=self.agent),
+        ])
+        self.assertTrue(rollups.pending())  # nunca refrescado
+        rollups.mark_dirty([date(2024, 3, 4), date(2024, 3, 5)])
+        self.assertEqual(rollups.refresh_rollups()["dates"], 2)
+        self.assertFalse(rollups.pending())
+        week = self._rollup("week", date(2024, 3, 4))
+        self.assertEqual((week.value_count, week.value_sum, week.site), (2, 500, "Lima"))
+
+    def test_orm_edits_mark_dates(self):
+        ind = Indicator.objects.create(name="AHT", campaign="Ventas", date=date(2024, 3, 4), value=300,
+                                       agent=self.agent)
+        self.assertTrue(rollups.pending())
+        rollups.refresh_rollups()
+        ind.date, ind.value = date(2024, 4, 1), 100
+        ind.save()
+        rollups.refresh_rollups()
+        self.assertFalse(IndicatorRollup.objects.filter(grain="month", period_start=date(2024, 3, 1)).exists())
+        self.assertEqual(self._rollup("month", date(2024, 4, 1)).value_sum, 100)
+
+        self.agent.site = "Cusco"
+        self.agent.save()
+        rollups.refresh_rollups()
+        self.assertEqual(self._rollup("day", date(2024, 4, 1)).site, "Cusco")
+
+    def test_marker_committed_during_refresh_survives(self):
+        Indicator.objects.create(name="AHT", campaign="Ventas", date=date(2024, 3, 4), value=300)
+        original = rollups._rebuild_periods
+
+        def concurrent_load(grain, periods):
+            if grain == "day":  # otra carga confirma su marca tras la lectura de marcas
+                rollups.mark_dirty([date(2024, 3, 4)])
+            return original(grain, periods)
+
+        with mock.patch.object(rollups, "_rebuild_periods", side_effect=concurrent_load):
+            rollups.refresh_rollups()
+        self.assertEqual(RollupDirtyDate.objects.count(), 1)
+        self.assertTrue(rollups.pending())
+        rollups.refresh_rollups()
+        self.assertFalse(rollups.pending())
+
+
+# ---------- Snapshot de esquema (user-004) ----------
+class SnapshotFreshnessTests(SimpleTestCase):
+    def setUp(self):
+        from sqlalchemy import create_engine, text
+
+        self.engine = create_engine("sqlite://")
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE metrics (id INTEGER PRIMARY KEY, name TEXT)"))
+            conn.execute(text("CREATE TABLE teams (id INTEGER PRIMARY KEY)"))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = write_snapshot(build_snapshot(self.engine, ["metrics"], 0), Path(tmp.name) / "snapshot.json")
+
+    def test_current_uses_requested_configuration(self):
+        current = SnapshotSchemaCommand()._current
+        self.assertIsNotNone(current(self.engine, self.path, ["metrics"], 0))
+        self.assertIsNone(current(self.engine, self.path, ["metrics", "teams"], 0))
+        self.assertIsNone(current(self.engine, self.path, ["metrics"], 2))
+
+
+# ---------- Jobs de chat (user-020) ----------
+def _job(status="queued", **fields):
+    sess, _ = ChatSession.objects.get_or_create(session_id="s-jobs")
+    return ChatJob.objects.create(session=sess, question="¿Cuántos agentes hay?", status=status, **fields)
+
+
+@override_settings(CHAT_JOBS_EXECUTOR="worker", CHAT_JOBS_STALE_AFTER=120, CHAT_JOBS_MAX_ATTEMPTS=2)
+class ChatJobClaimTests(TestCase):
+    def test_claim_is_exclusive_and_starts_heartbeat(self):
+        job = _job()
+        self.assertTrue(chat_jobs.claim(job.pk))
+        self.assertFalse(chat_jobs.claim(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("running", 1))
+        self.assertEqual(job.heartbeat_at, job.started_at)
+
+    def test_requeue_uses_missed_heartbeat_not_run_time(self):
+        now = timezone.now()
+        long_alive = _job("running", attempts=1, started_at=now - timedelta(hours=1),
+                          heartbeat_at=now - timedelta(seconds=10))
+        dead = _job("running", attempts=1, started_at=now - timedelta(minutes=5),
+                    heartbeat_at=now - timedelta(minutes=5))
+        exhausted = _job("running", attempts=2, started_at=now - timedelta(minutes=5),
+                         heartbeat_at=now - timedelta(minutes=5))
+        self.assertEqual(chat_jobs.requeue_stale(), 1)
+        statuses = dict(ChatJob.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {long_alive.pk: "running", dead.pk: "queued", exhausted.pk: "error"})
+        self.assertEqual(chat_jobs.queued_ids(10), [dead.pk])
+
+    def test_beat_only_touches_running_jobs(self):
+        self.assertFalse(chat_jobs.beat(_job("done").pk))
+
+
+@override_settings(CHAT_JOBS_EXECUTOR="worker", CHAT_JOBS_HEARTBEAT_INTERVAL=0.02)
+class ChatJobHeartbeatTests(TransactionTestCase):
+    def test_running_job_keeps_beating(self):
+        job = _job()
+        chat_jobs.claim(job.pk)
+        first = ChatJob.objects.get(pk=job.pk).heartbeat_at
+        with chat_jobs._heartbeat(job.pk):
+            time.sleep(0.15)
+        self.assertGreater(ChatJob.objects.get(pk=job.pk).heartbeat_at, first)
+
+
+# ---------- Streaming SSE (user-002) ----------
+async def _agent_events(**kwargs):
+    yield {"type": "final", "reply": "Hay 3 agentes.", "results": []}
+
+
+@override_settings(CHAT_QUEUE_TIMEOUT=0.01)
+@mock.patch("app_core.views.store_answer")
+@mock.patch("app_core.views.lookup_answer", return_value=("k", None, []))
+@mock.patch("app_core.views.astream_sql_agent", side_effect=_agent_events)
+class ChatStreamSlotTests(TestCase):
+    async def _stream(self):
+        resp = await AsyncClient().post("/api/chat/stream/", {"session_id": "s-stream", "message": "¿Cuántos?"},
+                                        content_type="application/json")
+        return b"".join([chunk async for chunk in resp.streaming_content]).decode()
+
+    async def test_stream_holds_and_releases_a_slot(self, *_mocks):
+        from .services.concurrency import _semaphore
+
+        with override_settings(CHAT_MAX_CONCURRENCY=1):
+            body = await self._stream()
+            self.assertIn("event: final", body)
+            self.assertEqual(_semaphore()._value, 1)
+
+    async def test_stream_without_slot_reports_overload(self, *_mocks):
+        with override_settings(CHAT_MAX_CONCURRENCY=0):
+            body = await self._stream()
+        self.assertIn("event: error", body)
+        self.assertNotIn("event: final", body)
+
+
+# ---------- Resultados tabulares (user-022) ----------
+@override_settings(RESULTS_ENABLED=True, RESULTS_TTL=3600)
+class ResultStoreTests(TestCase):
+    ROWS = [{"site": "Lima", "n": 3}, {"site": "Cusco", "n": 1}, {"site": "Piura", "n": 2}]
+
+    def _answer(self, session_id="s-owner"):
+        with result_store.collect_results() as ids:
+            result = result_store.save_result("SELECT site, n FROM t", self.ROWS)
+        sess, _ = ChatSession.objects.get_or_create(session_id=session_id)
+        ChatMessage.objects.create(session=sess, role="assistant", content="Tres sedes.", results=ids,
+                                   created_at=timezone.now())
+        return result
+
+    def test_single_values_are_not_tables(self):
+        self.assertIsNone(result_store.save_result("SELECT 1", [{"n": 1}]))
+
+    def test_columnar_page_and_csv(self):
+        result = self._answer()
+        self.assertEqual(result.columns, [{"name": "site", "type": "text"}, {"name": "n", "type": "number"}])
+        page = result_store.page(result, 1, 1)
+        self.assertEqual((page["data"], page["next_offset"]), ([["Cusco"], [1]], 2))
+        self.assertEqual("".join(result_store.iter_csv(result)).splitlines(), ["site,n", "Lima,3", "Cusco,1", "Piura,2"])
+
+    def test_result_is_served_only_to_its_sessions(self):
+        result = self._answer()
+        url = f"/api/results/{result.result_id}/"
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {"session_id": "s-other"}).status_code, 404)
+        resp = self.client.get(url, {"session_id": "s-owner", "limit": 2})
+        self.assertEqual((resp.status_code, resp.json()["next_offset"]), (200, 2))
+
+        csv_url = f"/api/results/{result.result_id}/csv/"
+        self.assertEqual(self.client.get(csv_url, {"session_id": "s-other"}).status_code, 404)
+        resp = self.client.get(csv_url, {"session_id": "s-owner"}, HTTP_ACCEPT="text/csv")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"site,n"))
+
+    def test_expired_results_are_gone(self):
+        result = self._answer()
+        QueryResult.objects.filter(pk=result.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(result_store.get_result(result.result_id, "s-owner"))
+
+
+# ---------- Caché de respuestas (user-001) ----------
+@override_settings(ANSWER_CACHE_CONTEXT_TURNS=2)
+class AnswerCacheKeyTests(SimpleTestCase):
+    def test_normalized_question_shares_key_across_sessions(self):
+        key = answer_cache_key("¿Cuántos agentes hay?", ["pregunta previa"])
+        self.assertEqual(key, answer_cache_key("cuantos agentes hay", []))
+        self.assertTrue(key.startswith("analia:answer:v1:"))
+
+    def test_followup_includes_recent_questions(self):
+        self.assertNotEqual(
+            answer_cache_key("¿Y en Lima?", ["agentes por sede"]),
+            answer_cache_key("¿Y en Lima?", ["agentes por region"]),
+        )
+
+    def test_version_and_source_change_key(self):
+        base = answer_cache_key("cuantos agentes hay")
+        self.assertEqual(base, answer_cache_key("cuantos agentes hay", source="default"))
+        self.assertNotEqual(base, answer_cache_key("cuantos agentes hay", version=2))
+        self.assertNotEqual(base, answer_cache_key("cuantos agentes hay", source="cliente_a"))
+
+
+@mock.patch("app_core.services.answer_cache.store_answer")
+class AnswerWithCacheTests(SimpleTestCase):
+    @mock.patch("app_core.services.answer_cache.lookup_answer", return_value=("k", "Hay 3.", []))
+    def test_cache_hit_is_cached(self, _lookup, _store):
+        self.assertEqual(answer_with_cache("s", "¿Cuántos?", ask=mock.Mock()), ("Hay 3.", True))
+
+    @mock.patch("app_core.services.answer_cache.lookup_answer", return_value=("k", None, []))
+    @mock.patch("app_core.services.single_flight.coalesce", return_value=(("Hay 3.", []), True))
+    def test_coalesced_answer_is_not_reported_as_cached(self, _coalesce, _lookup, store):
+        self.assertEqual(answer_with_cache("s", "¿Cuántos?", ask=mock.Mock()), ("Hay 3.", False))
+        store.assert_not_called()  # lo guarda quien ejecutó el agente
+
+
+# ---------- Ejecución con costo acotado (user-011) ----------
+class PrepareSelectTests(SimpleTestCase):
+    def test_wraps_with_limit_plus_one(self):
+        self.assertEqual(
+            prepare_select("SELECT id FROM app_core_agent;  ", 10),
+            "SELECT * FROM (SELECT id FROM app_core_agent) AS _analia_q LIMIT 11",
+        )
+
+    def test_rejects_non_select(self):
+        for sql in ("DELETE FROM app_core_agent", "WITH x AS (SELECT 1) DELETE FROM app_core_agent", ""):
+            with self.subTest(sql=sql), self.assertRaises(QueryRejected):
+                prepare_select(sql, 10)
+
+    def test_rejects_several_statements(self):
+        with self.assertRaises(QueryRejected):
+            prepare_select("SELECT 1; DROP TABLE app_core_agent", 10)
+
+
+# ---------- Ingesta masiva (user-008) ----------
+def _csv(*lines):
+    return io.StringIO("\n".join(("agent_code,name,campaign,date,value",) + lines) + "\n")
+
+
+@override_settings(ROLLUPS_AUTO_REFRESH=False)
+class IngestIndicatorsTests(TestCase):
+    def setUp(self):
+        self.agent = Agent.objects.create(code="A1", full_name="Ana", site="Lima")
+
+    def test_upsert_by_natural_key(self):
+        summary = ingest_indicators(_csv(
+            "A1,AHT,Ventas,2024-03-04,300",
+            "A1,AHT,Ventas,2024-03-04,310",  # misma clave en el bloque: gana la última
+            ",CSAT,Ventas,2024-03-04,4.5",  # sin agente
+            "ZZ,AHT,Ventas,2024-03-04,1",
+            "A1,AHT,Ventas,no-es-fecha,1",
+        ), fmt="csv", chunk_size=2)
+        self.assertEqual((summary["read"], summary["inserted"], summary["updated"]), (5, 2, 0))
+        self.assertEqual((summary["unknown_agent"], summary["invalid"]), (1, 1))
+        self.assertEqual(Indicator.objects.get(name="AHT").value, 310)
+
+        summary = ingest_indicators(_csv("A1,AHT,Ventas,2024-03-04,280", ",CSAT,Ventas,2024-03-04,4.0",
+                                         "A1,AHT,Ventas,2024-03-05,290"), fmt="csv")
+        self.assertEqual((summary["inserted"], summary["updated"]), (1, 2))
+        self.assertEqual(dict(Indicator.objects.filter(date=date(2024, 3, 4)).values_list("name", "value")),
+                         {"AHT": 280, "CSAT": 4.0})
+        self.assertEqual(set(RollupDirtyDate.objects.values_list("date", flat=True)),
+                         {date(2024, 3, 4), date(2024, 3, 5)})
+
+    def test_missing_columns(self):
+        with self.assertRaises(IngestError):
+            ingest_indicators(io.StringIO("agent_code,name\nA1,AHT\n"), fmt="csv")
+
+
+# ---------- Historial conversacional (user-009) ----------
+def _turns(session_id, n, pending=None):
+    sess, _ = ChatSession.objects.get_or_create(session_id=session_id)
+    for i in range(1, n + 1):
+        ChatMessage.objects.create(session=sess, role="user", content=f"pregunta {i}", created_at=timezone.now())
+        ChatMessage.objects.create(session=sess, role="assistant", content=f"respuesta {i}", created_at=timezone.now())
+    if pending:
+        ChatMessage.objects.create(session=sess, role="user", content=pending, created_at=timezone.now())
+    return sess
+
+
+class ChatHistoryWindowTests(TestCase):
+    def test_window_keeps_last_turns_without_pending_question(self):
+        _turns("s-hist", 4, pending="pregunta en curso")
+        messages = DjangoChatMessageHistory("s-hist", max_turns=2, token_budget=1000).messages
+        self.assertEqual([m.content for m in messages], ["pregunta 3", "respuesta 3", "pregunta 4", "respuesta 4"])
+        self.assertEqual([m.type for m in messages], ["human", "ai", "human", "ai"])
+
+    def test_unknown_session_and_read_only_store(self):
+        self.assertEqual(DjangoChatMessageHistory("s-nueva").messages, [])
+        _turns("s-hist", 1)
+        history = DjangoChatMessageHistory("s-hist")
+        history.add_messages(history.messages)
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+
+# ---------- Compactación del historial (user-010) ----------
+@override_settings(CHAT_HISTORY_SUMMARY_BATCH_TURNS=2, CHAT_HISTORY_SUMMARY_MAX_TOKENS=50)
+class ChatHistoryCompactionTests(TestCase):
+    def test_old_turns_are_folded_into_the_summary(self):
+        sess = _turns("s-long", 5, pending="pregunta en curso")
+        summarize = mock.Mock(return_value="Se habló de las preguntas 1 a 3.")
+        messages = DjangoChatMessageHistory("s-long", max_turns=2, summarize=summarize, token_budget=1000).messages
+
+        prev, old = summarize.call_args.args
+        self.assertEqual(prev, "")
+        self.assertEqual(old[0], ("user", "pregunta 2"))
+        self.assertEqual(len(old), 4)
+        self.assertEqual(messages[0].content, SUMMARY_PREFIX + "Se habló de las preguntas 1 a 3.")
+        self.assertEqual([m.content for m in messages[1:]], ["pregunta 4", "respuesta 4", "pregunta 5", "respuesta 5"])
+        sess.refresh_from_db()
+        self.assertEqual(sess.history_summary, "Se habló de las preguntas 1 a 3.")
+
+        # Lo ya resumido no se vuelve a leer ni a resumir.
+        summarize.reset_mock()
+        again = DjangoChatMessageHistory("s-long", max_turns=2, summarize=summarize, token_budget=1000).messages
+        summarize.assert_not_called()
+        self.assertEqual([m.content for m in again], [m.content for m in messages])
+
+    def test_summarizer_failure_keeps_recent_turns(self):
+        _turns("s-long", 5)
+        summarize = mock.Mock(side_effect=RuntimeError("LLM caído"))
+        messages = DjangoChatMessageHistory("s-long", max_turns=2, summarize=summarize, token_budget=1000).messages
+        self.assertEqual(messages[0].content, "pregunta 4")
+        self.assertEqual(ChatSession.objects.get(session_id="s-long").history_summary, "")
+
+    def test_token_budget_drops_oldest_turns(self):
+        _turns("s-long", 3)
+        messages = DjangoChatMessageHistory("s-long", max_turns=3, token_budget=7).messages
+        self.assertEqual([m.content for m in messages], ["pregunta 3", "respuesta 3"])
+
+
+# ---------- Paginación keyset (user-012) ----------
+class KeysetPaginationTests(TestCase):
+    def test_sessions_by_last_activity(self):
+        for i in range(3):
+            _turns(f"s-{i}", i + 1)
+        first = self.client.get("/api/sessions/", {"limit": 2}).json()
+        self.assertEqual([r["session_id"] for r in first["results"]], ["s-2", "s-1"])
+        self.assertEqual(first["results"][0]["message_count"], 6)
+        rest = self.client.get("/api/sessions/", {"limit": 2, "cursor": first["next_cursor"]}).json()
+        self.assertEqual(([r["session_id"] for r in rest["results"]], rest["next_cursor"]), (["s-0"], None))
+        self.assertEqual(self.client.get("/api/sessions/", {"cursor": "###"}).status_code, 400)
+
+    def test_messages_before_and_since(self):
+        _turns("s-msgs", 3)
+        url = "/api/sessions/s-msgs/"
+        last = self.client.get(url, {"limit": 4}).json()
+        self.assertEqual([m["content"] for m in last["results"]],
+                         ["pregunta 2", "respuesta 2", "pregunta 3", "respuesta 3"])
+        older = self.client.get(url, {"limit": 4, "before": last["before"]}).json()
+        self.assertEqual(([m["content"] for m in older["results"]], older["before"]),
+                         (["pregunta 1", "respuesta 1"], None))
+        delta = self.client.get(url, {"since": last["last_id"]}).json()
+        self.assertEqual((delta["results"], delta["last_id"]), ([], last["last_id"]))
+        self.assertEqual(self.client.get("/api/sessions/otra/").status_code, 404)
+
+
+# ---------- Peticiones condicionales (user-013) ----------
+class ConditionalRequestTests(TestCase):
+    def test_session_messages_revalidate_with_etag(self):
+        sess = _turns("s-etag", 1)
+        url = "/api/sessions/s-etag/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {"limit": 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        ChatMessage.objects.create(session=sess, role="user", content="otra", created_at=timezone.now())
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_session_list_changes_with_labels(self):
+        _turns("s-etag", 1)
+        etag = self.client.get("/api/sessions/")["ETag"]
+        self.assertEqual(self.client.get("/api/sessions/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        ChatSession.objects.filter(session_id="s-etag").update(user_label="Reporte")
+        self.assertEqual(self.client.get("/api/sessions/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ---------- Coalescencia single-flight (user-016) ----------
+@override_settings(SINGLE_FLIGHT_BACKEND="local", SINGLE_FLIGHT_WAIT=5)
+class SingleFlightTests(SimpleTestCase):
+    def test_key_follows_answer_cache_equivalence(self):
+        self.assertEqual(flight_key("¿Cuántos agentes hay?"), flight_key("cuantos agentes hay"))
+        self.assertNotEqual(flight_key("cuantos agentes hay"), flight_key("cuantos agentes hay", source="cliente_a"))
+
+    def test_concurrent_calls_share_one_execution(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def leader_fn():
+            calls.append("leader")
+            started.set()
+            release.wait(5)
+            return "respuesta"
+
+        results = {}
+        leader = threading.Thread(target=lambda: results.setdefault("leader", coalesce("k", leader_fn)))
+        leader.start()
+        started.wait(5)
+        def follower_fn():
+            calls.append("follower")
+
+        follower = threading.Thread(target=lambda: results.setdefault("follower", coalesce("k", follower_fn)))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(calls, ["leader"])
+        self.assertEqual(results, {"leader": ("respuesta", False), "follower": ("respuesta", True)})
+
+    def test_async_followers_get_the_leader_result_or_error(self):
+        async def scenario(outcome):
+            calls = []
+
+            async def afn():
+                calls.append(1)
+                await asyncio.sleep(0.05)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+            results = await asyncio.gather(acoalesce("k", afn), acoalesce("k", afn), return_exceptions=True)
+            return results, len(calls)
+
+        self.assertEqual(asyncio.run(scenario("ok")), ([("ok", False), ("ok", True)], 1))
+        error = RuntimeError("agente caído")
+        self.assertEqual(asyncio.run(scenario(error)), ([error, error], 1))
+
+    @override_settings(SINGLE_FLIGHT_BACKEND="off")
+    def test_off_runs_every_call(self):
+        self.assertEqual(coalesce("k", lambda: 1), (1, False))
+
+
+# ---------- Ejemplos few-shot (user-019) ----------
+class TfidfIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = TfidfIndex([
+            ("¿Cuántos agentes hay por sede?", "SELECT site, COUNT(*) FROM app_core_agent GROUP BY site"),
+            ("Promedio de AHT por campaña", "SELECT campaign, AVG(value) FROM app_core_indicator GROUP BY campaign"),
+        ])
+
+    def test_ranks_closest_question_first(self):
+        results = self.index.search("cuantos agentes por sede hay en total", k=2, min_score=0.0)
+        self.assertEqual(results[0][1], "¿Cuántos agentes hay por sede?")
+        self.assertGreater(results[0][0], results[-1][0])
+
+    def test_min_score_and_unknown_terms(self):
+        self.assertEqual(self.index.search("clima de mañana", k=2, min_score=0.1), [])
+        self.assertEqual(len(self.index.search("promedio aht", k=1, min_score=0.1)), 1)
+
+
+# ---------- Registro de fuentes SQL (user-023) ----------
+_SOURCES = {
+    name: {"url": f"sqlite:///{tempfile.gettempdir()}/analia-{name}.db", "tables": ["metrics"],
+           "keys": [f"clave-{name}"]}
+    for name in ("cliente_a", "cliente_b")
+}
+
+
+@override_settings(SQL_SOURCES=_SOURCES, SQL_SOURCES_MAX_ACTIVE=1, SQL_SOURCES_IDLE_TIMEOUT=0)
+class SourceRegistryTests(SimpleTestCase):
+    def test_config_and_authorization(self):
+        self.assertEqual(get_config("cliente_a").tables, ["metrics"])
+        self.assertTrue(get_config("cliente_a").snapshot_path.name.endswith("schema_snapshot.cliente_a.json"))
+        with self.assertRaises(RuntimeError):
+            get_config("desconocida")
+        self.assertTrue(authorize(None, None))
+        self.assertTrue(authorize("cliente_a", "clave-cliente_a"))
+        self.assertFalse(authorize("cliente_a", "clave-cliente_b"))
+        self.assertFalse(authorize("cliente_a", None))
+
+    def test_least_recently_used_source_is_evicted(self):
+        reg = SourceRegistry()
+        a = reg.get("cliente_a")
+        a.engine()
+        reg.get("cliente_b")
+        self.assertTrue(a.closed)
+        self.assertIsNot(reg.get("cliente_a"), a)
+
+    def test_held_source_closes_after_release(self):
+        reg = SourceRegistry()
+        with reg.use("cliente_a") as a:
+            reg.get("cliente_b")
+            self.assertFalse(a.closed)
+        self.assertTrue(a.closed)
+
+    def test_sweep_closes_idle_sources(self):
+        reg = SourceRegistry()
+        reg.get("cliente_a").last_used -= 10
+        with override_settings(SQL_SOURCES_IDLE_TIMEOUT=5):
+            self.assertEqual(reg.sweep(), ["cliente_a"])
+
+
+# ---------- Workload SQL (user-024) ----------
+class SqlWorkloadTests(SimpleTestCase):
+    def test_normalize_sql_replaces_literals(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t -- nota\nWHERE campaign = 'O''Hara' AND n IN (1, 2, 3) AND d = :d;"),
+            "select * from t where campaign = ? and n in (?, ...) and d = ?",
+        )
+
+    def test_same_shape_same_text(self):
+        self.assertEqual(normalize_sql("select 1.5 from t where x = 10"), normalize_sql("SELECT 2 FROM t WHERE x = 7"))
+
+    def test_percentile(self):
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.assertIsNone(percentile(buckets, 0.5))
+        buckets[0] = 10  # todas en (0, 1] ms
+        self.assertEqual(percentile(buckets, 0.5), 0.5)
+        buckets[-1] = 10  # la mitad por encima del último tramo
+        self.assertEqual(percentile(buckets, 0.99), float(LATENCY_BUCKETS_MS[-1]))
+
+
+# ---------- Asesor de índices (user-025) ----------
+class ParseQueryTests(SimpleTestCase):
+    columns = {
+        "app_core_indicator": {"id", "name", "campaign", "date", "value", "agent_id"},
+        "app_core_agent": {"id", "code", "site", "region", "active"},
+    }
+
+    def test_classifies_columns(self):
+        shape = parse_query(
+            "SELECT a.site, AVG(i.value) FROM app_core_indicator i JOIN app_core_agent a ON a.id = i.agent_id "
+            "WHERE i.name = 'AHT' AND i.date >= '2024-01-01' AND a.active = true GROUP BY a.site",
+            self.columns,
+        )
+        self.assertEqual(shape.tables, {"app_core_indicator", "app_core_agent"})
+        self.assertEqual(shape.eq, {"app_core_indicator": ["name"], "app_core_agent": ["active"]})
+        self.assertEqual(shape.range, {"app_core_indicator": ["date"]})
+        self.assertEqual(shape.join, {"app_core_agent": ["id"], "app_core_indicator": ["agent_id"]})
+        self.assertEqual(shape.order, {"app_core_agent": ["site"]})
+        self.assertEqual(shape.literals[("app_core_agent", "active")], "true")
+
+    def test_parameters_are_equalities_without_literal(self):
+        shape = parse_query("SELECT COUNT(*) FROM app_core_agent a WHERE a.region = :region", self.columns)
+        self.assertEqual(shape.eq, {"app_core_agent": ["region"]})
+        self.assertEqual(shape.literals, {})
@@ -1,49 +1,118 @@
 import os
-from django.db.models import Max
+import json
+import math
+import time
+import base64
+import hashlib
+import asyncio
+import functools
+import logging
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Q
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
 from django.shortcuts import render
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from django.utils import timezone
-from django.shortcuts import render
-from .serializers import ChatRequestSerializer, ChatResponseSerializer
-from .models import ChatSession, ChatMessage
-from .services.sql_agent import ask_sql_agent
-
+from django.urls import reverse
+from rest_framework.parsers import MultiPartParser
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAdminUser
 from .serializers import (
-    ChatRequestSerializer, ChatResponseSerializer,
-    ChatSessionSerializer, ChatMessageSerializer,  # <-- nuevos
+    ChatRequestSerializer, ChatResponseSerializer, ChatJobSerializer, SqlFingerprintSerializer,
+    ChatSessionSerializer, ChatMessageSerializer,
 )
-from .models import ChatSession, ChatMessage
-from .services.sql_agent import ask_sql_agent
+from .models import ChatJob, ChatSession, ChatMessage, SqlFingerprint
+from .services.sql_agent import astream_sql_agent
+from .services.answer_cache import answer_with_cache, aanswer_with_cache, lookup_answer, store_answer
+from .services.chat_jobs import enqueue
+from .services import result_store, sources, sql_workload
+from .services.concurrency import Overloaded, chat_slot
+from .services.ingest import IngestError, detect_format, ingest_indicators
+from .services.metrics import render_prometheus
+from .services.tracing import request_trace, stage
+
+logger = logging.getLogger(__name__)
+
+
+# --- Trazas por petición (ver services/tracing.py) ---
+def _finish_trace(trace, resp):
+    trace["status"] = resp.status_code
+    if resp.status_code >= 400:
+        trace["outcome"] = "error"
+    return resp
+
+
+def _traced(endpoint):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            with request_trace(endpoint) as trace:
+                return _finish_trace(trace, method(self, request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _atraced(endpoint):
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, request, *args, **kwargs):
+            with request_trace(endpoint) as trace:
+                return _finish_trace(trace, await method(self, request, *args, **kwargs))
+        return wrapper
+    return decorator
 
 
 class ChatAPIView(APIView):
+    @_traced("chat")
     def post(self, request):
-        ser = ChatRequestSerializer(data=request.data)
-        ser.is_valid(raise_exception=True)
+        with stage("parse"):
+            ser = ChatRequestSerializer(data=request.data, context={"request": request})
+            ser.is_valid(raise_exception=True)
         session_id = ser.validated_data['session_id']
         message = ser.validated_data['message']
+        mode = ser.validated_data.get('mode')
+        source = ser.validated_data.get('source')
 
-        # Crear/obtener sesión
-        sess, _ = ChatSession.objects.get_or_create(session_id=session_id)
+        with stage("persist", role="user"):
+            # Crear/obtener sesión
+            sess, _ = ChatSession.objects.get_or_create(session_id=session_id)
 
-        # Guardar mensaje de usuario
-        ChatMessage.objects.create(session=sess, role='user', content=message, created_at=timezone.now())
+            # Preguntas previas de la sesión (contexto para la clave de caché)
+            recent_questions = list(
+                ChatMessage.objects.filter(session=sess, role='user')
+                .order_by('-created_at')
+                .values_list('content', flat=True)[:settings.ANSWER_CACHE_CONTEXT_TURNS]
+            )
+
+            # Guardar mensaje de usuario
+            ChatMessage.objects.create(session=sess, role='user', content=message, created_at=timezone.now())
 
         try:
-            # Consultar agente
-            reply = ask_sql_agent(session_id=session_id, user_query=message)
+            # Consultar agente (o la caché de respuestas)
+            with result_store.collect_results() as result_ids:
+                reply, cached = answer_with_cache(session_id, message, recent_questions, mode=mode, source=source)
 
             # Guardar respuesta
-            ChatMessage.objects.create(session=sess, role='assistant', content=reply, created_at=timezone.now())
+            with stage("persist", role="assistant"):
+                ChatMessage.objects.create(session=sess, role='assistant', content=reply,
+                                           results=result_ids, created_at=timezone.now())
 
-            return Response(ChatResponseSerializer({"reply": reply}).data, status=status.HTTP_200_OK)
+            return Response(
+                ChatResponseSerializer({
+                    "reply": reply, "cached": cached, "results": result_store.describe(result_ids),
+                }).data,
+                status=status.HTTP_200_OK,
+            )
         except RuntimeError as e:
             error_message = str(e)
             # Guardar el error como respuesta del asistente para mantener el histórico
@@ -57,13 +126,316 @@ class ChatAPIView(APIView):
                 {"error": error_message}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        except Exception as e:
-            print(f"Error inesperado: {str(e)}")
+        except Exception:
+            logger.exception("chat failed session=%s", session_id)
             return Response(
                 {"error": "Error interno del servidor"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+# --- Ruta async (ASGI) ---
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncChatView(View):
+    """
+    POST /api/chat/async/ -> mismo contrato que /api/chat/, pero con ainvoke y
+    ORM async: bajo un servidor ASGI una pregunta en vuelo no ocupa un worker.
+    El número de preguntas simultáneas por proceso se limita con CHAT_MAX_CONCURRENCY.
+    """
+    @_atraced("chat_async")
+    async def post(self, request):
+        with stage("parse"):
+            try:
+                data = json.loads(request.body or b"{}")
+            except ValueError:
+                return JsonResponse({"detail": "JSON inválido"}, status=400)
+            ser = ChatRequestSerializer(data=data, context={"request": request})
+            if not ser.is_valid():
+                return JsonResponse(ser.errors, status=400)
+        session_id = ser.validated_data['session_id']
+        message = ser.validated_data['message']
+        mode = ser.validated_data.get('mode')
+        source = ser.validated_data.get('source')
+
+        with stage("persist", role="user"):
+            sess, _ = await ChatSession.objects.aget_or_create(session_id=session_id)
+            recent_questions = [
+                content async for content in
+                ChatMessage.objects.filter(session=sess, role='user')
+                .order_by('-created_at')
+                .values_list('content', flat=True)[:settings.ANSWER_CACHE_CONTEXT_TURNS]
+            ]
+            await ChatMessage.objects.acreate(session=sess, role='user', content=message, created_at=timezone.now())
+
+        try:
+            async with chat_slot():
+                with result_store.collect_results() as result_ids:
+                    reply, cached = await aanswer_with_cache(
+                        session_id, message, recent_questions, mode=mode, source=source,
+                    )
+        except Overloaded as e:
+            resp = JsonResponse({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            resp["Retry-After"] = "5"
+            return resp
+        except RuntimeError as e:
+            error_message = str(e)
+            await ChatMessage.objects.acreate(
+                session=sess, role='assistant', content=f"Error: {error_message}", created_at=timezone.now()
+            )
+            return JsonResponse({"error": error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception:
+            logger.exception("chat_async failed session=%s", session_id)
+            return JsonResponse({"error": "Error interno del servidor"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        with stage("persist", role="assistant"):
+            await ChatMessage.objects.acreate(session=sess, role='assistant', content=reply,
+                                              results=result_ids, created_at=timezone.now())
+        results = await sync_to_async(result_store.describe)(result_ids)
+        return JsonResponse(ChatResponseSerializer({"reply": reply, "cached": cached, "results": results}).data)
+
+
+# --- Streaming (Server-Sent Events) ---
+def _sse(event: str, data: dict) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def _sse_sync(events, on_final, on_error):
+    """
+    Consume el generador async del agente desde un worker WSGI, emitiendo cada
+    evento apenas llega (StreamingHttpResponse bufferiza los iteradores async
+    cuando se sirve por WSGI).
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                ev = loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                break
+            except RuntimeError as e:
+                on_error(str(e))
+                yield _sse("error", {"error": str(e)})
+                break
+            if ev["type"] == "final":
+                on_final(ev["reply"], ev.get("results", []))
+            yield _sse(ev["type"], ev)
+    finally:
+        loop.run_until_complete(events.aclose())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+async def _sse_async(events, on_final, on_error):
+    """Variante para ASGI: el event loop del servidor consume el generador."""
+    try:
+        async for ev in events:
+            if ev["type"] == "final":
+                await sync_to_async(on_final)(ev["reply"], ev.get("results", []))
+            yield _sse(ev["type"], ev)
+    except RuntimeError as e:
+        await sync_to_async(on_error)(str(e))
+        yield _sse("error", {"error": str(e)})
+
+
+def _sse_response(content) -> StreamingHttpResponse:
+    resp = StreamingHttpResponse(content, content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # evita buffering en proxies nginx
+    return resp
+
+
+class ChatStreamAPIView(APIView):
+    """
+    POST /api/chat/stream/ -> mismo body que /api/chat/, responde text/event-stream
+    con eventos start, tool, sql, token, final (o error).
+    """
+    def post(self, request):
+        ser = ChatRequestSerializer(data=request.data, context={"request": request})
+        ser.is_valid(raise_exception=True)
+        session_id = ser.validated_data['session_id']
+        message = ser.validated_data['message']
+        mode = ser.validated_data.get('mode')
+        source = ser.validated_data.get('source')
+
+        sess, _ = ChatSession.objects.get_or_create(session_id=session_id)
+        recent_questions = list(
+            ChatMessage.objects.filter(session=sess, role='user')
+            .order_by('-created_at')
+            .values_list('content', flat=True)[:settings.ANSWER_CACHE_CONTEXT_TURNS]
+        )
+        ChatMessage.objects.create(session=sess, role='user', content=message, created_at=timezone.now())
+        start = _sse("start", {"type": "start", "session_id": session_id})
+
+        cache_key, cached_reply, cached_ids = lookup_answer(message, recent_questions, source)
+        if cached_reply is not None:
+            ChatMessage.objects.create(session=sess, role='assistant', content=cached_reply,
+                                       results=cached_ids, created_at=timezone.now())
+            return _sse_response(iter([
+                start, _sse("final", {"type": "final", "reply": cached_reply, "cached": True,
+                                      "results": result_store.describe(cached_ids)}),
+            ]))
+
+        def on_final(reply, results):
+            result_ids = [str(r["result_id"]) for r in results]
+            store_answer(cache_key, reply, result_ids)
+            with stage("persist", role="assistant"):
+                ChatMessage.objects.create(session=sess, role='assistant', content=reply,
+                                           results=result_ids, created_at=timezone.now())
+
+        def on_error(error_message):
+            ChatMessage.objects.create(
+                session=sess, role='assistant', content=f"Error: {error_message}", created_at=timezone.now()
+            )
+
+        events = astream_sql_agent(session_id=session_id, user_query=message, mode=mode, source=source)
+        if isinstance(request._request, ASGIRequest):
+            body = _sse_async(events, on_final, on_error)
+
+            async def content():
+                # La traza y el cupo de chat_slot abarcan el stream completo, que corre
+                # después de que la vista retorna (los encabezados 200 ya se enviaron:
+                # sin cupo se responde con un evento error).
+                with request_trace("chat_stream") as trace:
+                    try:
+                        async with chat_slot():
+                            yield start
+                            async for chunk in body:
+                                yield chunk
+                    except Overloaded as e:
+                        trace["outcome"] = "error"
+                        yield _sse("error", {"error": str(e), "retry_after": 5})
+        else:
+            # Por WSGI el tope de streams lo ponen los hilos del worker, igual que en /api/chat/.
+            body = _sse_sync(events, on_final, on_error)
+
+            def content():
+                with request_trace("chat_stream"):
+                    yield start
+                    yield from body
+        return _sse_response(content())
+
+
+# --- Jobs en segundo plano (ver services/chat_jobs.py) ---
+class ChatJobCreateAPIView(APIView):
+    """
+    POST /api/chat/jobs/ -> mismo body que /api/chat/; responde 202 de inmediato con
+    {"job_id", "status": "queued", "status_url"}. La respuesta se consulta en status_url.
+    """
+    @_traced("chat_job_submit")
+    def post(self, request):
+        with stage("parse"):
+            ser = ChatRequestSerializer(data=request.data, context={"request": request})
+            ser.is_valid(raise_exception=True)
+        with stage("persist", role="user"):
+            job = enqueue(ser.validated_data['session_id'], ser.validated_data['message'],
+                          ser.validated_data.get('mode'), ser.validated_data.get('source'))
+        status_url = request.build_absolute_uri(reverse("api_chat_job_detail", args=[job.job_id]))
+        resp = Response({"job_id": job.job_id, "status": job.status, "status_url": status_url},
+                        status=status.HTTP_202_ACCEPTED)
+        resp["Location"] = status_url
+        return resp
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ChatJobDetailAPIView(View):
+    """
+    GET /api/chat/jobs/<job_id>/ -> estado del job (queued, running, done, error) y,
+    al terminar, reply o error. ?wait=<s> espera hasta s segundos (tope
+    CHAT_JOBS_MAX_WAIT) a que termine antes de responder, para no sondear tan seguido.
+    La espera solo se hace bajo ASGI (no ocupa un worker); bajo WSGI responde al instante.
+    """
+    POLL_INTERVAL = 0.5
+
+    async def get(self, request, job_id):
+        try:
+            wait = float(request.GET.get("wait", 0))
+        except ValueError:
+            wait = -1.0
+        if not math.isfinite(wait) or wait < 0:
+            return JsonResponse({"detail": "wait debe ser un número de segundos >= 0"}, status=400)
+        if not isinstance(request, ASGIRequest):
+            wait = 0.0
+        deadline = time.monotonic() + min(wait, settings.CHAT_JOBS_MAX_WAIT)
+        jobs = ChatJob.objects.select_related("session")
+        while True:
+            job = await jobs.filter(job_id=job_id).afirst()
+            if job is None:
+                return JsonResponse({"detail": "No existe el job"}, status=404)
+            if job.status in ("done", "error") or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return JsonResponse(ChatJobSerializer(job).data)
+
+
+# --- Resultados tabulares (ver services/result_store.py) ---
+def _owned_result(request, result_id):
+    # ?session_id= debe ser una sesión cuya respuesta trajo este resultado; si no, 404 (no se distingue de uno expirado).
+    return result_store.get_result(result_id, request.query_params.get("session_id"))
+
+
+class _AnyContentNegotiation(BaseContentNegotiation):
+    """Las descargas no pasan por renderers: se acepta cualquier Accept."""
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class QueryResultAPIView(APIView):
+    """
+    GET /api/results/<result_id>/?session_id=...&offset=0&limit=100 -> tabla de una
+    respuesta en JSON columnar: {"columns": [{"name", "type"}], "data": [[valores col 1], ...],
+    "row_count", "offset", "next_offset"}. Los resultados expiran (RESULTS_TTL).
+    """
+    def get(self, request, result_id):
+        result = _owned_result(request, result_id)
+        if result is None:
+            return Response({"detail": "No existe el resultado o expiró"}, status=404)
+        try:
+            offset = max(0, _int_param(request, "offset") or 0)
+            limit = _int_param(request, "limit") or settings.RESULTS_PAGE_SIZE
+        except ValueError:
+            return Response({"detail": "offset/limit deben ser enteros"}, status=400)
+        limit = max(1, min(limit, settings.RESULTS_PAGE_MAX))
+        resp = Response(result_store.page(result, offset, limit))
+        resp["Cache-Control"] = "private, max-age=3600"  # un resultado no cambia
+        return resp
+
+
+class QueryResultCsvAPIView(APIView):
+    """GET /api/results/<result_id>/csv/?session_id=... -> tabla completa en CSV."""
+    content_negotiation_class = _AnyContentNegotiation
+
+    def get(self, request, result_id):
+        result = _owned_result(request, result_id)
+        if result is None:
+            return Response({"detail": "No existe el resultado o expiró"}, status=404)
+        resp = StreamingHttpResponse(result_store.iter_csv(result), content_type="text/csv; charset=utf-8")
+        resp["Content-Disposition"] = f'attachment; filename="analia-{result_id}.csv"'
+        return resp
+
+
+class QueryResultArrowAPIView(APIView):
+    """GET /api/results/<result_id>/arrow/?session_id=... -> tabla completa en Arrow IPC."""
+    content_negotiation_class = _AnyContentNegotiation
+
+    def get(self, request, result_id):
+        result = _owned_result(request, result_id)
+        if result is None:
+            return Response({"detail": "No existe el resultado o expiró"}, status=404)
+        try:
+            body = result_store.to_arrow(result)
+        except ImportError:
+            return Response({"detail": "Arrow requiere pyarrow (pip install pyarrow)"}, status=501)
+        return HttpResponse(body, content_type="application/vnd.apache.arrow.stream")
+
+
+def metrics_view(request):
+    # Formato de exposición de Prometheus (métricas de este proceso)
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 def chat_page(request):
     # Render de la UI simple
     return render(request, "chat.html")
@@ -81,24 +453,91 @@ class HealthAPIView(APIView):
         return Response({
             "model_provider": provider,
             "db_engine": db_engine,
+            "analytics_db": settings.ANALYTICS_DB_ALIAS,
+            "sql_sources": sources.registry().status(),
             "last_message_at": last_ts,
             "server_time": timezone.now(),
         })
 
 
+# --- Paginación keyset (cursor) ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _page_size(request) -> int:
+    try:
+        size = int(request.query_params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _encode_cursor(*parts) -> str:
+    raw = "|".join(p.isoformat() if hasattr(p, "isoformat") else str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    return raw.split("|")
+
+
+def _int_param(request, name):
+    value = request.query_params.get(name)
+    return int(value) if value not in (None, "") else None
+
+
+# --- Peticiones condicionales (ETag / Last-Modified) ---
+def _etag(*parts) -> str:
+    raw = "|".join(p if isinstance(p, str) else json.dumps(p, sort_keys=True, default=str) for p in parts)
+    return quote_etag(hashlib.md5(raw.encode("utf-8")).hexdigest())
+
+
+def _conditional(request, etag, last_modified=None, build=None):
+    """
+    304 si el cliente ya tiene esta versión (If-None-Match / If-Modified-Since);
+    si no, arma la respuesta con build() y le agrega los validadores.
+    """
+    ts = int(last_modified.timestamp()) if last_modified else None
+    resp = get_conditional_response(request._request, etag=etag, last_modified=ts)
+    if resp is None:
+        resp = build()
+    resp["ETag"] = etag
+    if ts is not None:
+        resp["Last-Modified"] = http_date(ts)
+    resp["Cache-Control"] = "no-cache"  # revalidar siempre
+    return resp
+
+
 # --- NUEVO: listar/crear sesiones ---
 class SessionListCreateAPIView(APIView):
     """
-    GET: lista sesiones con última actividad (ordenadas por reciente)
+    GET: lista sesiones por última actividad, paginada por cursor:
+         ?limit=50&cursor=<next_cursor> -> {"results": [...], "next_cursor": "..."|null}
     POST: crea/actualiza una sesión. Body: {"session_id":"...", "user_label":"opcional"}
     """
     def get(self, request):
-        sessions = (
-            ChatSession.objects
-            .annotate(last_activity=Max("messages__created_at"))
-            .order_by("-last_activity", "-created_at")
-        )
-        return Response(ChatSessionSerializer(sessions, many=True).data)
+        size = _page_size(request)
+        sessions = ChatSession.objects.order_by("-last_activity", "-id")
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            try:
+                ts, pk = _decode_cursor(cursor)
+                ts, pk = datetime.fromisoformat(ts), int(pk)
+            except (ValueError, UnicodeDecodeError):
+                return Response({"detail": "cursor inválido"}, status=400)
+            sessions = sessions.filter(Q(last_activity__lt=ts) | Q(last_activity=ts, id__lt=pk))
+        page = list(sessions.only(
+            "id", "session_id", "created_at", "user_label", "last_activity", "message_count",
+        )[:size + 1])
+        next_cursor = None
+        if len(page) > size:
+            page = page[:size]
+            next_cursor = _encode_cursor(page[-1].last_activity, page[-1].id)
+        data = {"results": ChatSessionSerializer(page, many=True).data, "next_cursor": next_cursor}
+        # La lista cambia también por etiquetas o borrados: el ETag sale del contenido de la página.
+        return _conditional(request, _etag(data), build=lambda: Response(data))
 
     def post(self, request):
         sid = (request.data.get("session_id") or "").strip()
@@ -117,17 +556,93 @@ class SessionListCreateAPIView(APIView):
 # --- NUEVO: detalle/elim de una sesión ---
 class SessionDetailAPIView(APIView):
     """
-    GET /api/sessions/<session_id>/    -> devuelve historial (mensajes ordenados)
+    GET /api/sessions/<session_id>/    -> mensajes en orden cronológico, paginados por id:
+        (sin parámetros)  últimos `limit` mensajes
+        ?before=<id>      página anterior (más antiguos que id)
+        ?since=<id>       delta: mensajes posteriores a id (hasta `limit`)
+        -> {"results": [...], "before": id|null, "last_id": id|null}
+           `before` es el cursor de la página anterior (null si no hay más).
     DELETE /api/sessions/<session_id>/ -> elimina sesión e historial
     """
     def get(self, request, session_id):
-        try:
-            sess = ChatSession.objects.get(session_id=session_id)
-        except ChatSession.DoesNotExist:
+        sess = (
+            ChatSession.objects.filter(session_id=session_id)
+            .only("id", "last_activity", "message_count").first()
+        )
+        if sess is None:
             return Response({"detail": "No existe la sesión"}, status=404)
-        msgs = ChatMessage.objects.filter(session=sess).order_by("created_at")
-        return Response(ChatMessageSerializer(msgs, many=True).data)
+        size = _page_size(request)
+        try:
+            since, before = _int_param(request, "since"), _int_param(request, "before")
+        except ValueError:
+            return Response({"detail": "since/before deben ser enteros"}, status=400)
+
+        # Validadores desde la fila de la sesión: un 304 no lee ningún mensaje.
+        etag = _etag(str(sess.id), str(sess.message_count), sess.last_activity.isoformat(),
+                     request.META.get("QUERY_STRING", ""))
+        return _conditional(request, etag, sess.last_activity,
+                            build=lambda: self._page(sess, size, since, before))
+
+    def _page(self, sess, size, since, before):
+        msgs = ChatMessage.objects.filter(session=sess)
+        if since is not None:
+            page = list(msgs.filter(id__gt=since).order_by("id")[:size])
+            older = None
+        else:
+            if before is not None:
+                msgs = msgs.filter(id__lt=before)
+            page = list(msgs.order_by("-id")[:size + 1])
+            older = page[size - 1].id if len(page) > size else None
+            page = list(reversed(page[:size]))
+        return Response({
+            "results": ChatMessageSerializer(page, many=True).data,
+            "before": older,
+            "last_id": page[-1].id if page else since,
+        })
 
     def delete(self, request, session_id):
         ChatSession.objects.filter(session_id=session_id).delete()
-        return Response(status=204)
\ No newline at end of file
+        return Response(status=204)
+
+
+# --- Ingesta de indicadores (exportes ACD/WFM) ---
+class IndicatorIngestAPIView(APIView):
+    """
+    POST /api/ingest/indicators/ (multipart, campo "file": .csv o .parquet)
+    -> upsert por bloques en Indicator. Solo usuarios staff.
+    """
+    parser_classes = [MultiPartParser]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"detail": "file es requerido"}, status=400)
+        try:
+            fmt = request.data.get("format") or detect_format(upload.name)
+            summary = ingest_indicators(upload.file, fmt)
+        except IngestError as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response(summary, status=200)
+
+
+# --- Workload SQL del agente (ver services/sql_workload.py) ---
+class SqlWorkloadAPIView(APIView):
+    """
+    GET /api/sql-workload/ -> fingerprints de SQL con llamadas, latencia (p50/p95/p99),
+    filas y tasa de error. ?source=, ?order=total_ms|calls|errors|rejected|rows_total|max_ms|last_seen
+    (descendente), ?limit=. Solo usuarios staff.
+    """
+    permission_classes = [IsAdminUser]
+    ORDERS = ("total_ms", "calls", "errors", "rejected", "rows_total", "max_ms", "last_seen")
+
+    def get(self, request):
+        order = request.query_params.get("order", "total_ms")
+        if order not in self.ORDERS:
+            return Response({"detail": f"order debe ser uno de {', '.join(self.ORDERS)}"}, status=400)
+        # Lo acumulado en este proceso aún no volcado también cuenta.
+        sql_workload.flush()
+        qs = SqlFingerprint.objects.order_by(f"-{order}", "id")
+        if request.query_params.get("source"):
+            qs = qs.filter(source=request.query_params["source"])
+        return Response({"results": SqlFingerprintSerializer(qs[:_page_size(request)], many=True).data})
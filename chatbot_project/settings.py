@@ -1,5 +1,5 @@
 from pathlib import Path
-import environ, os
+import environ, os, shlex
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 env = environ.Env()
@@ -89,11 +89,183 @@ else:
             }
         }
 
+# Réplica de lectura (u otro rol de solo lectura en el primario) para el SQL
+# analítico del agente. Basta DB_REPLICA_HOST (host TCP o /cloudsql/<réplica>)
+# o DB_REPLICA_USER; lo no definido se toma del primario.
+if DB_BACKEND != "sqlite" and (env("DB_REPLICA_HOST", default="") or env("DB_REPLICA_USER", default="")):
+    _primary = DATABASES["default"]
+    DATABASES["replica"] = {
+        **_primary,
+        "HOST": env("DB_REPLICA_HOST", default=_primary["HOST"]),
+        "PORT": env("DB_REPLICA_PORT", default=_primary["PORT"]),
+        "USER": env("DB_REPLICA_USER", default=_primary["USER"]),
+        "PASSWORD": env("DB_REPLICA_PASSWORD", default=_primary["PASSWORD"]),
+        "TEST": {"MIRROR": "default"},
+    }
+# Alias de DATABASES que usa el engine de SQLAlchemy (run_raw_select, sql_db_query).
+ANALYTICS_DB_ALIAS = "replica" if "replica" in DATABASES else "default"
+DATABASE_ROUTERS = ["app_core.db_router.PrimaryReplicaRouter"]
+
 LANGUAGE_CODE = "es"
 TIME_ZONE = "America/Lima"
 USE_I18N = True
 USE_TZ = True
 
+# --------- Esquema visible para el agente SQL -----------
+# Solo estas tablas se describen al LLM (snapshot en SCHEMA_SNAPSHOT_PATH).
+AGENT_SQL_TABLES = env.list(
+    "AGENT_SQL_TABLES",
+    default=["app_core_agent", "app_core_indicator", "app_core_indicatorrollup"],
+)
+AGENT_SAMPLE_ROWS = env.int("AGENT_SAMPLE_ROWS", default=2)
+SCHEMA_SNAPSHOT_PATH = Path(env("SCHEMA_SNAPSHOT_PATH", default=str(BASE_DIR / "var" / "schema_snapshot.json")))
+
+# --------- Ejecución de SQL (run_raw_select y sql_db_query) -----------
+SQL_MAX_PLAN_COST = env.float("SQL_MAX_PLAN_COST", default=1_000_000)  # costo EXPLAIN (PostgreSQL); 0 = sin tope
+SQL_STATEMENT_TIMEOUT_MS = env.int("SQL_STATEMENT_TIMEOUT_MS", default=15_000)
+SQL_MAX_ROWS = env.int("SQL_MAX_ROWS", default=1000)
+SQL_FETCH_BATCH = env.int("SQL_FETCH_BATCH", default=500)  # filas por lote del cursor de servidor
+# Fingerprints del SQL ejecutado (llamadas, latencia, filas, errores) en SqlFingerprint y /api/sql-workload/.
+SQL_WORKLOAD_ENABLED = env.bool("SQL_WORKLOAD_ENABLED", default=True)
+SQL_WORKLOAD_FLUSH_INTERVAL = env.int("SQL_WORKLOAD_FLUSH_INTERVAL", default=30)  # segundos entre volcados por proceso
+
+# --------- Resultados tabulares (/api/results/) -----------
+# El LLM ve RESULT_PREVIEW_ROWS filas y estadísticas; la tabla completa se guarda en QueryResult.
+RESULTS_ENABLED = env.bool("RESULTS_ENABLED", default=True)
+RESULT_PREVIEW_ROWS = env.int("RESULT_PREVIEW_ROWS", default=20)
+RESULTS_TTL = env.int("RESULTS_TTL", default=86_400)  # segundos que se conserva cada resultado
+RESULTS_PURGE_INTERVAL = env.int("RESULTS_PURGE_INTERVAL", default=3600)  # borrado de expirados por proceso
+RESULTS_PAGE_SIZE = env.int("RESULTS_PAGE_SIZE", default=100)
+RESULTS_PAGE_MAX = env.int("RESULTS_PAGE_MAX", default=1000)
+
+# --------- Modo del agente -----------
+# agent: create_sql_agent (openai-tools) | single_shot: esquema + pregunta en un prompt, reintento solo si falla
+AGENT_MODE = env("AGENT_MODE", default="agent")
+SINGLE_SHOT_MAX_RETRIES = env.int("SINGLE_SHOT_MAX_RETRIES", default=1)  # re-prompts con el error de la base
+SINGLE_SHOT_ANSWER = env("SINGLE_SHOT_ANSWER", default="llm")  # llm | template (tabla de texto, sin LLM)
+SINGLE_SHOT_ANSWER_ROWS = env.int("SINGLE_SHOT_ANSWER_ROWS", default=50)  # filas que ve el redactor
+
+# --------- Ejemplos verificados pregunta → SQL (few-shot) -----------
+SQL_EXAMPLES_ENABLED = env.bool("SQL_EXAMPLES_ENABLED", default=True)  # inyectar ejemplos en el prompt
+SQL_EXAMPLES_CAPTURE = env.bool("SQL_EXAMPLES_CAPTURE", default=True)  # guardar el SQL de corridas exitosas
+SQL_EXAMPLES_AUTO_VERIFY = env.bool("SQL_EXAMPLES_AUTO_VERIFY", default=False)  # False: se verifican en el admin
+SQL_EXAMPLES_TOP_K = env.int("SQL_EXAMPLES_TOP_K", default=3)
+SQL_EXAMPLES_MIN_SCORE = env.float("SQL_EXAMPLES_MIN_SCORE", default=0.3)  # similitud coseno TF-IDF
+SQL_EXAMPLES_INDEX_TTL = env.int("SQL_EXAMPLES_INDEX_TTL", default=60)  # segundos entre reconstrucciones
+SQL_EXAMPLES_MAX_INDEXED = env.int("SQL_EXAMPLES_MAX_INDEXED", default=2000)
+
+# --------- Ruta rápida (plantillas SQL sin LLM) -----------
+FAST_PATH_ENABLED = env.bool("FAST_PATH_ENABLED", default=True)
+FAST_PATH_MIN_CONFIDENCE = env.float("FAST_PATH_MIN_CONFIDENCE", default=0.9)
+FAST_PATH_VOCAB_TTL = env.int("FAST_PATH_VOCAB_TTL", default=300)  # segundos entre relecturas de sedes/indicadores
+
+# --------- Agregados (IndicatorRollup) -----------
+# Refresca tras ingest_indicators/generate_load_data y, si hay pendientes, en segundo plano desde el proceso web
+ROLLUPS_AUTO_REFRESH = env.bool("ROLLUPS_AUTO_REFRESH", default=True)
+ROLLUPS_CHECK_INTERVAL = env.int("ROLLUPS_CHECK_INTERVAL", default=10)  # segundos entre comprobaciones de pendientes
+
+# --------- Caché de respuestas del agente -----------
+# locmem: LRU en memoria del proceso | django: usa CACHES[ANSWER_CACHE_ALIAS] | off
+ANSWER_CACHE_BACKEND = env("ANSWER_CACHE_BACKEND", default="locmem")
+ANSWER_CACHE_ALIAS = env("ANSWER_CACHE_ALIAS", default="default")
+ANSWER_CACHE_TTL = env.int("ANSWER_CACHE_TTL", default=600)  # segundos
+ANSWER_CACHE_MAX_ENTRIES = env.int("ANSWER_CACHE_MAX_ENTRIES", default=500)
+ANSWER_CACHE_CONTEXT_TURNS = env.int("ANSWER_CACHE_CONTEXT_TURNS", default=2)
+# Versión de datos (invalida la caché al cambiar Agent/Indicator): db: fila DataVersion, compartida entre
+# procesos | cache: CACHES[ANSWER_CACHE_ALIAS] (solo compartida si ese backend lo es) | local: solo el proceso
+ANSWER_CACHE_VERSION_STORE = env("ANSWER_CACHE_VERSION_STORE", default="db")
+ANSWER_CACHE_VERSION_POLL = env.float("ANSWER_CACHE_VERSION_POLL", default=2.0)  # segundos entre relecturas
+
+# --------- Coalescencia de preguntas idénticas en vuelo -----------
+# local: entre hilos/tareas del proceso | cache: además entre workers vía CACHES[SINGLE_FLIGHT_CACHE_ALIAS] | off
+SINGLE_FLIGHT_BACKEND = env("SINGLE_FLIGHT_BACKEND", default="local")
+SINGLE_FLIGHT_CACHE_ALIAS = env("SINGLE_FLIGHT_CACHE_ALIAS", default="default")
+SINGLE_FLIGHT_WAIT = env.float("SINGLE_FLIGHT_WAIT", default=60.0)  # segundos que un seguidor espera al líder
+SINGLE_FLIGHT_LOCK_TTL = env.int("SINGLE_FLIGHT_LOCK_TTL", default=120)  # expira el lock si el líder muere
+SINGLE_FLIGHT_POLL_INTERVAL = env.float("SINGLE_FLIGHT_POLL_INTERVAL", default=0.25)
+
+# --------- Memoria del agente -----------
+CHAT_HISTORY_TURNS = env.int("CHAT_HISTORY_TURNS", default=10)  # turnos recientes literales
+CHAT_HISTORY_TOKEN_BUDGET = env.int("CHAT_HISTORY_TOKEN_BUDGET", default=3000)  # tope del historial por petición
+CHAT_HISTORY_SUMMARY_BATCH_TURNS = env.int("CHAT_HISTORY_SUMMARY_BATCH_TURNS", default=5)  # 0 = sin resumen
+CHAT_HISTORY_SUMMARY_MAX_TOKENS = env.int("CHAT_HISTORY_SUMMARY_MAX_TOKENS", default=400)
+
+# --------- Ruta async (ASGI) -----------
+CHAT_MAX_CONCURRENCY = env.int("CHAT_MAX_CONCURRENCY", default=200)  # preguntas en vuelo por proceso
+CHAT_QUEUE_TIMEOUT = env.float("CHAT_QUEUE_TIMEOUT", default=10.0)   # segundos esperando cupo
+
+# --------- Jobs de chat en segundo plano (/api/chat/jobs/) -----------
+# thread: hilos en el proceso web | worker: solo encola, los procesa `manage.py chat_worker`
+CHAT_JOBS_EXECUTOR = env("CHAT_JOBS_EXECUTOR", default="thread")
+CHAT_JOBS_THREADS = env.int("CHAT_JOBS_THREADS", default=4)  # jobs simultáneos por proceso
+CHAT_JOBS_POLL_INTERVAL = env.float("CHAT_JOBS_POLL_INTERVAL", default=1.0)  # chat_worker con la cola vacía
+CHAT_JOBS_HEARTBEAT_INTERVAL = env.int("CHAT_JOBS_HEARTBEAT_INTERVAL", default=30)  # el ejecutor renueva heartbeat_at
+CHAT_JOBS_STALE_AFTER = env.int("CHAT_JOBS_STALE_AFTER", default=120)  # segundos sin latido para re-encolar
+CHAT_JOBS_MAX_ATTEMPTS = env.int("CHAT_JOBS_MAX_ATTEMPTS", default=2)
+CHAT_JOBS_SWEEP_INTERVAL = env.int("CHAT_JOBS_SWEEP_INTERVAL", default=30)  # executor thread: barrido de jobs huérfanos
+CHAT_JOBS_MAX_WAIT = env.float("CHAT_JOBS_MAX_WAIT", default=25.0)  # tope de ?wait= al consultar un job
+
+# --------- Servidor (gunicorn.conf.py lee las mismas variables) -----------
+def _gunicorn_arg(flags, default):
+    """Valor de una opción de GUNICORN_CMD_ARGS, que gunicorn antepone a gunicorn.conf.py."""
+    args = shlex.split(os.environ.get("GUNICORN_CMD_ARGS", ""))
+    for i, arg in enumerate(args):
+        for flag in flags:
+            if arg == flag and i + 1 < len(args):
+                return args[i + 1]
+            if arg.startswith(f"{flag}="):
+                return arg.split("=", 1)[1]
+    return default
+
+WEB_WORKER_CLASS = _gunicorn_arg(("-k", "--worker-class"), env("WEB_WORKER_CLASS", default="gthread"))
+WEB_THREADS = int(_gunicorn_arg(("--threads",), env.int("WEB_THREADS", default=4)))
+WEB_ASGI = "uvicorn" in WEB_WORKER_CLASS.lower()
+# Hilos del executor de sync_to_async(thread_sensitive=False) en cada event loop ASGI (concurrency.py)
+ASGI_EXECUTOR_THREADS = env.int("ASGI_EXECUTOR_THREADS", default=min(32, (os.cpu_count() or 1) + 4))
+
+# --------- Pool del engine analítico (por proceso) -----------
+# Por defecto una conexión por hilo que puede consultar a la vez: bajo WSGI los
+# --threads de gunicorn; bajo ASGI el hilo de las vistas síncronas más las
+# preguntas async en vuelo (tope: el executor de sync_to_async); más los hilos de jobs.
+WEB_DB_THREADS = 1 + min(CHAT_MAX_CONCURRENCY, ASGI_EXECUTOR_THREADS) if WEB_ASGI else WEB_THREADS
+SQL_POOL_SIZE = env.int(
+    "SQL_POOL_SIZE", default=WEB_DB_THREADS + (CHAT_JOBS_THREADS if CHAT_JOBS_EXECUTOR == "thread" else 0),
+)
+SQL_POOL_MAX_OVERFLOW = env.int("SQL_POOL_MAX_OVERFLOW", default=2)
+SQL_POOL_TIMEOUT = env.float("SQL_POOL_TIMEOUT", default=10.0)  # segundos esperando una conexión libre
+SQL_POOL_RECYCLE = env.int("SQL_POOL_RECYCLE", default=1800)  # renueva conexiones (proxies/Cloud SQL)
+SQL_READ_ONLY = env.bool("SQL_READ_ONLY", default=True)  # transacciones READ ONLY (query_only en SQLite)
+
+# --------- Fuentes SQL adicionales (campo `source` del chat) -----------
+# JSON {nombre: {"url" o "database" (alias de DATABASES), "tables", y opcionales "prompt",
+# "max_rows", "statement_timeout_ms", "max_plan_cost", "pool_size", "max_overflow", "snapshot_path"}}.
+# "default" (ANALYTICS_DB_ALIAS + AGENT_SQL_TABLES) siempre existe.
+SQL_SOURCES = env.json("SQL_SOURCES", default={})
+SQL_SOURCES_MAX_ACTIVE = env.int("SQL_SOURCES_MAX_ACTIVE", default=4)  # con engine abierto, además de default (LRU)
+SQL_SOURCES_IDLE_TIMEOUT = env.int("SQL_SOURCES_IDLE_TIMEOUT", default=900)  # segundos sin uso para cerrarla; 0 = nunca
+
+# --------- Arranque en frío -----------
+# off | background (hilo al iniciar el worker) | blocking (antes de aceptar peticiones)
+WARMUP_ON_START = env("WARMUP_ON_START", default="off")
+WARMUP_POOL_CONNECTIONS = env.int("WARMUP_POOL_CONNECTIONS", default=2)
+WARMUP_BUILD_AGENT = env.bool("WARMUP_BUILD_AGENT", default=True)  # False: solo engine, pool y esquema
+
+# --------- Logs -----------
+# app_core.trace emite una línea JSON por petición de chat (etapas, tokens, filas).
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+                   "raw": {"format": "%(message)s"}},
+    "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "plain"},
+                 "trace": {"class": "logging.StreamHandler", "formatter": "raw"}},
+    "loggers": {
+        "app_core": {"handlers": ["console"], "level": env("LOG_LEVEL", default="INFO")},
+        "app_core.trace": {"handlers": ["trace"], "level": env("TRACE_LOG_LEVEL", default="INFO"),
+                           "propagate": False},
+    },
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"]
 }
@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path
 
 from app_core.views import (
-    ChatAPIView, chat_page,
+    ChatAPIView, ChatStreamAPIView, AsyncChatView, chat_page,
     HealthAPIView, SessionListCreateAPIView, SessionDetailAPIView,  # <-- nuevos
+    IndicatorIngestAPIView, metrics_view, ChatJobCreateAPIView, ChatJobDetailAPIView,
+    QueryResultAPIView, QueryResultCsvAPIView, QueryResultArrowAPIView, SqlWorkloadAPIView,
 )
 
 urlpatterns = [
@@ -11,11 +13,21 @@ urlpatterns = [
 
     # EXISTENTE
     path('api/chat/', ChatAPIView.as_view(), name='api_chat'),
+    path('api/chat/async/', AsyncChatView.as_view(), name='api_chat_async'),
+    path('api/chat/stream/', ChatStreamAPIView.as_view(), name='api_chat_stream'),
+    path('api/chat/jobs/', ChatJobCreateAPIView.as_view(), name='api_chat_jobs'),
+    path('api/chat/jobs/<uuid:job_id>/', ChatJobDetailAPIView.as_view(), name='api_chat_job_detail'),
 
     # NUEVOS
     path('api/health/', HealthAPIView.as_view(), name='api_health'),
+    path('api/metrics/', metrics_view, name='api_metrics'),
     path('api/sessions/', SessionListCreateAPIView.as_view(), name='api_sessions'),
     path('api/sessions/<str:session_id>/', SessionDetailAPIView.as_view(), name='api_session_detail'),
+    path('api/results/<uuid:result_id>/', QueryResultAPIView.as_view(), name='api_result'),
+    path('api/results/<uuid:result_id>/csv/', QueryResultCsvAPIView.as_view(), name='api_result_csv'),
+    path('api/results/<uuid:result_id>/arrow/', QueryResultArrowAPIView.as_view(), name='api_result_arrow'),
+    path('api/ingest/indicators/', IndicatorIngestAPIView.as_view(), name='api_ingest_indicators'),
+    path('api/sql-workload/', SqlWorkloadAPIView.as_view(), name='api_sql_workload'),
 
     # UI
     path('', chat_page, name='chat_page'),
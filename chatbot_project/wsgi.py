@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
 
 application = get_wsgi_application()
+
+# Opcional (WARMUP_ON_START): precarga agente, esquema y pool antes de la primera pregunta.
+from app_core.services.warmup import warm_up_on_start  # noqa: E402
+
+warm_up_on_start()
+
+# Con CHAT_JOBS_EXECUTOR=thread: recupera los jobs que otro proceso dejó encolados o a medias.
+from app_core.services.chat_jobs import start_sweeper  # noqa: E402
+
+start_sweeper()
@@ -0,0 +1,11 @@
+#!/bin/sh
+# Arranque del contenedor (Cloud Run).
+set -e
+
+# Snapshot de esquema del agente antes de levantar los workers: así ningún worker
+# refleja la base en su primera pregunta. Solo se regenera si cambiaron las
+# migraciones o la configuración; si la base no responde aún, el agente lo
+# construye al primer uso como antes.
+python manage.py snapshot_schema --all --if-stale || echo "snapshot_schema falló; se generará al primer uso" >&2
+
+exec gunicorn -c gunicorn.conf.py
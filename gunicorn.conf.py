@@ -0,0 +1,36 @@
+"""
+Configuración de gunicorn (entrypoint.sh). Las mismas variables de entorno
+dimensionan el pool SQL en settings.py (WEB_THREADS, WEB_WORKER_CLASS,
+ASGI_EXECUTOR_THREADS); GUNICORN_CMD_ARGS puede sobrescribirlas y settings
+también la lee. Si aun así no coinciden, el arranque falla en on_starting.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_WORKERS", "2"))
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("WEB_THREADS", "4"))
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+wsgi_app = ("chatbot_project.asgi:application" if "uvicorn" in worker_class.lower()
+            else "chatbot_project.wsgi:application")
+
+
+def on_starting(server):
+    import django
+    from django.conf import settings
+
+    django.setup(set_prefix=False)
+    cfg = server.cfg
+    asgi = "uvicorn" in cfg.worker_class_str.lower()
+    problems = []
+    if asgi != settings.WEB_ASGI:
+        problems.append(f"worker_class={cfg.worker_class_str} pero settings.WEB_WORKER_CLASS={settings.WEB_WORKER_CLASS}")
+    if not asgi and cfg.threads != settings.WEB_THREADS:
+        problems.append(f"threads={cfg.threads} pero settings.WEB_THREADS={settings.WEB_THREADS}")
+    if problems:
+        raise RuntimeError("El pool SQL no corresponde a la configuración de gunicorn: " + "; ".join(problems))
+    server.log.info(
+        "SQL pool per worker: size=%s max_overflow=%s (web db threads=%s, jobs=%s)",
+        settings.SQL_POOL_SIZE, settings.SQL_POOL_MAX_OVERFLOW, settings.WEB_DB_THREADS,
+        settings.CHAT_JOBS_THREADS if settings.CHAT_JOBS_EXECUTOR == "thread" else 0,
+    )